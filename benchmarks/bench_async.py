@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from rich.table import Table
+
+from src.agentic_pipeline.config import Config
+from src.agentic_pipeline.controller.agent import AgentController
+from src.agentic_pipeline.logging_utils import console
+
+from .fake_openai import SpawnedServer
+
+
+def row(table: Table, mode: str, wall: float, lat: List[float]) -> None:
+    table.add_row(
+        mode,
+        str(len(lat)),
+        f"{len(lat) / wall:.1f}",
+        f"{np.percentile(lat, 50):.0f}",
+        f"{np.percentile(lat, 99):.0f}",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput: AgentController.run vs arun against a stub LLM server")
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    project_root = Path(__file__).resolve().parents[1]
+    base_queries = json.loads((project_root / "data" / "test_queries.json").read_text(encoding="utf-8"))
+    queries = [base_queries[i % len(base_queries)] for i in range(args.queries)]
+
+    with SpawnedServer(latency_ms=args.latency_ms) as server, tempfile.TemporaryDirectory() as tmp:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        config = dataclasses.replace(
+            Config.from_env(), openai_api_key="fake", cache_dir=Path(tmp) / "cache", results_dir=Path(tmp)
+        )
+        controller = AgentController(config=config)
+        console.quiet = True
+
+        table = Table(title=f"{args.queries} queries, {args.latency_ms:.0f}ms per stub LLM/embedding call")
+        for col in ["Mode", "Queries", "QPS", "p50 ms", "p99 ms"]:
+            table.add_column(col)
+
+        def timed_run(q: str) -> float:
+            t0 = time.perf_counter()
+            controller.run(q, save_trace=False)
+            return (time.perf_counter() - t0) * 1000
+
+        n_seq = min(len(queries), 20)
+        t0 = time.perf_counter()
+        lat = [timed_run(q) for q in queries[:n_seq]]
+        row(table, "run, sequential", time.perf_counter() - t0, lat)
+
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            t0 = time.perf_counter()
+            lat = list(pool.map(timed_run, queries))
+            row(table, f"run, {args.threads} threads", time.perf_counter() - t0, lat)
+
+        async def arun_all() -> List[float]:
+            sem = asyncio.Semaphore(args.concurrency)
+
+            async def one(q: str) -> float:
+                async with sem:
+                    t = time.perf_counter()
+                    await controller.arun(q, save_trace=False)
+                    return (time.perf_counter() - t) * 1000
+
+            return await asyncio.gather(*(one(q) for q in queries))
+
+        t0 = time.perf_counter()
+        lat = asyncio.run(arun_all())
+        row(table, f"arun, {args.concurrency} in flight", time.perf_counter() - t0, lat)
+
+        console.quiet = False
+        console.print(table)
+
+
+if __name__ == "__main__":
+    main()
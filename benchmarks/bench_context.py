@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from rich.table import Table
+
+from src.agentic_pipeline.config import Config
+from src.agentic_pipeline.controller.agent import AgentController
+from src.agentic_pipeline.logging_utils import console
+from src.eval.evaluate import token_counts
+
+from .fake_openai import SpawnedServer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prompt tokens and latency: fixed snippet slices vs packed context")
+    parser.add_argument("--passes", type=int, default=3, help="Times the eval set is run per layout")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[150, 300, 600])
+    parser.add_argument("--prompt-token-latency-ms", type=float, default=0.5, help="Stub prefill cost per uncached token")
+    # The KB is tiny, so the stub's prompt cache is scaled down from the API's 1024/128 to show the layout effect
+    parser.add_argument("--cache-min-tokens", type=int, default=64)
+    parser.add_argument("--cache-block", type=int, default=16)
+    args = parser.parse_args()
+
+    project_root = Path(__file__).resolve().parents[1]
+    queries = json.loads((project_root / "data" / "test_queries.json").read_text(encoding="utf-8"))
+    console.quiet = True
+    table = Table(
+        title=f"{len(queries)} eval queries x {args.passes}, stub prefill {args.prompt_token_latency_ms}ms/token, "
+        f"prompt cache from {args.cache_min_tokens} tokens in blocks of {args.cache_block}"
+    )
+    for col in ["Context", "prompt tok/req", "cached tok/req", "context tok/req (est.)", "p50 ms", "p99 ms"]:
+        table.add_column(col)
+
+    layouts = [("fixed slices (before)", 0)] + [(f"packed, budget {b}", b) for b in args.budgets]
+    for label, budget in layouts:
+        # A fresh stub per layout, so no prompt cache carries over
+        with SpawnedServer(
+            prompt_token_latency_ms=args.prompt_token_latency_ms,
+            cache_min_tokens=args.cache_min_tokens,
+            cache_block=args.cache_block,
+        ) as server, tempfile.TemporaryDirectory() as tmp:
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            config = dataclasses.replace(
+                Config.from_env(),
+                openai_api_key="fake",
+                cache_dir=Path(tmp) / "cache",
+                index_snapshot=None,
+                results_dir=Path(tmp),
+                context_tokens=budget,
+            )
+            controller = AgentController(config=config)
+            tokens: Dict[str, List[int]] = {}
+            lat: List[float] = []
+            for _ in range(args.passes):
+                for q in queries:
+                    t0 = time.perf_counter()
+                    _, trace, _ = controller.run(q, save_trace=False)
+                    lat.append((time.perf_counter() - t0) * 1000)
+                    for kind, n in token_counts(trace).items():
+                        tokens.setdefault(kind, []).append(n)
+            controller.close()
+        table.add_row(
+            label,
+            f"{np.mean(tokens['prompt_tokens']):.0f}",
+            f"{np.mean(tokens['cached_tokens']):.0f}",
+            f"{np.mean(tokens['context_tokens']):.0f}" if budget else "-",
+            f"{np.percentile(lat, 50):.1f}",
+            f"{np.percentile(lat, 99):.1f}",
+        )
+    console.quiet = False
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
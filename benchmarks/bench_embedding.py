@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+
+from openai import OpenAI
+from rich.table import Table
+
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.retriever.embedder import EmbeddingExecutor
+
+from .fake_openai import FakeOpenAIServer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EmbeddingExecutor against a local fake OpenAI server")
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--callers", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = [f"synthetic document {i} about product {i % 97}" for i in range(args.texts)]
+    table = Table(title=f"{args.texts} texts, {args.latency_ms:.0f}ms server latency, {args.error_rate:.0%} injected 429s")
+    for col in ["Mode", "Wall s", "Requests", "Retries"]:
+        table.add_column(col)
+
+    with FakeOpenAIServer(latency_ms=args.latency_ms, error_rate=args.error_rate, retry_after=0.05) as server:
+        client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+
+        for workers in (1, 4, 8):
+            ex = EmbeddingExecutor(client, "fake", max_batch_size=256, max_workers=workers, base_delay=0.05)
+            t0 = time.perf_counter()
+            out = ex.embed(texts)
+            assert out.shape[0] == len(texts)
+            table.add_row(f"embed, batch 256, {workers} workers", f"{time.perf_counter() - t0:.2f}",
+                          str(ex.stats["requests"]), str(ex.stats["retries"]))
+            ex.close()
+
+        for coalesce_ms in (0.0, 2.0):
+            ex = EmbeddingExecutor(client, "fake", max_workers=8, coalesce_ms=coalesce_ms, base_delay=0.05)
+            barrier = threading.Barrier(args.callers)
+
+            def caller(i: int) -> None:
+                barrier.wait()
+                ex.embed_one(f"query {i}")
+
+            threads = [threading.Thread(target=caller, args=(i,)) for i in range(args.callers)]
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            table.add_row(f"{args.callers} concurrent embed_one, coalesce {coalesce_ms:g}ms",
+                          f"{time.perf_counter() - t0:.2f}", str(ex.stats["requests"]), str(ex.stats["retries"]))
+            ex.close()
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+from rich.table import Table
+
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.retriever.index import ExactIndex, IVFIndex
+
+
+def clustered_vectors(n: int, dim: int, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+    # Embedding-like data: points scattered around a few hundred topic directions
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    return centers[labels] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def time_queries(index, queries: np.ndarray, k: int) -> tuple[List[np.ndarray], List[float]]:
+    ids, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        idx, _ = index.search(q, k)
+        lat.append((time.perf_counter() - t0) * 1000)
+        ids.append(idx)
+    return ids, lat
+
+
+def naive_query(A: np.ndarray, q: np.ndarray, k: int) -> np.ndarray:
+    # The pre-index VectorStore.query path, kept for comparison
+    denom = (np.linalg.norm(A, axis=1) * (np.linalg.norm(q) + 1e-8)) + 1e-8
+    sims = (A @ q) / denom
+    return np.argsort(-sims)[:k]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recall@k vs latency: exact vs IVF index")
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = clustered_vectors(args.n, args.dim, 512, rng)
+    Q = clustered_vectors(args.queries, args.dim, 512, rng)
+
+    table = Table(title=f"N={args.n} dim={args.dim} k={args.k}")
+    for col in ["Backend", "Build s", "p50 ms", "p99 ms", f"Recall@{args.k}"]:
+        table.add_column(col)
+
+    lat = []
+    for q in Q[: min(20, len(Q))]:
+        t0 = time.perf_counter()
+        naive_query(X, q, args.k)
+        lat.append((time.perf_counter() - t0) * 1000)
+    table.add_row("naive (argsort)", "-", f"{np.percentile(lat, 50):.2f}", f"{np.percentile(lat, 99):.2f}", "1.000")
+
+    t0 = time.perf_counter()
+    exact = ExactIndex()
+    exact.add(X)
+    build = time.perf_counter() - t0
+    truth, lat = time_queries(exact, Q, args.k)
+    table.add_row("exact", f"{build:.2f}", f"{np.percentile(lat, 50):.2f}", f"{np.percentile(lat, 99):.2f}", "1.000")
+
+    t0 = time.perf_counter()
+    ivf = IVFIndex(nlist=args.nlist)
+    ivf.add(X)
+    build = time.perf_counter() - t0
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        got, lat = time_queries(ivf, Q, args.k)
+        recall = np.mean([len(set(g) & set(t)) / len(t) for g, t in zip(got, truth)])
+        table.add_row(
+            f"ivf nprobe={nprobe}",
+            f"{build:.2f}",
+            f"{np.percentile(lat, 50):.2f}",
+            f"{np.percentile(lat, 99):.2f}",
+            f"{recall:.3f}",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
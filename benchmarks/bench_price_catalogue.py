@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from rich.table import Table
+
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.tools.csv_price_tool import CSVPriceTool
+from src.agentic_pipeline.tools.price_catalogue import PriceCatalogue
+
+from .generators import synthetic_catalogue
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t0) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="prices.csv via pandas vs memory-mapped columnar catalogue")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--access", type=int, default=10_000, help="Random row reads to time")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    names, skus = synthetic_catalogue(args.rows, rng)
+    prices = np.round(np.random.default_rng(0).uniform(1, 500, args.rows), 2)
+    rows = np.random.default_rng(1).integers(0, args.rows, args.access)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "prices.csv"
+        pd.DataFrame({"product_name": names, "sku": skus, "price_usd": prices}).to_csv(csv_path, index=False)
+        cache_dir = Path(tmp) / "cache"
+
+        table = Table(title=f"Price catalogue, {args.rows:,} rows")
+        for col in ["Step", "ms"]:
+            table.add_column(col)
+
+        df, ms = timed(lambda: pd.read_csv(csv_path))
+        table.add_row("pandas read_csv (old startup)", f"{ms:.1f}")
+        _, ms = timed(lambda: [(df.iloc[i]["product_name"], df.iloc[i]["sku"], float(df.iloc[i]["price_usd"])) for i in rows])
+        table.add_row(f"df.iloc x{args.access}", f"{ms:.1f}")
+
+        _, ms = timed(lambda: PriceCatalogue.open(csv_path, cache_dir))
+        table.add_row("columnar: first open (convert)", f"{ms:.1f}")
+        catalogue, ms = timed(lambda: PriceCatalogue.open(csv_path, cache_dir))
+        table.add_row("columnar: warm open (mmap)", f"{ms:.1f}")
+        _, ms = timed(lambda: [(catalogue.names[i], catalogue.skus[i], float(catalogue.prices[i])) for i in rows])
+        table.add_row(f"columnar access x{args.access}", f"{ms:.1f}")
+
+        # Hot reload while another thread keeps looking up prices
+        tool = CSVPriceTool(csv_path, cache_dir=cache_dir)
+        stop = threading.Event()
+        lat = []
+
+        def hammer() -> None:
+            while not stop.is_set():
+                _, ms = timed(lambda: tool.lookup(f"price of {names[rng.randrange(args.rows)]}"))
+                lat.append(ms)
+
+        worker = threading.Thread(target=hammer)
+        worker.start()
+        time.sleep(0.2)
+        with csv_path.open("a", encoding="utf-8") as f:
+            f.write("Brand New Thing,SKU-NEW,1.00\n")
+        changed, ms = timed(tool.refresh)
+        stop.set()
+        worker.join()
+        table.add_row(f"hot reload ({len(changed)} changed SKU)", f"{ms:.1f}")
+        table.add_row(f"lookups during reload: n / max ms", f"{len(lat)} / {max(lat):.1f}")
+        console.print(table)
+
+
+if __name__ == "__main__":
+    main()
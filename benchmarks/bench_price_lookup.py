@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from rich.table import Table
+
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.tools.product_index import ProductIndex
+
+from .generators import synthetic_catalogue
+
+TEMPLATES = ["What is the price of {}?", "How much does the {} cost?", "{} price", "price for {} please"]
+
+
+def typo(text: str, rng: random.Random) -> str:
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2 :]
+
+
+def percentiles(lat: List[float]) -> Tuple[str, str]:
+    return f"{np.percentile(lat, 50):.3f}", f"{np.percentile(lat, 99):.3f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="CSVPriceTool lookup latency vs catalogue size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=8, help="Queries per lookup_many call")
+    parser.add_argument("--scan-limit", type=int, default=1_000_000, help="Skip the old full scan above this size")
+    args = parser.parse_args()
+
+    table = Table(title="Price lookup: per-query list + WRatio scan (old) vs ProductIndex")
+    cols = ["Rows", "Build s", "Scan p50 ms", "Scan p99 ms", "Scan acc", "Index p50 ms", "Index p99 ms", "Index acc"]
+    for col in cols:
+        table.add_column(col)
+    batch_table = Table(title=f"{args.batch} queries: sequential best() vs one best_many() (cdist/cpdist)")
+    for col in ["Rows", "Sequential ms", "Batched ms"]:
+        batch_table.add_column(col)
+    for n in args.sizes:
+        rng = random.Random(n)
+        names, skus = synthetic_catalogue(n, rng)
+        queries, truth = [], []
+        for _ in range(args.queries):
+            row = rng.randrange(n)
+            truth.append(row)
+            name = names[row]
+            name = typo(name, rng) if rng.random() < 0.3 else name
+            queries.append(rng.choice(TEMPLATES).format(name.lower() if rng.random() < 0.3 else name))
+
+        t0 = time.perf_counter()
+        index = ProductIndex(names, skus)
+        build_s = time.perf_counter() - t0
+
+        lat_index, hits_index = [], []
+        for q, row in zip(queries, truth):
+            t0 = time.perf_counter()
+            match = index.best(q)
+            lat_index.append((time.perf_counter() - t0) * 1000)
+            hits_index.append(match is not None and names[match[0]] == names[row])
+
+        scan_cols, scan_acc = ("-", "-"), "-"
+        if n <= args.scan_limit:
+            lat_scan, hits_scan = [], []
+            for q, row in zip(queries, truth):
+                t0 = time.perf_counter()
+                # The pre-index lookup: rebuild the choice list, score every row
+                choices = list(names)
+                best = process.extractOne(q, choices, scorer=fuzz.WRatio)
+                lat_scan.append((time.perf_counter() - t0) * 1000)
+                hits_scan.append(best[0] == names[row])
+            scan_cols, scan_acc = percentiles(lat_scan), f"{np.mean(hits_scan):.0%}"
+        table.add_row(
+            f"{n:,}", f"{build_s:.2f}", *scan_cols, scan_acc, *percentiles(lat_index), f"{np.mean(hits_index):.0%}"
+        )
+
+        seq, batched = [], []
+        for s in range(0, len(queries) - args.batch + 1, args.batch):
+            chunk = queries[s : s + args.batch]
+            t0 = time.perf_counter()
+            for q in chunk:
+                index.best(q)
+            seq.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            index.best_many(chunk)
+            batched.append((time.perf_counter() - t0) * 1000)
+        batch_table.add_row(f"{n:,}", f"{np.median(seq):.2f}", f"{np.median(batched):.2f}")
+    console.print(table)
+    console.print(batch_table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from rich.table import Table
+
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.trace_sink import TraceSink
+from src.eval.quality import score_record, score_records
+
+from .generators import sentence
+
+
+def synthetic_trace(rng: random.Random, query: str, kb_chunks: List[str]) -> Dict:
+    picked = rng.sample(range(len(kb_chunks)), 4)
+    steps = [
+        {
+            "kind": "retrieval",
+            "detail": {"results": [{"doc_id": f"kb::{i}", "text": kb_chunks[i], "score": rng.random()} for i in picked]},
+            "at": "",
+        },
+        {"kind": "reasoning_tool_decision", "detail": {"decision": "use_tool"}, "at": ""},
+    ]
+    if rng.random() < 0.5:
+        steps.append({"kind": "tool_call_csv_price", "detail": {"product_name": "AlphaWidget Pro", "price_usd": 1.0}, "at": ""})
+    return {"trace_id": uuid.UUID(int=rng.getrandbits(128)).hex, "query": query, "steps": steps}
+
+
+def write_dataset(root: Path, n: int, seed: int = 0) -> Tuple[List[Dict], List[Dict]]:
+    """The same n records/traces twice: per-query JSON files and JSONL sink segments.
+
+    Like production logs, retrieval draws from a fixed set of KB chunks and
+    queries repeat (n / 5 distinct); every answer is distinct.
+    """
+    rng = random.Random(seed)
+    kb_chunks = [sentence(rng, 60) for _ in range(200)]
+    query_pool = [("How much does " if rng.random() < 0.4 else "What is the ") + sentence(rng, 6) for _ in range(max(1, n // 5))]
+    files_dir, sink_dir = root / "files", root / "traces"
+    files_dir.mkdir(parents=True)
+    sink = TraceSink(sink_dir, max_bytes=16 << 20)
+    file_records, sink_records = [], []
+    for i in range(n):
+        query = rng.choice(query_pool)
+        trace = synthetic_trace(rng, query, kb_chunks)
+        answer = sentence(rng, 40)
+        path = files_dir / f"trace_{i}.json"
+        path.write_text(json.dumps(trace), encoding="utf-8")
+        file_records.append({"query": query, "answer": answer, "trace_path": str(path)})
+        sink.submit(trace)
+        sink_records.append({"query": query, "answer": answer, "trace_path": str(sink_dir), "trace_id": trace["trace_id"]})
+    sink.close(timeout=None)
+    return file_records, sink_records
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-record vs batch quality scoring")
+    parser.add_argument("--sizes", type=str, default="10000,100000")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    table = Table(title="Quality scoring: score_record loop vs score_records batch")
+    for col in ["Records", "Per-record s", "Batch (files) s", "Batch (segments) s", "Speedup", "Identical"]:
+        table.add_column(col)
+    for n in [int(s) for s in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            file_records, sink_records = write_dataset(Path(tmp), n)
+
+            t0 = time.perf_counter()
+            reference = [score_record(r["query"], r["answer"], Path(r["trace_path"])) for r in file_records]
+            loop_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            batch_files = score_records(file_records, workers=args.workers)
+            files_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            batch_segments = score_records(sink_records, workers=args.workers)
+            segments_s = time.perf_counter() - t0
+
+        strip = lambda rows: [{k: v for k, v in r.items() if k != "trace_path"} for r in rows]  # noqa: E731
+        same = batch_files == reference and strip(batch_segments) == strip(reference)
+        table.add_row(
+            f"{n:,}",
+            f"{loop_s:.2f}",
+            f"{files_s:.2f}",
+            f"{segments_s:.2f}",
+            f"{loop_s / segments_s:.1f}x",
+            "yes" if same else "NO",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from rich.table import Table
+
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.retriever.index import ExactIndex
+from src.agentic_pipeline.retriever.quantized import QuantizedIndex
+
+from .bench_index import time_queries
+
+
+def embedding_like(n: int, basis: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # Text embeddings have far fewer degrees of freedom than dimensions: a low-rank signal plus a little noise
+    z = rng.standard_normal((n, basis.shape[0])).astype(np.float32)
+    return z @ basis + 0.05 * rng.standard_normal((n, basis.shape[1])).astype(np.float32)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memory per vector, latency and recall@k: float32 vs float16/int8/PQ")
+    parser.add_argument("--n", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=1536, help="text-embedding-3-small is 1536")
+    parser.add_argument("--rank", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[96, 192])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 100])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    basis = rng.standard_normal((args.rank, args.dim)).astype(np.float32) / np.sqrt(args.rank)
+    X = embedding_like(args.n, basis, rng)
+    Q = embedding_like(args.queries, basis, rng)
+
+    table = Table(title=f"N={args.n} dim={args.dim} k={args.k}, {args.queries} queries")
+    for col in ["Storage", "Re-rank", "RAM bytes/vector", "Build s", "p50 ms", "p99 ms", f"Recall@{args.k}"]:
+        table.add_column(col)
+
+    exact = ExactIndex()
+    exact.add(X)
+    truth, lat = time_queries(exact, Q, args.k)
+    table.add_row(
+        "float32 (exact)", "-", f"{args.dim * 4}", "-", f"{np.percentile(lat, 50):.2f}", f"{np.percentile(lat, 99):.2f}", "1.000"
+    )
+
+    configs: List[dict] = [{"codec": "float16"}, {"codec": "int8"}] + [{"codec": "pq", "pq_m": m} for m in args.pq_m]
+    with tempfile.TemporaryDirectory() as tmp:
+        for params in configs:
+            for rerank in args.rerank:
+                t0 = time.perf_counter()
+                index = QuantizedIndex(rerank=rerank, **params)
+                index.add(X)
+                build = time.perf_counter() - t0
+                if rerank:
+                    # As served from a snapshot: float32 rows memory-mapped, only candidates read
+                    state = index.state()
+                    path = Path(tmp) / "rows.npy"
+                    np.save(path, state["rows"])
+                    index = QuantizedIndex.from_state({**state, "rows": np.load(path, mmap_mode="r")}, rerank=rerank, **params)
+                got, lat = time_queries(index, Q, args.k)
+                recall = np.mean([len(set(g) & set(t)) / len(t) for g, t in zip(got, truth)])
+                label = params["codec"] + (f", m={params['pq_m']}" if "pq_m" in params else "")
+                table.add_row(
+                    label,
+                    f"top {rerank}, mmap" if rerank else "-",
+                    f"{index.bytes_per_vector:.0f}",
+                    f"{build:.2f}",
+                    f"{np.percentile(lat, 50):.2f}",
+                    f"{np.percentile(lat, 99):.2f}",
+                    f"{recall:.3f}",
+                )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from multiprocessing import get_context
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from rich.table import Table
+from rich.text import Text
+
+from src.agentic_pipeline.config import Config
+from src.agentic_pipeline.controller.agent import AgentController
+from src.agentic_pipeline.logging_utils import console
+
+from .fake_openai import SpawnedServer
+
+
+def replay(config: Config, queries: List[str], concurrency: int) -> Tuple[float, float, List[float], int, Counter]:
+    """Run ``queries`` through ``arun``; returns start/end wall-clock times, latencies, failures and transport stats."""
+    controller = AgentController(config=config)
+    controller.verbose = False
+
+    async def arun_all() -> List[Tuple[float, bool]]:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(q: str) -> Tuple[float, bool]:
+            async with sem:
+                t = time.perf_counter()
+                try:
+                    await controller.arun(q, save_trace=False)
+                    ok = True
+                except Exception:
+                    ok = False
+                return (time.perf_counter() - t) * 1000, ok
+
+        return await asyncio.gather(*(one(q) for q in queries))
+
+    start = time.time()
+    results = asyncio.run(arun_all())
+    end = time.time()
+    stats = Counter(controller.transport.stats)
+    controller.close()
+    return start, end, [ms for ms, _ in results], sum(not ok for _, ok in results), stats
+
+
+def _replay_shard(args: Tuple[Config, List[str], int]) -> Tuple[float, float, List[float], int, Counter]:
+    return replay(*args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Record the pipeline's API traffic once, then load-test arun against the replayed cassette"
+    )
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=500, help="queries in flight per process")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="stub server latency while recording")
+    parser.add_argument(
+        "--latency",
+        nargs="+",
+        default=["none", "recorded", "lognormal:100:400"],
+        help="replay latency models (see transport.LatencyModel)",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.05, help="injected failures in the last run")
+    args = parser.parse_args()
+
+    project_root = Path(__file__).resolve().parents[1]
+    base_queries = json.loads((project_root / "data" / "test_queries.json").read_text(encoding="utf-8"))
+    queries = [base_queries[i % len(base_queries)] for i in range(args.queries)]
+    console.quiet = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = dataclasses.replace(
+            Config.from_env(),
+            openai_api_key="fake",
+            cache_dir=None,
+            index_snapshot=None,
+            results_dir=Path(tmp),
+            trace_sink="json",
+            transport="record",
+            cassette=Path(tmp) / "cassette.jsonl",
+        )
+        # Record each distinct query once; replays cycle through the recordings
+        with SpawnedServer(latency_ms=args.latency_ms) as server:
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            controller = AgentController(config=config)
+            controller.verbose = False
+            for q in base_queries:
+                controller.run(q, save_trace=False)
+            recorded = controller.transport.stats["recorded"]
+            controller.close()
+        # Nothing listens here: any request that escaped the cassette would fail
+        os.environ["OPENAI_BASE_URL"] = "http://127.0.0.1:9/v1"
+
+        table = Table(
+            title=(
+                f"{args.queries} queries replayed from {recorded} recorded exchanges, "
+                f"{args.processes} x {args.concurrency} in flight"
+            )
+        )
+        for col in ["Latency", "Errors injected", "QPS", "p50 ms", "p99 ms", "Failed", "Replayed", "Injected"]:
+            table.add_column(col)
+        runs = [(spec, 0.0) for spec in args.latency] + [(args.latency[-1], args.error_rate)]
+        for spec, error_rate in runs:
+            replay_config = dataclasses.replace(
+                config, transport="replay", replay_latency=spec, replay_error_rate=error_rate
+            )
+            shards = [(replay_config, queries[i :: args.processes], args.concurrency) for i in range(args.processes)]
+            if args.processes > 1:
+                with get_context("fork").Pool(args.processes) as pool:
+                    parts = pool.map(_replay_shard, shards)
+            else:
+                parts = [_replay_shard(shards[0])]
+            wall = max(p[1] for p in parts) - min(p[0] for p in parts)
+            lat = [ms for p in parts for ms in p[2]]
+            stats: Counter = sum((p[4] for p in parts), Counter())
+            table.add_row(
+                Text(spec),
+                f"{error_rate:.0%}",
+                f"{len(lat) / wall:.0f}",
+                f"{np.percentile(lat, 50):.1f}",
+                f"{np.percentile(lat, 99):.1f}",
+                str(sum(p[3] for p in parts)),
+                str(stats["replayed"]),
+                str(sum(v for k, v in stats.items() if k.startswith("injected"))),
+            )
+        console.quiet = False
+        console.print(table)
+
+
+if __name__ == "__main__":
+    main()
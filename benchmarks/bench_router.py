@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from rich.table import Table
+
+from src.agentic_pipeline.config import Config
+from src.agentic_pipeline.controller.agent import AgentController
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.reasoner.router import ToolRouter
+
+from .fake_openai import SpawnedServer
+
+PRICE_TEMPLATES = [
+    "What is the price of {p}?", "How much does {p} cost?", "how much is {p}", "{p} price?",
+    "Price for {p} please", "What does {p} cost?", "What's the cost of a {p}?", "pricing of {p}",
+    "Tell me how much the {p} costs", "Give me the current price for {p}",
+]
+KB_TEMPLATES = [
+    "What is the warranty for {p}?", "What are the dimensions of {p}?", "Can I return {p}?",
+    "Do you ship {p} internationally?", "How do I file a warranty claim for {p}?",
+    "What payment methods can I use for {p}?", "Explain the difference between {p} and {q}",
+    "How long does shipping take for {p}?", "Is {p} covered for accidental damage?", "How heavy is {p}?",
+]
+
+
+def synthetic_queries(products: List[str], n: int, rng: random.Random) -> List[str]:
+    out = []
+    for _ in range(n):
+        tpl = rng.choice(PRICE_TEMPLATES if rng.random() < 0.4 else KB_TEMPLATES)
+        p, q = rng.sample(products, 2)
+        text = tpl.format(p=p, q=q)
+        out.append(text.lower() if rng.random() < 0.2 else text)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Router vs LLM tool decisions (stub LLM server)")
+    parser.add_argument("--synthetic", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.8, 0.9, 0.95])
+    args = parser.parse_args()
+
+    project_root = Path(__file__).resolve().parents[1]
+    test_queries = json.loads((project_root / "data" / "test_queries.json").read_text(encoding="utf-8"))
+    products = pd.read_csv(project_root / "data" / "prices.csv")["product_name"].astype(str).tolist()
+    rng = random.Random(0)
+    synthetic = synthetic_queries(products, args.synthetic, rng)
+
+    with SpawnedServer(latency_ms=args.latency_ms) as server, tempfile.TemporaryDirectory() as tmp:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        config = dataclasses.replace(
+            Config.from_env(), openai_api_key="fake", cache_dir=Path(tmp) / "cache", results_dir=Path(tmp)
+        )
+        controller = AgentController(config=config)
+
+        def llm_label(q: str) -> Tuple[str, float]:
+            retrieved = controller._retrieved_dicts(controller.retriever.search(q, k=4))
+            t0 = time.perf_counter()
+            decision = controller.reasoner.decide_tool(q, retrieved)
+            return decision.decision, (time.perf_counter() - t0) * 1000
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            labeled = list(pool.map(llm_label, synthetic + test_queries))
+
+    labels = [d for d, _ in labeled]
+    llm_ms = float(np.mean([ms for _, ms in labeled]))
+    split = int(0.7 * len(synthetic))
+    train_q, train_y = synthetic[:split], labels[:split]
+    sets = {
+        "synthetic held-out": (synthetic[split:], labels[split : len(synthetic)]),
+        "data/test_queries.json": (test_queries, labels[len(synthetic) :]),
+    }
+
+    table = Table(title=f"Router trained on {len(train_q)} traced decisions; LLM decision call ~{llm_ms:.0f} ms")
+    for col in ["Eval set", "Threshold", "LLM calls avoided", "Agreement", "Router-only agreement", "Saved ms/query"]:
+        table.add_column(col)
+    for threshold in args.thresholds:
+        router = ToolRouter(threshold=threshold).fit(train_q, train_y)
+        for name, (qs, ys) in sets.items():
+            t0 = time.perf_counter()
+            preds = router.predict(qs)
+            router_ms = (time.perf_counter() - t0) * 1000 / len(qs)
+            routed = [p.confidence >= threshold for p in preds]
+            final = [p.decision if r else y for p, r, y in zip(preds, routed, ys)]
+            agree = np.mean([f == y for f, y in zip(final, ys)])
+            routed_agree = [p.decision == y for p, r, y in zip(preds, routed, ys) if r]
+            avoided = np.mean(routed)
+            table.add_row(
+                name,
+                f"{threshold:.2f}",
+                f"{avoided:.0%}",
+                f"{agree:.1%}",
+                f"{np.mean(routed_agree):.1%}" if routed_agree else "-",
+                f"{avoided * llm_ms - router_ms:.1f}",
+            )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+import numpy as np
+from rich.table import Table
+
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.retriever.index import ExactIndex
+from src.agentic_pipeline.retriever.sharded import ShardedIndex
+
+from .bench_index import clustered_vectors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query throughput: per-query search vs batched search_many vs shards")
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=64, help="Queries per search_many call")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=sorted({1, 2, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = clustered_vectors(args.n, args.dim, 512, rng)
+    Q = clustered_vectors(args.queries, args.dim, 512, rng)
+    batches = [Q[i : i + args.batch] for i in range(0, len(Q), args.batch)]
+
+    table = Table(title=f"N={args.n} dim={args.dim} k={args.k}, {args.queries} queries, {os.cpu_count()} CPUs")
+    for col in ["Path", "QPS", "ms per batch", "Same top-k"]:
+        table.add_column(col)
+
+    exact = ExactIndex()
+    exact.add(X)
+    t0 = time.perf_counter()
+    truth = [exact.search(q, args.k)[0] for q in Q]
+    elapsed = time.perf_counter() - t0
+    table.add_row("exact, search per query", f"{len(Q) / elapsed:.0f}", "-", "1.000")
+
+    def run(index, label: str) -> None:
+        index.search_many(batches[0], args.k)  # warm-up: writes shards, starts the pool
+        t0 = time.perf_counter()
+        got = [idx for batch in batches for idx, _ in index.search_many(batch, args.k)]
+        elapsed = time.perf_counter() - t0
+        same = np.mean([len(set(g) & set(t)) / len(t) for g, t in zip(got, truth)])
+        table.add_row(label, f"{len(Q) / elapsed:.0f}", f"{elapsed / len(batches) * 1000:.1f}", f"{same:.3f}")
+
+    run(exact, f"exact, search_many x{args.batch}")
+    for n in args.shards:
+        sharded = ShardedIndex(shards=n, min_parallel_rows=0)
+        sharded.add(X)
+        where = f"{n} shards on {n} processes" if n > 1 else "1 shard, in-process"
+        run(sharded, f"sharded, {where}, search_many x{args.batch}")
+        sharded.close()
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from rich.table import Table
+
+from benchmarks.generators import write_catalogue
+from src.agentic_pipeline.config import Config
+from src.agentic_pipeline.logging_utils import console
+
+# Only imported when actually used: fitting TF-IDF, training the router, an API key, a CSV conversion
+HEAVY = ("sklearn", "pandas", "openai", "pyinstrument")
+# Builds (or loads) the index for the KB and the catalogue at argv[1]
+PREAMBLE = """
+import sys
+from dataclasses import replace
+from pathlib import Path
+from src.agentic_pipeline.config import Config
+from src.agentic_pipeline.controller.agent import AgentController
+from src.agentic_pipeline.index_snapshot import save_snapshot
+config = replace(Config.from_env(), prices_csv=Path(sys.argv[1]))
+"""
+CONSTRUCT = PREAMBLE + "AgentController(config).close()"
+BUILD = PREAMBLE + "save_snapshot(AgentController(replace(config, index_snapshot=None)), config.index_snapshot)"
+
+
+def importtime(module: str, env: Dict[str, str]) -> Dict[str, int]:
+    """Cumulative µs per module from one ``python -X importtime -c 'import module'``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line[len("import time:") :].split("|")
+        cumulative[name.strip()] = int(cum)
+    return cumulative
+
+
+def wall_ms(code: str, env: Dict[str, str], *argv: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code, *argv], env=env, check=True, capture_output=True)
+    return (time.perf_counter() - t0) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time of src.main and AgentController start-up, cold vs snapshot")
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--products", type=int, default=0, help="Start with a synthetic catalogue of this many rows")
+    parser.add_argument("--max-import-ms", type=float, default=800, help="Fail if the median import time exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache:
+        # No API key, so the TF-IDF path; a private cache so the user's .cache is untouched
+        env = {**os.environ, "OPENAI_API_KEY": "", "EMBEDDING_CACHE_DIR": cache, "PYTHONDONTWRITEBYTECODE": "1"}
+
+        totals: List[float] = []
+        per_module: Dict[str, List[int]] = defaultdict(list)
+        for _ in range(args.runs):
+            cumulative = importtime(args.module, env)
+            totals.append(cumulative[args.module] / 1000)
+            for name, us in cumulative.items():
+                per_module[name].append(us)
+        heavy = [m for m in HEAVY if m in per_module]
+        import_ms = statistics.median(totals)
+
+        table = Table(title=f"import {args.module}: median of {args.runs} runs")
+        for col in ["Module", "cumulative ms"]:
+            table.add_column(col)
+        top = sorted(per_module, key=lambda m: statistics.median(per_module[m]), reverse=True)
+        for name in top[: args.top]:
+            table.add_row(name, f"{statistics.median(per_module[name]) / 1000:.1f}")
+        console.print(table)
+
+        prices = str(Config.from_env().prices_csv)
+        if args.products:
+            prices = os.path.join(cache, "prices.csv")
+            write_catalogue(Path(prices), args.products)
+
+        def median_ms(run_env: Dict[str, str]) -> str:
+            return f"{statistics.median(wall_ms(CONSTRUCT, run_env, prices) for _ in range(args.runs)):.0f}"
+
+        table = Table(title=f"AgentController start-up, new process incl. imports ({args.products or 'data/'} products)")
+        for col in ["Start", "median ms"]:
+            table.add_column(col)
+        table.add_row("cold: no cache, no snapshot", median_ms({**env, "EMBEDDING_CACHE": "0", "INDEX_SNAPSHOT": "0"}))
+        warm = {**env, "INDEX_SNAPSHOT": "0"}
+        wall_ms(CONSTRUCT, warm, prices)  # fills the TF-IDF and catalogue caches
+        table.add_row("warm caches, no snapshot", median_ms(warm))
+        wall_ms(BUILD, env, prices)
+        table.add_row("snapshot", median_ms(env))
+        console.print(table)
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append(f"import {args.module} took {import_ms:.0f} ms (> {args.max_import_ms:.0f} ms)")
+    if heavy:
+        failures.append(f"import {args.module} pulled in {', '.join(heavy)}")
+    for failure in failures:
+        console.print(f"[red]REGRESSION[/red] {failure}")
+    if not failures:
+        console.print(f"[green]OK[/green] import {args.module}: {import_ms:.0f} ms (limit {args.max_import_ms:.0f} ms)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
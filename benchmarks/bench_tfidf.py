@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+from rich.table import Table
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.agentic_pipeline.logging_utils import console
+from src.agentic_pipeline.retriever.index import SparseIndex
+
+
+def synthetic_corpus(n_docs: int, vocab_size: int, doc_len: int, rng: np.random.Generator) -> List[str]:
+    # Zipf-distributed word ids give a realistic long-tail vocabulary
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    ids = np.minimum(rng.zipf(1.2, size=(n_docs, doc_len)) - 1, vocab_size - 1)
+    return [" ".join(vocab[j] for j in row) for row in ids]
+
+
+def percentiles(lat: List[float]) -> tuple[str, str]:
+    return f"{np.percentile(lat, 50):.3f}", f"{np.percentile(lat, 99):.3f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TF-IDF retrieval: dense (old) vs sparse inverted index")
+    parser.add_argument("--docs", type=int, default=20_000)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--doc-len", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--dense-limit-mb", type=float, default=2048, help="Skip the dense path above this size")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = synthetic_corpus(args.docs, args.vocab, args.doc_len, rng)
+    queries = synthetic_corpus(args.queries, args.vocab, 6, rng)
+
+    vectorizer = TfidfVectorizer(dtype=np.float32)
+    X = vectorizer.fit_transform(corpus).tocsr()
+    Q = vectorizer.transform(queries).tocsr()
+
+    table = Table(title=f"docs={args.docs} vocab={X.shape[1]} nnz={X.nnz}")
+    for col in ["Path", "Corpus MB", "p50 ms", "p99 ms"]:
+        table.add_column(col)
+
+    dense_mb = X.shape[0] * X.shape[1] * 4 / 1e6
+    if dense_mb <= args.dense_limit_mb:
+        A = X.toarray()
+        lat = []
+        for i in range(Q.shape[0]):
+            t0 = time.perf_counter()
+            # The pre-sparse VectorStore.query path
+            q = Q[i].toarray()[0]
+            denom = (np.linalg.norm(A, axis=1) * (np.linalg.norm(q) + 1e-8)) + 1e-8
+            sims = (A @ q) / denom
+            np.argsort(-sims)[: args.k]
+            lat.append((time.perf_counter() - t0) * 1000)
+        table.add_row("dense (toarray)", f"{A.nbytes / 1e6:.1f}", *percentiles(lat))
+        del A
+    else:
+        table.add_row("dense (toarray)", f"{dense_mb:.1f} (skipped)", "-", "-")
+
+    index = SparseIndex()
+    index.add(X)
+    lat = []
+    for i in range(Q.shape[0]):
+        t0 = time.perf_counter()
+        index.search(Q[i], args.k)
+        lat.append((time.perf_counter() - t0) * 1000)
+    csr_mb = (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) / 1e6
+    table.add_row("sparse (inverted index)", f"{2 * csr_mb:.1f} (CSR + CSC)", *percentiles(lat))
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
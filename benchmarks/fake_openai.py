@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim)
+    return (vec / np.linalg.norm(vec)).round(6).tolist()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The stdlib default backlog of 5 drops connections under concurrent load
+    request_queue_size = 1024
+
+
+class FakeOpenAIServer:
+    """Local OpenAI-compatible HTTP stub for offline tests and load benchmarks.
+
+    Serves ``POST /v1/embeddings`` with deterministic hash-seeded vectors and
+    ``POST /v1/chat/completions`` with a stub LLM: tool-decision prompts get a
+    keyword-based JSON decision, anything else a short canned answer.
+    ``latency_ms`` delays every response; ``error_rate`` answers that fraction of
+    requests with ``error_status`` (429 by default, with ``Retry-After``);
+    ``max_inputs`` rejects larger batches with 400 like the real API.
+    Chat requests with ``stream: true`` get server-sent event chunks, one word
+    every ``token_latency_ms``.
+
+    Prompt tokens are whitespace words. Like the real API's prompt caching, a
+    prompt prefix of at least ``cache_min_tokens`` seen before is reported as
+    ``cached_tokens`` in ``cache_block``-token steps, and only the uncached
+    tokens cost ``prompt_token_latency_ms`` each.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        dim: int = 64,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        retry_after: Optional[float] = None,
+        max_inputs: int = 2048,
+        seed: int = 0,
+        token_latency_ms: float = 0.0,
+        prompt_token_latency_ms: float = 0.0,
+        cache_min_tokens: int = 1024,
+        cache_block: int = 128,
+    ) -> None:
+        self.dim = dim
+        self.token_latency_ms = token_latency_ms
+        self.prompt_token_latency_ms = prompt_token_latency_ms
+        self.cache_min_tokens = cache_min_tokens
+        self.cache_block = cache_block
+        self._prefixes: Set[str] = set()
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.max_inputs = max_inputs
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "errors": 0, "inputs": 0}
+        self._server = _Server((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server._handle(self, body)
+
+        return Handler
+
+    def _handle(self, h, body: Dict[str, Any]) -> None:
+        with self._lock:
+            self.stats["requests"] += 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if fail:
+            headers = {"retry-after": str(self.retry_after)} if self.retry_after is not None else None
+            h._send(self.error_status, {"error": {"message": "injected failure", "type": "fake"}}, headers)
+            return
+        path = h.path.rstrip("/")
+        if path.endswith("/embeddings"):
+            self._embeddings(h, body)
+        elif path.endswith("/chat/completions"):
+            self._chat(h, body)
+        else:
+            h._send(404, {"error": {"message": f"unknown path {h.path}"}})
+
+    def _embeddings(self, h, body: Dict[str, Any]) -> None:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if len(inputs) > self.max_inputs:
+            h._send(400, {"error": {"message": f"too many inputs: {len(inputs)} > {self.max_inputs}"}})
+            return
+        with self._lock:
+            self.stats["inputs"] += len(inputs)
+        data = [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(t, self.dim)} for i, t in enumerate(inputs)
+        ]
+        tokens = sum(len(t.split()) for t in inputs)
+        h._send(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+    @staticmethod
+    def stub_reply(messages: List[Dict[str, Any]]) -> str:
+        system = next((str(m.get("content", "")) for m in messages if m.get("role") == "system"), "")
+        user = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        query = user.split("\n", 1)[0].removeprefix("Query: ")
+        if "Return JSON" in system:
+            price = any(k in query.lower() for k in ["price", "cost", "how much", "pricing"])
+            return json.dumps(
+                {"decision": "use_tool" if price else "kb_only", "rationale": "stub: keyword match" if price else "stub"}
+            )
+        return f"Stub answer to: {query}"
+
+    def _prefill(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Usage for the prompt; sleeps for the tokens not served from the prefix cache."""
+        words = [w for m in messages for w in str(m.get("content", "")).split()]
+        # Chained hashes of each block-aligned prefix: a prefix hit implies all shorter ones
+        digest, prefixes, cached = hashlib.sha256(), [], 0
+        for end in range(self.cache_block, len(words) + 1, self.cache_block):
+            digest.update((" ".join(words[end - self.cache_block : end]) + "\n").encode("utf-8"))
+            if end >= self.cache_min_tokens:
+                prefixes.append((end, digest.hexdigest()))
+        with self._lock:
+            for end, key in prefixes:
+                if key not in self._prefixes:
+                    break
+                cached = end
+            self._prefixes.update(key for _, key in prefixes)
+        if self.prompt_token_latency_ms:
+            time.sleep((len(words) - cached) * self.prompt_token_latency_ms / 1000)
+        return {"prompt_tokens": len(words), "prompt_tokens_details": {"cached_tokens": cached}}
+
+    def _stream_chat(self, h, body: Dict[str, Any], content: str, usage: Dict[str, Any]) -> None:
+        h.send_response(200)
+        h.send_header("Content-Type", "text/event-stream")
+        h.send_header("Cache-Control", "no-cache")
+        h.end_headers()
+
+        def chunk(delta: Dict[str, str], finish: Optional[str] = None) -> None:
+            event = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            h.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            h.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for i, word in enumerate(content.split(" ")):
+            if self.token_latency_ms:
+                time.sleep(self.token_latency_ms / 1000)
+            chunk({"content": word if i == 0 else " " + word})
+        chunk({}, finish="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            completion_tokens = len(content.split())
+            event = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [],
+                "usage": {
+                    **usage,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": usage["prompt_tokens"] + completion_tokens,
+                },
+            }
+            h.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        h.wfile.write(b"data: [DONE]\n\n")
+        h.wfile.flush()
+
+    def _chat(self, h, body: Dict[str, Any]) -> None:
+        messages = body.get("messages", [])
+        content = self.stub_reply(messages)
+        usage = self._prefill(messages)
+        if body.get("stream"):
+            self._stream_chat(h, body, content, usage)
+            return
+        completion_tokens = len(content.split())
+        h._send(
+            200,
+            {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                ],
+                "usage": {
+                    **usage,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": usage["prompt_tokens"] + completion_tokens,
+                },
+            },
+        )
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+class SpawnedServer:
+    """Runs the fake server in a child process so it does not share our GIL."""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        dim: int = 64,
+        token_latency_ms: float = 0.0,
+        prompt_token_latency_ms: float = 0.0,
+        cache_min_tokens: int = 1024,
+        cache_block: int = 128,
+    ) -> None:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.args = [
+            sys.executable, "-m", "benchmarks.fake_openai", "--port", str(self.port),
+            "--latency-ms", str(latency_ms), "--error-rate", str(error_rate), "--dim", str(dim),
+            "--token-latency-ms", str(token_latency_ms), "--prompt-token-latency-ms", str(prompt_token_latency_ms),
+            "--cache-min-tokens", str(cache_min_tokens), "--cache-block", str(cache_block),
+        ]
+        self._proc: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __enter__(self) -> "SpawnedServer":
+        self._proc = subprocess.Popen(self.args, stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        self.__exit__()
+        raise RuntimeError("fake OpenAI server did not start")
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._proc is not None:
+            self._proc.terminate()
+            self._proc.wait()
+            self._proc = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI-compatible server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Delay per streamed word")
+    parser.add_argument("--prompt-token-latency-ms", type=float, default=0.0, help="Delay per uncached prompt word")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024, help="Shortest prompt prefix that is cached")
+    parser.add_argument("--cache-block", type=int, default=128, help="Prefix cache granularity, in words")
+    args = parser.parse_args()
+    server = FakeOpenAIServer(
+        port=args.port,
+        dim=args.dim,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        token_latency_ms=args.token_latency_ms,
+        prompt_token_latency_ms=args.prompt_token_latency_ms,
+        cache_min_tokens=args.cache_min_tokens,
+        cache_block=args.cache_block,
+    )
+    print(f"Serving on {server.base_url} (set OPENAI_BASE_URL to this)")
+    server._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import csv
+import random
+from pathlib import Path
+from typing import List, Tuple
+
+# Product names: brand syllables + kind + variant + model number
+SYLLABLES = ["al", "be", "ta", "ga", "ma", "del", "om", "ze", "ka", "ro", "vi", "lu", "nex", "tor", "qua", "syn"]
+KINDS = ["Widget", "Gadget", "Device", "Tool", "Accessory", "Sensor", "Module", "Hub", "Cable", "Dock"]
+VARIANTS = ["Pro", "Mini", "Plus", "Basic", "Lite", "Max", "Ultra", "S", "X", "Air"]
+
+# KB prose: policy/product vocabulary with some filler, like data/kb
+WORDS = (
+    "warranty return policy price shipping international discount bulk payment card invoice refund "
+    "alphawidget betagadget deltadevice omegaaccessory cable pro mini plus dimensions weight battery "
+    "days weeks business order customer support claim receipt defect damage accessories express"
+).split()
+FILLER = ["the", "a", "is", "of", "to", "and", "for", "with"]
+TOPICS = ["warranty", "returns", "shipping", "discounts", "payments", "dimensions", "support", "accessories"]
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) if rng.random() < 0.7 else rng.choice(FILLER) for _ in range(n)).capitalize() + "."
+
+
+def synthetic_catalogue(n: int, rng: random.Random) -> Tuple[List[str], List[str]]:
+    """``n`` distinct product names and their SKUs."""
+    names, seen = [], set()
+    while len(names) < n:
+        brand = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        name = f"{brand}{rng.choice(KINDS)} {rng.choice(VARIANTS)} {rng.randint(1, 999)}"
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names, [f"SKU-{i:07d}" for i in range(n)]
+
+
+def write_catalogue(path: Path, n: int, seed: int = 0) -> List[str]:
+    """A ``prices.csv`` of ``n`` rows at ``path``; returns the product names."""
+    rng = random.Random(seed)
+    names, skus = synthetic_catalogue(n, rng)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["product_name", "sku", "price_usd"])
+        writer.writerows((name, sku, f"{rng.uniform(1, 500):.2f}") for name, sku in zip(names, skus))
+    return names
+
+
+def write_kb(kb_dir: Path, n_docs: int, seed: int = 0, sentences: Tuple[int, int] = (4, 40)) -> Path:
+    """``n_docs`` KB ``.txt`` files of a few to a few dozen sentences each, like ``data/kb``.
+
+    Document lengths vary, so larger docs split into several chunks at ingestion.
+    """
+    rng = random.Random(seed)
+    kb_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(n_docs):
+        lo, hi = sentences
+        text = " ".join(sentence(rng, rng.randint(6, 18)) for _ in range(rng.randint(lo, hi)))
+        (kb_dir / f"{rng.choice(TOPICS)}_{i:07d}.txt").write_text(text + "\n", encoding="utf-8")
+    return kb_dir
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import dataclasses
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from rich.table import Table
+
+from src.agentic_pipeline.config import Config
+from src.agentic_pipeline.controller.agent import AgentController
+from src.agentic_pipeline.logging_utils import Trace, console
+from src.agentic_pipeline.retriever.loader import iter_kb_chunks, load_kb_from_dir
+from src.agentic_pipeline.retriever.vector_store import VectorDoc, VectorStore
+from src.agentic_pipeline.tools.csv_price_tool import CSVPriceTool
+from src.eval.quality import score_record
+
+from .bench_price_lookup import TEMPLATES, typo
+from .bench_quality import synthetic_trace
+from .generators import sentence, write_catalogue, write_kb
+
+# KB sizes (docs) and catalogue sizes (rows) per scale; e2e runs on the smallest non-trivial pair
+SCALES: Dict[str, Dict[str, Any]] = {
+    "smoke": {"kb_docs": [10, 1000], "catalogue_rows": [1000, 10_000], "e2e": (100, 1000)},
+    "default": {"kb_docs": [10, 1000, 10_000], "catalogue_rows": [1000, 100_000], "e2e": (1000, 10_000)},
+    "full": {
+        "kb_docs": [10, 1000, 100_000, 1_000_000],
+        "catalogue_rows": [1000, 100_000, 1_000_000],
+        "e2e": (10_000, 100_000),
+    },
+}
+QUERIES = 200
+
+
+def timings(fn: Callable[[], Any], runs: int, warmup: int = 1) -> Dict[str, float]:
+    """p50/p99/mean wall time of ``fn`` over ``runs`` calls, after ``warmup`` untimed ones."""
+    for _ in range(warmup):
+        fn()
+    lat = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        lat.append((time.perf_counter() - t0) * 1000)
+    return {
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "mean_ms": float(np.mean(lat)),
+    }
+
+
+def once_ms(fn: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+class Data:
+    """Generated KBs and catalogues under ``root``, reused across runs with the same seed."""
+
+    def __init__(self, root: Path, seed: int) -> None:
+        self.root = root
+        self.seed = seed
+
+    def kb(self, n_docs: int) -> Path:
+        path = self.root / f"kb-{n_docs}-seed{self.seed}"
+        if not (path / ".complete").exists():
+            shutil.rmtree(path, ignore_errors=True)
+            console.print(f"generating a {n_docs}-doc KB in {path}")
+            write_kb(path, n_docs, seed=self.seed)
+            (path / ".complete").touch()
+        return path
+
+    def catalogue(self, rows: int) -> Path:
+        path = self.root / f"prices-{rows}-seed{self.seed}.csv"
+        if not path.exists():
+            write_catalogue(path.with_suffix(".tmp"), rows, seed=self.seed)
+            os.replace(path.with_suffix(".tmp"), path)
+        return path
+
+    def product_names(self, rows: int, n: int) -> List[str]:
+        with self.catalogue(rows).open(newline="", encoding="utf-8") as f:
+            names = [row["product_name"] for row in csv.DictReader(f)]
+        return random.Random(self.seed).sample(names, min(n, len(names)))
+
+
+def bench_load_kb(data: Data, n_docs: int) -> Dict[str, float]:
+    kb = data.kb(n_docs)
+    runs = 1 if n_docs >= 100_000 else 5
+    ms = float(np.median([once_ms(lambda: load_kb_from_dir(kb)) for _ in range(runs)]))
+    return {"wall_ms": ms, "docs_per_s": n_docs / ms * 1000}
+
+
+def bench_vector_store(data: Data, n_docs: int) -> Dict[str, float]:
+    # TF-IDF (no API key), as offline as the rest of the suite
+    chunks = [VectorDoc(d.doc_id, d.text) for d in iter_kb_chunks(data.kb(n_docs))]
+    # Warm-up: the first fit imports scikit-learn
+    VectorStore("text-embedding-3-small", None).add(chunks[:8])
+    store = VectorStore("text-embedding-3-small", None)
+    add_ms = once_ms(lambda: store.add(chunks))
+    rng = random.Random(data.seed)
+    queries = iter([sentence(rng, 6) for _ in range(QUERIES + 1)])
+    query = timings(lambda: store.query(next(queries), k=4), QUERIES)
+    return {"chunks": len(chunks), "add_ms": add_ms, **{f"query_{k}": v for k, v in query.items()}}
+
+
+def bench_csv_lookup(data: Data, rows: int) -> Dict[str, float]:
+    t0 = time.perf_counter()
+    tool = CSVPriceTool(data.catalogue(rows))
+    load_ms = (time.perf_counter() - t0) * 1000
+    rng = random.Random(data.seed)
+    names = data.product_names(rows, QUERIES + 1)
+    # Half exact names, half with a transposition, in question templates
+    queries = iter([rng.choice(TEMPLATES).format(typo(n, rng) if i % 2 else n) for i, n in enumerate(names)])
+    lookup = timings(lambda: tool.lookup(next(queries)), len(names) - 1)
+    return {"load_ms": load_ms, **{f"lookup_{k}": v for k, v in lookup.items()}}
+
+
+def _trace(rng: random.Random, snippets: int) -> Trace:
+    trace = Trace.start("How much does the AlphaWidget Pro cost?")
+    results = [{"doc_id": f"kb#{i}", "text": sentence(rng, 60), "score": rng.random()} for i in range(snippets)]
+    with trace.span("retrieval", k=snippets):
+        trace.add("retrieval", {"results": results})
+    with trace.span("decision"):
+        trace.add("reasoning_tool_decision", {"decision": "use_tool", "source": "heuristic"})
+    with trace.span("synthesis"):
+        trace.add("synthesis", {"answer": sentence(rng, 40)})
+    trace.finish()
+    return trace
+
+
+def bench_trace_save(data: Data, snippets: int) -> Dict[str, float]:
+    trace = _trace(random.Random(data.seed), snippets)
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "trace.json"
+        return timings(lambda: trace.save_json(out), QUERIES)
+
+
+def bench_score_record(data: Data, snippets: int) -> Dict[str, float]:
+    rng = random.Random(data.seed)
+    kb_chunks = [sentence(rng, 60) for _ in range(max(snippets, 4))]
+    trace = synthetic_trace(rng, "How much does the AlphaWidget Pro cost?", kb_chunks)
+    trace["steps"][0]["detail"]["results"] *= max(1, snippets // 4)
+    answer = sentence(rng, 40)
+    path = Path("trace.json")
+    return timings(lambda: score_record(trace["query"], answer, path, trace=trace), QUERIES * 5)
+
+
+def bench_end_to_end(data: Data, size: Tuple[int, int]) -> Dict[str, float]:
+    """AgentController.run on a generated KB and catalogue; no API key, so the reasoner is the heuristic stub."""
+    n_docs, rows = size
+    with tempfile.TemporaryDirectory() as tmp:
+        config = dataclasses.replace(
+            Config.from_env(),
+            kb_dir=data.kb(n_docs),
+            prices_csv=data.catalogue(rows),
+            openai_api_key=None,
+            cache_dir=Path(tmp) / "cache",
+            index_snapshot=None,
+            results_dir=Path(tmp),
+            trace_dir=Path(tmp) / "traces",
+            router_enabled=False,
+            response_cache=False,
+            metrics_path=None,
+            profile=None,
+        )
+        t0 = time.perf_counter()
+        controller = AgentController(config)
+        startup_ms = (time.perf_counter() - t0) * 1000
+        rng = random.Random(data.seed)
+        names = data.product_names(rows, QUERIES)
+        # Alternating KB questions and price questions
+        queries = iter([rng.choice(TEMPLATES).format(n) if i % 2 else sentence(rng, 8) for i, n in enumerate(names)])
+        console.quiet = True
+        try:
+            run = timings(lambda: controller.run(next(queries), save_trace=False), len(names) - 1)
+        finally:
+            console.quiet = False
+            controller.close()
+    return {"startup_ms": startup_ms, **run, "requests_per_s": 1000 / run["mean_ms"]}
+
+
+# case -> (function, scale -> [(label, param)])
+CASES: Dict[str, Tuple[Callable[[Data, Any], Dict[str, float]], Callable[[Dict[str, Any]], List[Tuple[str, Any]]]]] = {
+    "load_kb": (bench_load_kb, lambda s: [(f"docs={n}", n) for n in s["kb_docs"]]),
+    "vector_store": (bench_vector_store, lambda s: [(f"docs={n}", n) for n in s["kb_docs"]]),
+    "csv_lookup": (bench_csv_lookup, lambda s: [(f"rows={n}", n) for n in s["catalogue_rows"]]),
+    "trace_save_json": (bench_trace_save, lambda s: [(f"snippets={n}", n) for n in (4, 50)]),
+    "score_record": (bench_score_record, lambda s: [(f"snippets={n}", n) for n in (4, 50)]),
+    "end_to_end": (bench_end_to_end, lambda s: [("docs={},rows={}".format(*s["e2e"]), s["e2e"])]),
+}
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def direction(metric: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if not compared (counts)."""
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith("_ms"):
+        return -1
+    return 0
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float, min_delta_ms: float) -> int:
+    """Print current vs baseline per metric; returns the number of regressions."""
+    table = Table(title=f"vs baseline {baseline['env'].get('commit') or ''} ({baseline['env']['created_at']})")
+    for col in ["Case", "Metric", "Baseline", "Current", "Change", ""]:
+        table.add_column(col, overflow="fold")
+    regressions = 0
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            table.add_row(name, "-", "-", "-", "-", "new")
+            continue
+        for metric, value in result.items():
+            sign = direction(metric)
+            if not sign or metric not in base or not base[metric]:
+                continue
+            change = value / base[metric] - 1
+            worse = -sign * change > tolerance
+            if worse and metric.endswith("_ms") and abs(value - base[metric]) < min_delta_ms:
+                worse = False  # within timer noise
+            better = sign * change > tolerance
+            # Tail latency is shown but too noisy on shared machines to fail a run
+            gated = "p99" not in metric
+            regressions += worse and gated
+            mark = "[green]faster[/green]" if better else ""
+            if worse:
+                mark = "[red]REGRESSION[/red]" if gated else "[yellow]slower (p99, not gated)[/yellow]"
+            table.add_row(name, metric, f"{base[metric]:.3f}", f"{value:.3f}", f"{change:+.1%}", mark)
+    console.print(table)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline component benchmarks on generated data, as JSON")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="default")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="Run only these cases")
+    parser.add_argument("--kb-docs", type=int, nargs="+", help="Override the scale's KB sizes")
+    parser.add_argument("--catalogue-rows", type=int, nargs="+", help="Override the scale's catalogue sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=Path(".cache/bench-data"), help="Generated data, kept for reuse")
+    parser.add_argument("--out", type=Path, default=Path("results/bench_suite.json"))
+    parser.add_argument("--compare", type=Path, help="Baseline JSON from an earlier run; exit 1 on regressions")
+    parser.add_argument("--results", type=Path, help="With --compare: compare this file instead of running")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Relative slowdown that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore smaller absolute timing changes")
+    args = parser.parse_args()
+
+    if args.results is not None:
+        current = json.loads(args.results.read_text(encoding="utf-8"))
+    else:
+        scale = dict(SCALES[args.scale])
+        scale["kb_docs"] = args.kb_docs or scale["kb_docs"]
+        scale["catalogue_rows"] = args.catalogue_rows or scale["catalogue_rows"]
+        data = Data(args.data_dir, args.seed)
+        current = {"env": {**environment(), "scale": args.scale, "seed": args.seed}, "results": {}}
+        for case in args.only or CASES:
+            fn, params = CASES[case]
+            for label, param in params(scale):
+                name = f"{case}/{label}"
+                console.print(f"[bold]{name}[/bold]")
+                current["results"][name] = fn(data, param)
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(current, indent=2), encoding="utf-8")
+
+        table = Table(title=f"scale={args.scale}, written to {args.out}")
+        for col in ["Case", "Metrics"]:
+            table.add_column(col)
+        for name, result in current["results"].items():
+            table.add_row(name, ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+        console.print(table)
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(baseline, current, args.tolerance, args.min_delta_ms)
+        if regressions:
+            console.print(f"[red]{regressions} regression(s)[/red] beyond {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
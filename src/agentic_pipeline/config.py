@@ -1,7 +1,7 @@
 import os
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -19,6 +19,91 @@ class Config:
     embedding_model: str
     prompt_version: str
 
+    # Persistent embedding / TF-IDF cache; None disables it
+    cache_dir: Optional[Path] = None
+    # Prebuilt index written by `python -m src.build_index`; used when it matches
+    # the current settings, KB and prices.csv. None disables it
+    index_snapshot: Optional[Path] = None
+
+    # Retrieval index: "exact", "ivf" (approximate), "sharded" (exact, scored on
+    # a process pool) or "quantized" (compressed rows; see retriever/quantized.py)
+    index_backend: str = "exact"
+    ivf_nlist: Optional[int] = None
+    ivf_nprobe: int = 8
+    # Shards (and worker processes) for the sharded backend; 0 = one per CPU
+    index_shards: int = 0
+    # Quantized backend: "float16", "int8" or "pq"; candidates re-scored in float32
+    # (0 = none); PQ sub-vectors per row (0 = one per 16 dimensions)
+    index_codec: str = "int8"
+    index_rerank: int = 0
+    pq_m: int = 0
+
+    # KB ingestion: sentence-bounded chunks of whitespace tokens, fed in batches
+    chunk_tokens: int = 200
+    chunk_overlap: int = 40
+    ingest_batch_size: int = 256
+
+    # Embedding requests: batch caps, worker pool, retries, query coalescing window
+    embed_batch_size: int = 256
+    embed_max_workers: int = 4
+    embed_max_retries: int = 5
+    embed_coalesce_ms: float = 2.0
+
+    # Start the CSV lookup in parallel with the tool-decision call
+    speculative_tools: bool = False
+
+    # Local classifier in front of the tool-decision LLM call
+    router_enabled: bool = False
+    router_threshold: float = 0.9
+    router_path: Optional[Path] = None
+
+    # Multi-product questions: each mention must match a product at least this well
+    multi_product_min_score: float = 80.0
+
+    # Answer cache in front of run/arun: exact normalized-query tier plus a
+    # semantic tier (query-embedding cosine >= threshold; > 1 disables it)
+    response_cache: bool = False
+    response_cache_size: int = 1024
+    response_cache_ttl: float = 3600.0
+    response_cache_threshold: float = 0.95
+
+    # Poll data/kb and apply changed files to a running controller
+    kb_watch: bool = False
+    kb_watch_interval: float = 0.25
+
+    # Span timings in trace files; optional Prometheus text-format metrics file;
+    # per-request profiler ("cprofile" or "pyinstrument")
+    trace_spans: bool = True
+    metrics_path: Optional[Path] = None
+    profile: Optional[str] = None
+
+    # Concurrent LLM calls per process; 0 means unlimited
+    llm_max_inflight: int = 0
+
+    # Token budget for the retrieved context in LLM prompts (0, the default:
+    # fixed per-snippet character slices), the near-duplicate containment cut-off,
+    # and the minimum snippet score as a fraction of the best one
+    context_tokens: int = 0
+    context_dedup: float = 0.8
+    context_min_score: float = 0.2
+
+    # Where saved traces go: "jsonl" appends to rotating segments under
+    # trace_dir from a background thread; "json" writes one trace_<query>.json each
+    trace_sink: str = "jsonl"
+    trace_dir: Optional[Path] = None
+    trace_compress: bool = False
+    trace_segment_mb: float = 64.0
+    trace_max_segments: Optional[int] = None
+
+    # Record the OpenAI traffic to a cassette ("record") or serve it from one
+    # ("replay", no network); replayed latency ("recorded", "recorded*0.5",
+    # "none", "fixed:<ms>", "lognormal:<p50>:<p99>") and injected failures
+    transport: Optional[str] = None
+    cassette: Optional[Path] = None
+    replay_latency: str = "recorded"
+    replay_error_rate: float = 0.0
+    replay_errors: Tuple[str, ...] = ("429", "500", "timeout")
+
     @staticmethod
     def from_env() -> "Config":
         load_dotenv(override=False)
@@ -34,6 +119,58 @@ class Config:
         llm_model = os.environ.get("LLM_MODEL", "gpt-4o-mini")
         embedding_model = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
         prompt_version = os.environ.get("PROMPT_VERSION", "v1")
+        cache_dir: Optional[Path] = Path(os.environ.get("EMBEDDING_CACHE_DIR", project_root / ".cache"))
+        if os.environ.get("EMBEDDING_CACHE", "1").lower() in ("0", "false", "no", "off"):
+            cache_dir = None
+        index_snapshot: Optional[Path] = cache_dir / "snapshot" if cache_dir is not None else None
+        if os.environ.get("INDEX_SNAPSHOT"):
+            off = os.environ["INDEX_SNAPSHOT"].lower() in ("0", "false", "no", "off")
+            index_snapshot = None if off else Path(os.environ["INDEX_SNAPSHOT"])
+        index_backend = os.environ.get("INDEX_BACKEND", "exact")
+        ivf_nlist = int(os.environ["IVF_NLIST"]) if os.environ.get("IVF_NLIST") else None
+        ivf_nprobe = int(os.environ.get("IVF_NPROBE", "8"))
+        index_shards = int(os.environ.get("INDEX_SHARDS", "0"))
+        index_codec = os.environ.get("INDEX_CODEC", "int8")
+        index_rerank = int(os.environ.get("INDEX_RERANK", "0"))
+        pq_m = int(os.environ.get("PQ_M", "0"))
+        chunk_tokens = int(os.environ.get("CHUNK_TOKENS", "200"))
+        chunk_overlap = int(os.environ.get("CHUNK_OVERLAP", "40"))
+        ingest_batch_size = int(os.environ.get("INGEST_BATCH_SIZE", "256"))
+        embed_batch_size = int(os.environ.get("EMBED_BATCH_SIZE", "256"))
+        embed_max_workers = int(os.environ.get("EMBED_MAX_WORKERS", "4"))
+        embed_max_retries = int(os.environ.get("EMBED_MAX_RETRIES", "5"))
+        embed_coalesce_ms = float(os.environ.get("EMBED_COALESCE_MS", "2"))
+        speculative_tools = os.environ.get("SPECULATIVE_TOOLS", "0").lower() in ("1", "true", "yes", "on")
+        router_enabled = os.environ.get("ROUTER", "0").lower() in ("1", "true", "yes", "on")
+        router_threshold = float(os.environ.get("ROUTER_THRESHOLD", "0.9"))
+        router_path = Path(os.environ.get("ROUTER_PATH", results_dir / "router.pkl"))
+        multi_product_min_score = float(os.environ.get("MULTI_PRODUCT_MIN_SCORE", "80"))
+        response_cache = os.environ.get("RESPONSE_CACHE", "0").lower() in ("1", "true", "yes", "on")
+        response_cache_size = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+        response_cache_ttl = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+        response_cache_threshold = float(os.environ.get("RESPONSE_CACHE_THRESHOLD", "0.95"))
+        kb_watch = os.environ.get("KB_WATCH", "0").lower() in ("1", "true", "yes", "on")
+        kb_watch_interval = float(os.environ.get("KB_WATCH_INTERVAL", "0.25"))
+        trace_spans = os.environ.get("TRACE_SPANS", "1").lower() in ("1", "true", "yes", "on")
+        metrics_path = Path(os.environ["METRICS_PATH"]) if os.environ.get("METRICS_PATH") else None
+        profile = os.environ.get("PROFILE") or None
+        llm_max_inflight = int(os.environ.get("LLM_MAX_INFLIGHT", "0"))
+        context_tokens = int(os.environ.get("CONTEXT_TOKENS", "0"))
+        context_dedup = float(os.environ.get("CONTEXT_DEDUP", "0.8"))
+        context_min_score = float(os.environ.get("CONTEXT_MIN_SCORE", "0.2"))
+        trace_sink = os.environ.get("TRACE_SINK", "jsonl")
+        trace_dir = Path(os.environ.get("TRACE_DIR", results_dir / "traces"))
+        trace_compress = os.environ.get("TRACE_COMPRESS", "0").lower() in ("1", "true", "yes", "on")
+        trace_segment_mb = float(os.environ.get("TRACE_SEGMENT_MB", "64"))
+        trace_max_segments = int(os.environ["TRACE_MAX_SEGMENTS"]) if os.environ.get("TRACE_MAX_SEGMENTS") else None
+        transport = os.environ.get("TRANSPORT") or None
+        cassette = Path(os.environ.get("CASSETTE", results_dir / "cassette.jsonl"))
+        replay_latency = os.environ.get("REPLAY_LATENCY", "recorded")
+        replay_error_rate = float(os.environ.get("REPLAY_ERROR_RATE", "0"))
+        replay_errors = tuple(e.strip() for e in os.environ.get("REPLAY_ERRORS", "429,500,timeout").split(",") if e.strip())
+        if transport == "replay" and not openai_api_key:
+            # Replay never reaches the API, but the SDK clients still want a key
+            openai_api_key = "replay"
 
         return Config(
             project_root=project_root,
@@ -45,6 +182,50 @@ class Config:
             llm_model=llm_model,
             embedding_model=embedding_model,
             prompt_version=prompt_version,
+            cache_dir=cache_dir,
+            index_snapshot=index_snapshot,
+            index_backend=index_backend,
+            ivf_nlist=ivf_nlist,
+            ivf_nprobe=ivf_nprobe,
+            index_shards=index_shards,
+            index_codec=index_codec,
+            index_rerank=index_rerank,
+            pq_m=pq_m,
+            chunk_tokens=chunk_tokens,
+            chunk_overlap=chunk_overlap,
+            ingest_batch_size=ingest_batch_size,
+            embed_batch_size=embed_batch_size,
+            embed_max_workers=embed_max_workers,
+            embed_max_retries=embed_max_retries,
+            embed_coalesce_ms=embed_coalesce_ms,
+            speculative_tools=speculative_tools,
+            router_enabled=router_enabled,
+            router_threshold=router_threshold,
+            router_path=router_path,
+            multi_product_min_score=multi_product_min_score,
+            response_cache=response_cache,
+            response_cache_size=response_cache_size,
+            response_cache_ttl=response_cache_ttl,
+            response_cache_threshold=response_cache_threshold,
+            kb_watch=kb_watch,
+            kb_watch_interval=kb_watch_interval,
+            trace_spans=trace_spans,
+            metrics_path=metrics_path,
+            profile=profile,
+            llm_max_inflight=llm_max_inflight,
+            context_tokens=context_tokens,
+            context_dedup=context_dedup,
+            context_min_score=context_min_score,
+            trace_sink=trace_sink,
+            trace_dir=trace_dir,
+            trace_compress=trace_compress,
+            trace_segment_mb=trace_segment_mb,
+            trace_max_segments=trace_max_segments,
+            transport=transport,
+            cassette=cassette,
+            replay_latency=replay_latency,
+            replay_error_rate=replay_error_rate,
+            replay_errors=replay_errors,
         )
 
 
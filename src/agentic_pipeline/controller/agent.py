@@ -1,16 +1,80 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from dataclasses import dataclass
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
 
 from ..config import Config
-from ..logging_utils import Trace, console
-from ..retriever.loader import load_kb_from_dir
-from ..retriever.retriever import Retriever
-from ..reasoner.reasoner import Reasoner
-from ..tools.csv_price_tool import CSVPriceTool
+from ..index_snapshot import IndexSnapshot, index_params, load_snapshot
+from ..logging_utils import PrometheusExporter, Trace, TraceExporter, console, profiled, span
+from ..retriever.embedding_cache import cache_lock
+from ..retriever.loader import iter_file_chunks, iter_kb_chunks, source_of
+from ..retriever.retriever import RetrievedChunk, Retriever
+from ..retriever.watcher import KBWatcher, snapshot_kb
+from ..reasoner.context import ContextBuilder
+from ..reasoner.reasoner import Reasoner, ToolDecision
+from ..reasoner.router import ToolRouter
+from ..tools.csv_price_tool import CSVPriceTool, PriceResult, product_mentions
+from ..trace_sink import TraceSink
+from ..transport import ApiTransport
+from .response_cache import ANY_SKU, CacheHit, ResponseCache
+
+
+@dataclass
+class StreamEvent:
+    kind: str  # "cache" | "retrieval" | "decision" | "tool" | "token" | "done"
+    data: Dict[str, Any]
+
+
+@dataclass
+class _Request:
+    """State of one query, shared by the sync and async step pipelines."""
+
+    query: str
+    trace: Trace
+    cache: Optional[ResponseCache]
+    generation: int = 0
+    hit: Optional[CacheHit] = None
+    q_vec: Any = None
+    space: Any = None
+    retrieved: List[Dict] = field(default_factory=list)
+    decision: Optional[ToolDecision] = None
+    decided_at: float = 0.0
+    tool_payload: Optional[Dict] = None
+
+    @property
+    def use_tool(self) -> bool:
+        return self.decision is not None and self.decision.decision == "use_tool"
+
+
+class _StreamedAnswer:
+    """Collects streamed answer deltas, the time to the first one and the synthesis spans."""
+
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.parts: List[str] = []
+        self.ttft_ms: Optional[float] = None
+        self.usage: Dict[str, int] = {}
+        self.context: Dict[str, Any] = {}
+
+    def token(self, delta: str) -> StreamEvent:
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.t0) * 1000
+        self.parts.append(delta)
+        return StreamEvent("token", {"text": delta})
+
+    def finish(self, trace: Trace) -> Tuple[str, Dict]:
+        t1 = time.perf_counter()
+        synthesis = trace.record_span("synthesis", self.t0, t1, ttft_ms=self.ttft_ms, **self.context)
+        if self.usage:
+            trace.record_span("llm.synthesis", self.t0, t1, parent=synthesis, **self.usage)
+        return "".join(self.parts), {"ttft_ms": self.ttft_ms, "generation_ms": (t1 - self.t0) * 1000}
 
 
 @dataclass
@@ -19,64 +83,571 @@ class AgentController:
 
     def __post_init__(self) -> None:
         # Initialize components
+        self.transport: Optional[ApiTransport] = None
+        if self.config.transport is not None:
+            self.transport = ApiTransport(
+                self.config.transport,
+                self.config.cassette or self.config.results_dir / "cassette.jsonl",
+                latency=self.config.replay_latency,
+                error_rate=self.config.replay_error_rate,
+                errors=self.config.replay_errors,
+            )
         self.retriever = Retriever(
             embedding_model=self.config.embedding_model,
             openai_api_key=self.config.openai_api_key,
+            cache_dir=self.config.cache_dir,
+            index_backend=self.config.index_backend,
+            index_params=index_params(self.config),
+            embedder_params={
+                "max_batch_size": self.config.embed_batch_size,
+                "max_workers": self.config.embed_max_workers,
+                "max_retries": self.config.embed_max_retries,
+                "coalesce_ms": self.config.embed_coalesce_ms,
+            },
+            transport=self.transport,
         )
+        router: Optional[ToolRouter] = None
+        if self.config.router_enabled and self.config.router_path is not None:
+            router = ToolRouter.load(self.config.router_path, threshold=self.config.router_threshold)
         self.reasoner = Reasoner(
             prompt_version=self.config.prompt_version,
             llm_model=self.config.llm_model,
             openai_api_key=self.config.openai_api_key,
+            router=router,
+            max_inflight=self.config.llm_max_inflight or None,
+            context=(
+                ContextBuilder(self.config.context_tokens, self.config.context_dedup, self.config.context_min_score)
+                if self.config.context_tokens > 0
+                else None
+            ),
+            transport=self.transport,
+        )
+        # A matching snapshot replaces chunking, embedding and index building below
+        snapshot: Optional[IndexSnapshot] = None
+        if self.config.index_snapshot is not None:
+            snapshot = load_snapshot(self.config.index_snapshot, self.config)
+        self.from_snapshot = snapshot is not None
+        self.csv_tool = CSVPriceTool(
+            self.config.prices_csv,
+            cache_dir=self.config.cache_dir,
+            index_state=snapshot.product_state if snapshot is not None else None,
+        )
+        self.response_cache: Optional[ResponseCache] = None
+        if self.config.response_cache:
+            self.response_cache = ResponseCache(
+                max_entries=self.config.response_cache_size,
+                ttl_s=self.config.response_cache_ttl,
+                threshold=self.config.response_cache_threshold,
+            )
+            self.retriever.listeners.append(self.response_cache.invalidate_sources)
+        # Called with every finished trace; append custom exporters here
+        self.exporters: List[TraceExporter] = []
+        if self.config.metrics_path is not None:
+            self.exporters.append(PrometheusExporter(self.config.metrics_path))
+        self.trace_sink = self._make_trace_sink()
+        self._spec_pool = self._make_spec_pool()
+        # Per-request decision/tool lines on the console; servers turn this off
+        self.verbose = True
+        # Stream KB chunks into the index
+        self._kb_snapshot = snapshot_kb(self.config.kb_dir)
+        self._kb_watcher: Optional[KBWatcher] = None
+        self._price_refresh: Optional[threading.Thread] = None
+        self._price_refresh_lock = threading.Lock()
+        if snapshot is not None:
+            self.retriever.restore(snapshot.docs, snapshot.index, snapshot.vectorizer)
+        else:
+            chunks = iter_kb_chunks(
+                self.config.kb_dir,
+                max_tokens=self.config.chunk_tokens,
+                overlap_tokens=self.config.chunk_overlap,
+            )
+            self.retriever.index_stream(chunks, batch_size=self.config.ingest_batch_size)
+        if self.config.kb_watch:
+            self.watch_kb()
+
+    def _make_trace_sink(self) -> Optional[TraceSink]:
+        if self.config.trace_sink == "jsonl" and self.config.trace_dir is not None:
+            return TraceSink(
+                self.config.trace_dir,
+                max_bytes=int(self.config.trace_segment_mb * (1 << 20)),
+                compress=self.config.trace_compress,
+                max_segments=self.config.trace_max_segments,
+            )
+        return None
+
+    def _make_spec_pool(self) -> Optional[ThreadPoolExecutor]:
+        if self.config.speculative_tools:
+            return ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculate")
+        return None
+
+    def apply_kb_changes(self, changed: List[Path], removed: List[Path]) -> None:
+        """Re-index ``changed`` KB files and drop ``removed`` ones.
+
+        Forked server workers each watch the KB, so they take turns under a lock
+        on ``cache_dir``: the first embeds or refits and writes the cache, and
+        the rest then load the result from it.
+        """
+        with cache_lock(self.config.cache_dir):
+            for p in removed:
+                self.retriever.replace_source(p.stem, [])
+            for p in changed:
+                chunks = list(
+                    iter_file_chunks(p, max_tokens=self.config.chunk_tokens, overlap_tokens=self.config.chunk_overlap)
+                )
+                self.retriever.replace_source(p.stem, chunks)
+        if changed or removed:
+            console.print(f"KB updated: {len(changed)} changed, {len(removed)} removed")
+
+    def watch_kb(self) -> KBWatcher:
+        if self._kb_watcher is None:
+            self._kb_watcher = KBWatcher(
+                self.config.kb_dir,
+                self.apply_kb_changes,
+                interval=self.config.kb_watch_interval,
+                baseline=self._kb_snapshot,
+            ).start()
+        return self._kb_watcher
+
+    def stop_watching_kb(self) -> None:
+        if self._kb_watcher is not None:
+            self._kb_watcher.stop()
+            self._kb_watcher = None
+
+    def close(self) -> None:
+        """Stop background work and write out queued traces."""
+        self.stop_watching_kb()
+        if self.trace_sink is not None:
+            self.trace_sink.close()
+        if self._spec_pool is not None:
+            self._spec_pool.shutdown(wait=False)
+        if self._price_refresh is not None:
+            self._price_refresh.join()
+            self._price_refresh = None
+        self.retriever.close()
+
+    def reopen(self) -> None:
+        """Restart what ``close`` stopped, keeping the loaded index and caches.
+
+        Used by forked server workers: threads and API connections do not
+        survive ``fork``, so the parent closes them and each child reopens.
+        """
+        self.retriever.reopen()
+        self.reasoner.reopen()
+        self.trace_sink = self._make_trace_sink()
+        self._spec_pool = self._make_spec_pool()
+        if self.config.kb_watch:
+            self.watch_kb()
+
+    def refresh_prices_in_background(self) -> None:
+        """Start ``refresh_prices`` on a thread if prices.csv changed and no reload is running.
+
+        Parsing and indexing a large catalogue takes seconds, so requests do not
+        wait for it: they keep using the current snapshot until the new one is
+        swapped in. Cached answers that quoted changed rows are dropped then,
+        and answers still in flight from before the swap are not cached.
+        """
+        if not self.csv_tool.stale():
+            return
+        with self._price_refresh_lock:
+            if self._price_refresh is not None and self._price_refresh.is_alive():
+                return
+            self._price_refresh = threading.Thread(target=self.refresh_prices, name="price-refresh", daemon=True)
+            self._price_refresh.start()
+
+    def refresh_prices(self) -> Set[str]:
+        """Hot-reload prices.csv if it changed on disk and drop cached answers that quoted changed rows."""
+        try:
+            changed = self.csv_tool.refresh()
+        except Exception:
+            # Likely caught mid-write; retry on the next query
+            return set()
+        if changed and self.response_cache is not None:
+            self.response_cache.invalidate_skus(changed)
+        return changed
+
+    def _finish(self, trace: Trace) -> None:
+        trace.finish()
+        for exporter in self.exporters:
+            exporter.export(trace)
+
+    def _cached_result(self, trace: Trace, hit: CacheHit) -> Tuple[str, Dict, Optional[Path]]:
+        trace.add(
+            "response_cache",
+            {
+                "tier": hit.tier,
+                "similarity": hit.similarity,
+                "cached_query": hit.entry.query,
+                "age_s": hit.age_s,
+            },
         )
-        self.csv_tool = CSVPriceTool(self.config.prices_csv)
-        # Load KB docs
-        docs = load_kb_from_dir(self.config.kb_dir)
-        self.retriever.index(docs)
+        trace.add("final_answer", {"text": hit.entry.answer})
+        self._finish(trace)
+        return hit.entry.answer, trace.to_dict(), None
 
-    def run(self, query: str, save_trace: bool = True) -> Tuple[str, Dict, Optional[Path]]:
-        trace = Trace(query=query)
+    def _cache_answer(self, req: _Request, answer: str) -> None:
+        assert req.cache is not None
+        skus: Set[str] = set()
+        if req.use_tool:
+            if req.tool_payload:
+                skus.update(str(p["sku"]) for p in req.tool_payload.get("products", [req.tool_payload]))
+            else:
+                skus.add(ANY_SKU)
+        req.cache.put(
+            req.query,
+            answer,
+            sources={source_of(r["doc_id"]) for r in req.retrieved},
+            skus=skus,
+            vector=req.q_vec,
+            space=req.space,
+            generation=req.generation,
+        )
 
-        # Retrieve
-        retrieved = self.retriever.search(query, k=4)
-        retrieved_dicts = [
+    @staticmethod
+    def _retrieved_dicts(retrieved: List[RetrievedChunk]) -> List[Dict]:
+        return [
             {"doc_id": r.doc_id, "text": r.text, "score": r.score} for r in retrieved
         ]
-        trace.add("retrieval", {"results": retrieved_dicts})
-
-        # Decide tool
-        decision = self.reasoner.decide_tool(query, retrieved_dicts)
-        trace.add("reasoning_tool_decision", {"decision": decision.decision, "rationale": decision.rationale})
-
-        # Maybe call tool
-        tool_payload: Optional[Dict] = None
-        if decision.decision == "use_tool":
-            result = self.csv_tool.lookup(query)
-            if result:
-                tool_payload = {
-                    "product_name": result.product_name,
-                    "sku": result.sku,
-                    "price_usd": result.price_usd,
-                    "match_score": result.score,
-                    "latency_ms": result.latency_ms,
-                }
-            trace.add("tool_call_csv_price", tool_payload or {"result": None})
-
-        # Synthesize
-        final_answer = self.reasoner.synthesize(query, retrieved_dicts, tool_payload)
-        trace.add("final_answer", {"text": final_answer})
-        trace.finish()
 
-        out_path: Optional[Path] = None
-        if save_trace:
-            safe = "".join(c for c in query if c.isalnum() or c in (" ", "-", "_"))[:50].strip().replace(" ", "_")
-            out_path = self.config.results_dir / f"trace_{safe or 'query'}.json"
-            trace.save_json(out_path)
+    @staticmethod
+    def _price_payload(result: PriceResult) -> Dict:
+        return {
+            "product_name": result.product_name,
+            "sku": result.sku,
+            "price_usd": result.price_usd,
+            "match_score": result.score,
+            "latency_ms": result.latency_ms,
+        }
+
+    def _tool_payload(self, results: List[PriceResult]) -> Optional[Dict]:
+        # The best match stays at the top level; extra products go under "products"
+        if not results:
+            return None
+        payload = self._price_payload(results[0])
+        if len(results) > 1:
+            payload["products"] = [self._price_payload(r) for r in results]
+        return payload
+
+    def lookup_prices(self, query: str) -> List[PriceResult]:
+        """Price every product the query mentions, resolving several in one batch.
+
+        Mentions scoring below ``multi_product_min_score`` are dropped; if none
+        is left the whole query is matched as a single product, as before.
+        """
+        mentions = product_mentions(query)
+        if len(mentions) > 1:
+            found: List[PriceResult] = []
+            seen: Set[str] = set()
+            for matches in self.csv_tool.lookup_many(mentions, top_k=1):
+                if matches and matches[0].score >= self.config.multi_product_min_score and matches[0].sku not in seen:
+                    seen.add(matches[0].sku)
+                    found.append(matches[0])
+            if found:
+                return found
+        result = self.csv_tool.lookup(query)
+        return [result] if result else []
+
+    @staticmethod
+    def _safe_name(query: str) -> str:
+        safe = "".join(c for c in query if c.isalnum() or c in (" ", "-", "_"))[:50].strip().replace(" ", "_")
+        return safe or "query"
 
+    def _trace_path(self, query: str) -> Path:
+        return self.config.results_dir / f"trace_{self._safe_name(query)}.json"
+
+    def _save_trace(self, query: str, trace: Trace, trace_dict: Dict) -> Path:
+        """Queue the trace on the sink (returns its directory) or write it to its own file."""
+        if self.trace_sink is not None:
+            self.trace_sink.submit(trace_dict)
+            return self.trace_sink.directory
+        return trace.save_json(self._trace_path(query))
+
+    def _profile_stem(self, query: str) -> Path:
+        return self.config.results_dir / f"profile_{self._safe_name(query)}"
+
+    @staticmethod
+    def _decision_detail(decision: ToolDecision) -> Dict:
+        detail = {"decision": decision.decision, "rationale": decision.rationale, "source": decision.source}
+        if decision.confidence is not None:
+            detail["confidence"] = decision.confidence
+        return detail
+
+    def _print_summary(self, decision: ToolDecision, tool_payload: Optional[Dict]) -> None:
+        if not self.verbose:
+            return
         # Pretty-print brief summary
         console.print(f"Decision: {decision.decision} ({decision.rationale})")
         if tool_payload:
-            console.print(f"Tool: {tool_payload['product_name']} ${tool_payload['price_usd']} in {tool_payload['latency_ms']:.1f}ms")
+            products = ", ".join(f"{p['product_name']} ${p['price_usd']}" for p in tool_payload.get("products", [tool_payload]))
+            console.print(f"Tool: {products} in {tool_payload['latency_ms']:.1f}ms")
+
+    def _timed_lookup(self, query: str) -> Tuple[List[PriceResult], float, float]:
+        t0 = time.perf_counter()
+        results = self.lookup_prices(query)
+        return results, t0, time.perf_counter()
+
+    @staticmethod
+    def _discard(lookup: Any) -> Optional[Tuple[List[PriceResult], float, float]]:
+        """Drop a speculative lookup the decision did not need; its timing if it already succeeded."""
+        if lookup.done() and not lookup.cancelled() and lookup.exception() is None:
+            return lookup.result()
+        # Still running or failed: nobody waits for it, so its error (if any) is swallowed
+        if not lookup.cancel():
+            lookup.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return None
+
+    @staticmethod
+    def _speculation_detail(
+        hit: bool, timing: Optional[Tuple[List[PriceResult], float, float]], decided_at: float
+    ) -> Dict:
+        if timing is None:
+            # Wasted and still running; not worth waiting for just to time it
+            return {"outcome": "wasted", "lookup_ms": None, "saved_ms": 0.0}
+        _, started, finished = timing
+        lookup_ms = (finished - started) * 1000
+        if not hit:
+            return {"outcome": "wasted", "lookup_ms": lookup_ms, "saved_ms": 0.0}
+        # Only the part of the lookup that ran before the decision returned is off the critical path
+        waited_ms = max(0.0, finished - decided_at) * 1000
+        return {"outcome": "hit", "lookup_ms": lookup_ms, "saved_ms": max(0.0, lookup_ms - waited_ms)}
+
+    def run(
+        self, query: str, save_trace: bool = True, profile: Optional[str] = None
+    ) -> Tuple[str, Dict, Optional[Path]]:
+        """Answer ``query``; ``profile`` ("cprofile"/"pyinstrument") overrides ``config.profile``."""
+        for event in self._run_events(query, save_trace, stream=False, profile=profile):
+            pass
+        return event.data["answer"], event.data["trace"], event.data["trace_path"]
+
+    def run_stream(
+        self, query: str, save_trace: bool = True, profile: Optional[str] = None
+    ) -> Iterator[StreamEvent]:
+        """Like ``run``, but yields progress as it happens.
+
+        Events, in order: ``cache`` (hit only) or ``retrieval``, ``decision`` and
+        ``tool`` (if used); then one ``token`` per answer delta; finally ``done``
+        with ``answer``, ``trace`` and ``trace_path``.
+        """
+        return self._run_events(query, save_trace, stream=True, profile=profile)
+
+    def _run_events(
+        self, query: str, save_trace: bool, stream: bool, profile: Optional[str] = None
+    ) -> Iterator[StreamEvent]:
+        with profiled(profile or self.config.profile, self._profile_stem(query)) as profile_path:
+            yield from self._run_steps(query, save_trace, stream, profile_path)
+
+    # Step helpers shared by _run_steps and _arun_steps, which only differ in
+    # how they call (or await) retrieval, the LLM, the CSV lookup and I/O
+
+    def _begin(self, query: str, profile_path: Optional[Path]) -> _Request:
+        trace = Trace.start(query, spans=self.config.trace_spans)
+        trace.profile_path = profile_path
+        cache = self.response_cache
+        return _Request(query, trace, cache, generation=cache.generation if cache is not None else 0)
+
+    @contextmanager
+    def _cache_probe(self, req: _Request) -> Iterator[bool]:
+        """Response cache lookup: exact tier, then the semantic tier.
+
+        The body is told whether the semantic tier needs the query vector; it
+        embeds the query into ``req.q_vec``/``req.space``, which retrieval then
+        reuses on a miss. A hit ends up in ``req.hit``.
+        """
+        cache = req.cache
+        if cache is None:
+            yield False
+            return
+        with req.trace.span("cache") as cache_span:
+            req.hit = cache.get(req.query)
+            needs_vector = req.hit is None and cache.semantic
+            yield needs_vector
+            if needs_vector:
+                req.hit = cache.get_similar(req.q_vec, req.space)
+            cache_span.set(hit=req.hit.tier if req.hit is not None else None)
+        if req.hit is None:
+            cache.miss()
+
+    def _cache_hit_events(self, req: _Request, stream: bool) -> List[StreamEvent]:
+        # Hits write no trace file
+        assert req.hit is not None
+        answer, trace_dict, _ = self._cached_result(req.trace, req.hit)
+        events = []
+        if stream:
+            events = [StreamEvent("cache", trace_dict["steps"][0]["detail"]), StreamEvent("token", {"text": answer})]
+        return events + [StreamEvent("done", {"answer": answer, "trace": trace_dict, "trace_path": None})]
+
+    def _retrieval_event(self, req: _Request, retrieved: List[RetrievedChunk]) -> StreamEvent:
+        req.retrieved = self._retrieved_dicts(retrieved)
+        req.trace.add("retrieval", {"results": req.retrieved})
+        return StreamEvent("retrieval", {"results": req.retrieved})
+
+    def _decision_event(self, req: _Request, decision: ToolDecision) -> StreamEvent:
+        req.decision, req.decided_at = decision, time.perf_counter()
+        req.trace.add("reasoning_tool_decision", self._decision_detail(decision))
+        return StreamEvent("decision", self._decision_detail(decision))
+
+    def _speculated(self, req: _Request, timing: Optional[Tuple[List[PriceResult], float, float]]) -> None:
+        req.trace.add("speculation", self._speculation_detail(req.use_tool, timing, req.decided_at))
+        if req.use_tool:
+            assert timing is not None
+            self._record_tool(req, timing[0])
 
-        return final_answer, trace.to_dict(), out_path
+    def _record_tool(self, req: _Request, results: List[PriceResult]) -> None:
+        req.tool_payload = self._tool_payload(results)
+        req.trace.add("tool_call_csv_price", req.tool_payload or {"result": None})
 
+    @staticmethod
+    def _tool_events(req: _Request) -> List[StreamEvent]:
+        return [StreamEvent("tool", req.tool_payload or {"result": None})] if req.use_tool else []
 
+    def _complete(self, req: _Request, answer: str, timings: Dict) -> Dict:
+        req.trace.add("final_answer", {"text": answer, **timings})
+        self._finish(req.trace)
+        if req.cache is not None:
+            self._cache_answer(req, answer)
+        return req.trace.to_dict()
+
+    def _done_event(
+        self, req: _Request, answer: str, trace_dict: Dict, out_path: Optional[Path], stream: bool
+    ) -> StreamEvent:
+        if not stream:
+            assert req.decision is not None
+            self._print_summary(req.decision, req.tool_payload)
+        return StreamEvent("done", {"answer": answer, "trace": trace_dict, "trace_path": out_path})
+
+    def _run_steps(
+        self, query: str, save_trace: bool, stream: bool, profile_path: Optional[Path]
+    ) -> Iterator[StreamEvent]:
+        # Stage spans never enclose a yield: the current span is a context
+        # variable, and a suspended generator would leak it into the consumer
+        req = self._begin(query, profile_path)
+        self.refresh_prices_in_background()
+        with self._cache_probe(req) as needs_vector:
+            if needs_vector:
+                with span("embed_query"):
+                    req.q_vec, req.space = self.retriever.embed_query(query)
+        if req.hit is not None:
+            yield from self._cache_hit_events(req, stream)
+            return
+
+        # Speculative mode: start the cheap local lookup now, decide later whether to keep it
+        lookup: Optional[Future] = None
+        if self._spec_pool is not None:
+            lookup = self._spec_pool.submit(self._timed_lookup, query)
+
+        with req.trace.span("retrieval"):
+            retrieved = self.retriever.search(query, k=4, q_vec=req.q_vec)
+        yield self._retrieval_event(req, retrieved)
+
+        with req.trace.span("decision") as decision_span:
+            decision = self.reasoner.decide_tool(query, req.retrieved)
+            decision_span.set(source=decision.source)
+        yield self._decision_event(req, decision)
+
+        with req.trace.span("tool", used=req.use_tool):
+            if lookup is not None:
+                self._speculated(req, lookup.result() if req.use_tool else self._discard(lookup))
+            elif req.use_tool:
+                self._record_tool(req, self.lookup_prices(query))
+        yield from self._tool_events(req)
+
+        # Synthesize; streaming also records time to the first token
+        if stream:
+            answer = _StreamedAnswer()
+            for delta in self.reasoner.synthesize_stream(
+                query, req.retrieved, req.tool_payload, usage=answer.usage, context=answer.context
+            ):
+                yield answer.token(delta)
+            final_answer, timings = answer.finish(req.trace)
+        else:
+            t0 = time.perf_counter()
+            with req.trace.span("synthesis"):
+                final_answer = self.reasoner.synthesize(query, req.retrieved, req.tool_payload)
+            timings = {"generation_ms": (time.perf_counter() - t0) * 1000}
+        trace_dict = self._complete(req, final_answer, timings)
+        out_path = self._save_trace(query, req.trace, trace_dict) if save_trace else None
+        yield self._done_event(req, final_answer, trace_dict, out_path, stream)
+
+    async def arun(
+        self, query: str, save_trace: bool = True, profile: Optional[str] = None
+    ) -> Tuple[str, Dict, Optional[Path]]:
+        """Asyncio-native ``run``: LLM and embedding calls await instead of blocking.
+
+        In speculative mode the local CSV lookup starts on a worker thread right
+        away and overlaps with retrieval and the tool-decision call. Trace writing
+        is kept off the event loop. A cProfile profile also sees whatever other
+        tasks run on the loop meanwhile; pyinstrument attributes async time.
+        """
+        async for event in self._arun_events(query, save_trace, stream=False, profile=profile):
+            pass
+        return event.data["answer"], event.data["trace"], event.data["trace_path"]
+
+    def arun_stream(
+        self, query: str, save_trace: bool = True, profile: Optional[str] = None
+    ) -> AsyncIterator[StreamEvent]:
+        """Async ``run_stream``: the same events, from ``arun``'s code path."""
+        return self._arun_events(query, save_trace, stream=True, profile=profile)
+
+    async def _arun_events(
+        self, query: str, save_trace: bool, stream: bool, profile: Optional[str] = None
+    ) -> AsyncIterator[StreamEvent]:
+        with profiled(profile or self.config.profile, self._profile_stem(query)) as profile_path:
+            async for event in self._arun_steps(query, save_trace, stream, profile_path):
+                yield event
+
+    async def _arun_steps(
+        self, query: str, save_trace: bool, stream: bool, profile_path: Optional[Path]
+    ) -> AsyncIterator[StreamEvent]:
+        # Same steps and rules as _run_steps, awaiting instead of blocking
+        req = self._begin(query, profile_path)
+        self.refresh_prices_in_background()
+        with self._cache_probe(req) as needs_vector:
+            if needs_vector:
+                with span("embed_query"):
+                    req.q_vec, req.space = await self.retriever.aembed_query(query)
+        if req.hit is not None:
+            for event in self._cache_hit_events(req, stream):
+                yield event
+            return
+
+        lookup: Optional[asyncio.Future] = None
+        if self.config.speculative_tools:
+            lookup = asyncio.ensure_future(asyncio.to_thread(self._timed_lookup, query))
+
+        with req.trace.span("retrieval"):
+            retrieved = await self.retriever.asearch(query, k=4, q_vec=req.q_vec)
+        yield self._retrieval_event(req, retrieved)
+
+        with req.trace.span("decision") as decision_span:
+            decision = await self.reasoner.adecide_tool(query, req.retrieved)
+            decision_span.set(source=decision.source)
+        yield self._decision_event(req, decision)
+
+        with req.trace.span("tool", used=req.use_tool):
+            if lookup is not None:
+                self._speculated(req, (await lookup) if req.use_tool else self._discard(lookup))
+            elif req.use_tool:
+                self._record_tool(req, await asyncio.to_thread(self.lookup_prices, query))
+        for event in self._tool_events(req):
+            yield event
+
+        if stream:
+            answer = _StreamedAnswer()
+            async for delta in self.reasoner.asynthesize_stream(
+                query, req.retrieved, req.tool_payload, usage=answer.usage, context=answer.context
+            ):
+                yield answer.token(delta)
+            final_answer, timings = answer.finish(req.trace)
+        else:
+            t0 = time.perf_counter()
+            with req.trace.span("synthesis"):
+                final_answer = await self.reasoner.asynthesize(query, req.retrieved, req.tool_payload)
+            timings = {"generation_ms": (time.perf_counter() - t0) * 1000}
+        trace_dict = self._complete(req, final_answer, timings)
+        out_path: Optional[Path] = None
+        if save_trace:
+            # The JSONL sink only enqueues; a per-query file is written off the event loop
+            if self.trace_sink is not None:
+                out_path = self._save_trace(query, req.trace, trace_dict)
+            else:
+                out_path = await asyncio.to_thread(self._save_trace, query, req.trace, trace_dict)
+        yield self._done_event(req, final_answer, trace_dict, out_path, stream)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from ..retriever.loader import ANY_SOURCE
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+# Dependency marker for answers that looked up a price but matched nothing:
+# any change to the catalogue may change them
+ANY_SKU = "*"
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(_NON_WORD.sub(" ", query.lower()).split())
+
+
+def query_key(query: str) -> str:
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    query: str
+    answer: str
+    sources: FrozenSet[str]  # KB file stems the retrieved chunks came from
+    skus: FrozenSet[str]  # price rows the answer quoted
+    created_at: float
+    expires_at: float
+    vector: Any = None  # L2-normalized query vector (dense row or sparse TF-IDF row)
+    space: Any = None
+
+
+@dataclass
+class CacheHit:
+    entry: CachedResponse
+    tier: str  # "exact" | "semantic"
+    similarity: float
+    age_s: float
+
+
+class ResponseCache:
+    """Final answers keyed by normalized query, with a semantic fallback.
+
+    The exact tier is a dict lookup on sha256 of the normalized query. The
+    semantic tier compares a query vector from the retriever's embedder against
+    cached query vectors in the same embedding space and accepts the best match
+    at or above ``threshold``. Entries expire after ``ttl_s``, the least recently
+    used are evicted past ``max_entries``, and ``invalidate_sources`` /
+    ``invalidate_skus`` drop entries whose answer depended on changed data.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: float = 3600.0,
+        threshold: float = 0.95,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self._clock = clock
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation; answers computed across one are not stored
+        self.generation = 0
+        self._matrix: Optional[Tuple[Any, List[str], Any]] = None  # (space, keys, rows)
+        self.stats: Dict[str, int] = {"exact": 0, "semantic": 0, "miss": 0, "evicted": 0, "invalidated": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def semantic(self) -> bool:
+        return self.threshold <= 1.0
+
+    def get(self, query: str) -> Optional[CacheHit]:
+        key = query_key(query)
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stats["exact"] += 1
+            return CacheHit(entry=entry, tier="exact", similarity=1.0, age_s=self._clock() - entry.created_at)
+
+    def get_similar(self, vector: Any, space: Any) -> Optional[CacheHit]:
+        if vector is None or not self.semantic:
+            return None
+        with self._lock:
+            keys, rows = self._rows(space)
+            if not keys:
+                return None
+            if sparse.issparse(vector):
+                sims = (rows @ vector.T).toarray().ravel()
+            else:
+                q = np.asarray(vector, dtype=np.float32).ravel()
+                sims = rows @ (q / (np.linalg.norm(q) + 1e-8))
+            for i in np.argsort(-sims):
+                if sims[i] < self.threshold:
+                    break
+                entry = self._live(keys[i])
+                if entry is not None:
+                    self._entries.move_to_end(keys[i])
+                    self.stats["semantic"] += 1
+                    return CacheHit(
+                        entry=entry,
+                        tier="semantic",
+                        similarity=float(sims[i]),
+                        age_s=self._clock() - entry.created_at,
+                    )
+            return None
+
+    def miss(self) -> None:
+        with self._lock:
+            self.stats["miss"] += 1
+
+    def put(
+        self,
+        query: str,
+        answer: str,
+        sources: Iterable[str],
+        skus: Iterable[str],
+        vector: Any = None,
+        space: Any = None,
+        generation: Optional[int] = None,
+    ) -> bool:
+        """Store an answer; skipped if an invalidation happened since ``generation``."""
+        if vector is not None and not sparse.issparse(vector):
+            vector = np.asarray(vector, dtype=np.float32).ravel()
+            vector = vector / (np.linalg.norm(vector) + 1e-8)
+        now = self._clock()
+        entry = CachedResponse(
+            query=query,
+            answer=answer,
+            sources=frozenset(sources),
+            skus=frozenset(skus),
+            created_at=now,
+            expires_at=now + self.ttl_s,
+            vector=vector,
+            space=space,
+        )
+        key = query_key(query)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+            self._matrix = None
+            return True
+
+    def invalidate_sources(self, sources: Iterable[str]) -> int:
+        sources = set(sources)
+        if ANY_SOURCE in sources:
+            return self._invalidate(lambda e: True)
+        return self._invalidate(lambda e: not e.sources.isdisjoint(sources))
+
+    def invalidate_skus(self, skus: Iterable[str]) -> int:
+        skus = set(skus) | {ANY_SKU}
+        return self._invalidate(lambda e: not e.skus.isdisjoint(skus))
+
+    def clear(self) -> None:
+        self._invalidate(lambda e: True)
+
+    def _invalidate(self, stale: Callable[[CachedResponse], bool]) -> int:
+        with self._lock:
+            self.generation += 1
+            keys = [k for k, e in self._entries.items() if stale(e)]
+            for k in keys:
+                del self._entries[k]
+            if keys:
+                self._matrix = None
+            self.stats["invalidated"] += len(keys)
+            return len(keys)
+
+    def _live(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= self._clock():
+            del self._entries[key]
+            self._matrix = None
+            return None
+        return entry
+
+    def _rows(self, space: Any) -> Tuple[List[str], Any]:
+        # Stacked lazily: a burst of puts costs one rebuild at the next semantic lookup
+        if self._matrix is None or self._matrix[0] != space:
+            keys = [k for k, e in self._entries.items() if e.vector is not None and e.space == space]
+            vectors = [self._entries[k].vector for k in keys]
+            if not vectors:
+                rows: Any = None
+            elif sparse.issparse(vectors[0]):
+                rows = sparse.vstack(vectors, format="csr")
+            else:
+                rows = np.vstack(vectors)
+            self._matrix = (space, keys, rows)
+        return self._matrix[1], self._matrix[2]
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import numpy as np
+
+from .config import Config
+from .retriever.embedding_cache import _atomic_save_npy, _atomic_write_text
+from .retriever.index import VectorIndex, restore_index
+from .retriever.loader import Document
+from .retriever.tfidf import TfidfModel
+from .retriever.watcher import snapshot_kb
+from .tools.price_catalogue import StringColumn, file_signature
+
+if TYPE_CHECKING:
+    from .controller.agent import AgentController
+
+SNAPSHOT_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+def snapshot_fingerprint(config: Config) -> str:
+    """Hash of everything a snapshot depends on: settings, KB files and prices.csv (by mtime/size)."""
+    kb = sorted([p.name, mtime, size] for p, (mtime, size) in snapshot_kb(config.kb_dir).items())
+    parts = {
+        "version": SNAPSHOT_VERSION,
+        # nprobe, the shard count and the re-rank depth are query-time knobs, so
+        # changing them keeps the snapshot valid (turning re-ranking on does not:
+        # it needs the float32 rows saved)
+        "embeddings": config.embedding_model if config.openai_api_key else "tfidf",
+        "index": [config.index_backend, config.ivf_nlist, config.index_codec, config.pq_m, config.index_rerank > 0],
+        "chunks": [config.chunk_tokens, config.chunk_overlap],
+        "kb": kb,
+        "prices": [str(config.prices_csv), *file_signature(config.prices_csv)],
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class IndexSnapshot:
+    docs: List[Document]
+    index: VectorIndex
+    vectorizer: Optional[TfidfModel]
+    # ProductIndex.state() of the price catalogue the snapshot was built from
+    product_state: Dict[str, Any]
+    manifest: Dict[str, Any]
+
+
+def _save_arrays(directory: Path, prefix: str, arrays: Dict[str, np.ndarray]) -> List[str]:
+    for name, arr in arrays.items():
+        _atomic_save_npy(directory / f"{prefix}.{name}.npy", np.asarray(arr))
+    return sorted(arrays)
+
+
+def _load_arrays(directory: Path, prefix: str, names: List[str]) -> Dict[str, np.ndarray]:
+    return {name: np.load(directory / f"{prefix}.{name}.npy", mmap_mode="r") for name in names}
+
+
+def save_snapshot(controller: "AgentController", path: Path, fingerprint: Optional[str] = None) -> Path:
+    """Write the controller's index, TF-IDF state and product index to ``path``.
+
+    Built in a sibling temp directory and swapped in whole, so a process
+    starting meanwhile sees either the old snapshot or the new one.
+    """
+    config = controller.config
+    fingerprint = fingerprint or snapshot_fingerprint(config)
+    docs, index, vectorizer = controller.retriever.store.export_state()
+    if index is None:
+        raise ValueError("Nothing indexed; is the KB directory empty?")
+    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    ids, texts = StringColumn.encode([d.doc_id for d in docs]), StringColumn.encode([d.text for d in docs])
+    _save_arrays(tmp, "docs", {"ids.offsets": ids.offsets, "ids.data": ids.data})
+    _save_arrays(tmp, "docs", {"texts.offsets": texts.offsets, "texts.data": texts.data})
+    manifest: Dict[str, Any] = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": fingerprint,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "docs": len(docs),
+        "backend": "sparse" if vectorizer is not None else config.index_backend,
+        "index_arrays": _save_arrays(tmp, "index", index.state()),
+    }
+    if vectorizer is not None:
+        _atomic_save_npy(tmp / "tfidf.idf.npy", vectorizer.idf)
+        _atomic_write_text(tmp / "tfidf.vocabulary.json", json.dumps(vectorizer.vocabulary))
+
+    product_index = controller.csv_tool.index
+    state = product_index.state()
+    choices = StringColumn.encode(state["choices"])
+    _save_arrays(tmp, "prices", {"choices.offsets": choices.offsets, "choices.data": choices.data})
+    manifest["prices"] = {"rows": len(product_index), "candidates": state["candidates"]}
+    if "vocabulary" in state:
+        _atomic_save_npy(tmp / "prices.idf.npy", state["idf"])
+        _atomic_write_text(tmp / "prices.vocabulary.json", json.dumps(state["vocabulary"]))
+        manifest["prices"]["ngram_arrays"] = _save_arrays(tmp, "prices.ngrams", state["ngrams"])
+    # Written last: a directory without a manifest is never loaded
+    _atomic_write_text(tmp / MANIFEST, json.dumps(manifest, indent=2))
+
+    old = path.with_name(f"{path.name}.old-{os.getpid()}")
+    if path.exists():
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def index_params(config: Config) -> Dict[str, Any]:
+    """Keyword arguments for ``build_index``/``restore_index`` of ``config.index_backend``."""
+    if config.index_backend == "ivf":
+        return {"nlist": config.ivf_nlist, "nprobe": config.ivf_nprobe}
+    if config.index_backend == "sharded":
+        return {"shards": config.index_shards or None}
+    if config.index_backend == "quantized":
+        return {"codec": config.index_codec, "rerank": config.index_rerank, "pq_m": config.pq_m or None}
+    return {}
+
+
+def load_snapshot(path: Path, config: Config) -> Optional[IndexSnapshot]:
+    """The snapshot at ``path`` if it matches ``config``'s current fingerprint, else None.
+
+    Arrays are memory-mapped, so loading costs little beyond decoding the doc texts.
+    """
+    try:
+        manifest = json.loads((path / MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != SNAPSHOT_VERSION or manifest.get("fingerprint") != snapshot_fingerprint(config):
+        return None
+    try:
+        docs_arrays = _load_arrays(path, "docs", ["ids.offsets", "ids.data", "texts.offsets", "texts.data"])
+        ids = StringColumn(docs_arrays["ids.offsets"], docs_arrays["ids.data"]).tolist()
+        texts = StringColumn(docs_arrays["texts.offsets"], docs_arrays["texts.data"]).tolist()
+        params = index_params(config) if manifest["backend"] == config.index_backend else {}
+        index = restore_index(manifest["backend"], _load_arrays(path, "index", manifest["index_arrays"]), **params)
+        vectorizer: Optional[TfidfModel] = None
+        if manifest["backend"] == "sparse":
+            vocabulary = json.loads((path / "tfidf.vocabulary.json").read_text(encoding="utf-8"))
+            vectorizer = TfidfModel(vocabulary, np.load(path / "tfidf.idf.npy"))
+        prices = manifest["prices"]
+        arrays = _load_arrays(path, "prices", ["choices.offsets", "choices.data"])
+        product_state: Dict[str, Any] = {
+            "choices": StringColumn(arrays["choices.offsets"], arrays["choices.data"]).tolist(),
+            "candidates": prices["candidates"],
+        }
+        if "ngram_arrays" in prices:
+            product_state["vocabulary"] = json.loads((path / "prices.vocabulary.json").read_text(encoding="utf-8"))
+            product_state["idf"] = np.load(path / "prices.idf.npy")
+            product_state["ngrams"] = _load_arrays(path, "prices.ngrams", prices["ngram_arrays"])
+    except (OSError, KeyError, ValueError):
+        return None
+    docs = [Document(doc_id=i, text=t) for i, t in zip(ids, texts)]
+    return IndexSnapshot(docs, index, vectorizer, product_state, manifest)
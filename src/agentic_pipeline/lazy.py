@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import importlib
+import threading
+from types import ModuleType
+from typing import Dict, Optional
+
+_modules: Dict[str, Optional[ModuleType]] = {}
+_lock = threading.Lock()
+
+
+def optional_import(name: str) -> Optional[ModuleType]:
+    """``import name`` on first call, or None if it is not installed; cached afterwards.
+
+    Keeps heavy optional dependencies (``openai`` costs ~0.6 s) out of module
+    import time, so a CLI run only pays for what it actually uses.
+    """
+    try:
+        return _modules[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _modules:
+            try:
+                _modules[name] = importlib.import_module(name)
+            except Exception:  # pragma: no cover
+                _modules[name] = None
+        return _modules[name]
@@ -1,14 +1,24 @@
 from __future__ import annotations
 
+import atexit
+import cProfile
+import functools
+import inspect
 import json
+import os
+import threading
 import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol, Tuple
 
 from rich.console import Console
-from rich.table import Table
+
+from .lazy import optional_import
 
 
 console = Console()
@@ -18,6 +28,146 @@ def utc_ts() -> str:
     return datetime.utcnow().isoformat() + "Z"
 
 
+class Span:
+    """A timed block: monotonic start/end, free-form attributes, child spans."""
+
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None, start: Optional[float] = None) -> None:
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end is None else (self.end - self.start) * 1000
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        origin = self.start if origin is None else origin
+        out: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": (self.start - origin) * 1000,
+            "duration_ms": self.duration_ms,
+        }
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.children:
+            out["children"] = [c.to_dict(origin) for c in self.children]
+        return out
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _SpanBlock:
+    __slots__ = ("parent", "name", "attrs", "span", "_token")
+
+    def __init__(self, parent: Span, name: str, attrs: Dict[str, Any]) -> None:
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> Span:
+        self.span = Span(self.name, self.attrs)
+        self.parent.children.append(self.span)
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> bool:
+        self.span.end = time.perf_counter()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.span.attrs["error"] = exc_type.__name__
+        return False
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def span(name: str, **attrs: Any) -> Any:
+    """``with span("embed_query") as s:`` times a block as a child of the active span.
+
+    Outside a traced request (or with spans disabled) this returns a shared
+    no-op, so instrumented library code costs one context-variable read.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return _SpanBlock(parent, name, attrs)
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Decorator form of ``span``; works on plain and ``async`` functions."""
+
+    def wrap(fn: Callable) -> Callable:
+        label = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(label):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return wrap
+
+
+def _field(obj: Any, key: str) -> Any:
+    return obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+
+
+def usage_attrs(usage: Any) -> Dict[str, int]:
+    """Token counts from an OpenAI ``usage`` object (or dict), for ``Span.set``."""
+    if usage is None:
+        return {}
+    out: Dict[str, int] = {}
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = _field(usage, key)
+        if value is not None:
+            out[key] = int(value)
+    # Prompt tokens served from the provider's prefix cache
+    details = _field(usage, "prompt_tokens_details")
+    cached = _field(details, "cached_tokens") if details is not None else None
+    if cached is not None:
+        out["cached_tokens"] = int(cached)
+    return out
+
+
 @dataclass
 class TraceStep:
     kind: str
@@ -29,17 +179,45 @@ class TraceStep:
 class Trace:
     query: str
     steps: List[TraceStep] = field(default_factory=list)
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
     started_at: str = field(default_factory=utc_ts)
     finished_at: Optional[str] = None
+    # Root of the span tree; None when span timing is disabled
+    root: Optional[Span] = None
+    profile_path: Optional[Path] = None
+
+    @classmethod
+    def start(cls, query: str, spans: bool = True) -> "Trace":
+        return cls(query=query, root=Span("request") if spans else None)
 
     def add(self, kind: str, detail: Dict[str, Any]) -> None:
         self.steps.append(TraceStep(kind=kind, detail=detail))
 
+    def span(self, name: str, **attrs: Any) -> Any:
+        """Time a top-level stage; nested ``span`` calls inside it become its children."""
+        if self.root is None:
+            return _NOOP
+        return _SpanBlock(self.root, name, attrs)
+
+    def record_span(
+        self, name: str, start: float, end: float, parent: Optional[Span] = None, **attrs: Any
+    ) -> Optional[Span]:
+        """Add an already-measured span (e.g. a stage that yielded while it ran)."""
+        if self.root is None:
+            return None
+        s = Span(name, attrs, start=start)
+        s.end = end
+        (parent or self.root).children.append(s)
+        return s
+
     def finish(self) -> None:
         self.finished_at = utc_ts()
+        if self.root is not None and self.root.end is None:
+            self.root.end = time.perf_counter()
 
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        out = {
+            "trace_id": self.trace_id,
             "query": self.query,
             "started_at": self.started_at,
             "finished_at": self.finished_at,
@@ -47,6 +225,11 @@ class Trace:
                 {"kind": s.kind, "detail": s.detail, "at": s.at} for s in self.steps
             ],
         }
+        if self.root is not None:
+            out["spans"] = self.root.to_dict()
+        if self.profile_path is not None:
+            out["profile"] = str(self.profile_path)
+        return out
 
     def save_json(self, out_path: Path) -> Path:
         out_path.parent.mkdir(parents=True, exist_ok=True)
@@ -55,6 +238,8 @@ class Trace:
         return out_path
 
     def print_summary(self) -> None:
+        from rich.table import Table
+
         table = Table(title="Trace Summary")
         table.add_column("When")
         table.add_column("Step")
@@ -64,3 +249,140 @@ class Trace:
         console.print(table)
 
 
+class TraceExporter(Protocol):
+    def export(self, trace: Trace) -> None: ...
+
+
+class PrometheusExporter:
+    """Aggregates span durations and LLM token counts into a Prometheus text file.
+
+    Meant for node_exporter's textfile collector: the file is rewritten
+    atomically at most every ``min_interval_s`` seconds (and at exit). With
+    ``path=None`` nothing is written; ``render`` serves an HTTP ``/metrics``.
+    """
+
+    BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, path: Optional[Path], min_interval_s: float = 1.0, prefix: str = "agent") -> None:
+        self.path = path
+        self.min_interval_s = min_interval_s
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hist: Dict[str, List[float]] = {}  # span -> bucket counts..., +Inf count, sum
+        self._tokens: Dict[Tuple[str, str], int] = {}
+        self._requests = 0
+        self._written_at = 0.0
+        self._dirty = False
+        atexit.register(self.flush)
+
+    def export(self, trace: Trace) -> None:
+        if trace.root is None:
+            return
+        with self._lock:
+            self._requests += 1
+            for s in trace.root.walk():
+                if s.end is None:
+                    continue
+                seconds = s.end - s.start
+                h = self._hist.setdefault(s.name, [0.0] * (len(self.BUCKETS_S) + 2))
+                for i, le in enumerate(self.BUCKETS_S):
+                    if seconds <= le:
+                        h[i] += 1
+                h[-2] += 1
+                h[-1] += seconds
+                for kind in ("prompt", "completion", "cached"):
+                    n = s.attrs.get(f"{kind}_tokens")
+                    if n:
+                        self._tokens[(s.name, kind)] = self._tokens.get((s.name, kind), 0) + n
+            self._dirty = self.path is not None
+            if self._dirty and time.monotonic() - self._written_at >= self.min_interval_s:
+                self._write()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._write()
+
+    def render(self) -> str:
+        with self._lock:
+            return self._render()
+
+    def _render(self) -> str:
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_requests_total Traced requests.",
+            f"# TYPE {p}_requests_total counter",
+            f"{p}_requests_total {self._requests}",
+            f"# HELP {p}_span_duration_seconds Time spent per pipeline span.",
+            f"# TYPE {p}_span_duration_seconds histogram",
+        ]
+        for name, h in sorted(self._hist.items()):
+            for le, count in zip(self.BUCKETS_S, h):
+                lines.append(f'{p}_span_duration_seconds_bucket{{span="{name}",le="{le}"}} {int(count)}')
+            lines.append(f'{p}_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {int(h[-2])}')
+            lines.append(f'{p}_span_duration_seconds_sum{{span="{name}"}} {h[-1]:.6f}')
+            lines.append(f'{p}_span_duration_seconds_count{{span="{name}"}} {int(h[-2])}')
+        lines += [
+            f"# HELP {p}_llm_tokens_total LLM tokens reported by the API, per span.",
+            f"# TYPE {p}_llm_tokens_total counter",
+        ]
+        for (name, kind), n in sorted(self._tokens.items()):
+            lines.append(f'{p}_llm_tokens_total{{span="{name}",kind="{kind}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self._render(), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._written_at = time.monotonic()
+        self._dirty = False
+
+
+@contextmanager
+def profiled(kind: Optional[str], out_stem: Path) -> Iterator[Optional[Path]]:
+    """Profile the block with ``"cprofile"`` (``.prof``) or ``"pyinstrument"`` (``.html``).
+
+    Yields the output path, or None when profiling is off or unavailable
+    (pyinstrument not installed, or another profiler already active, e.g. a
+    concurrent request on another thread).
+    """
+    if not kind:
+        yield None
+        return
+    if kind == "cprofile":
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            yield None
+            return
+        path = out_stem.with_suffix(".prof")
+        try:
+            yield path
+        finally:
+            prof.disable()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(str(path))
+        return
+    if kind == "pyinstrument":
+        pyinstrument = optional_import("pyinstrument")
+        if pyinstrument is None:
+            console.print("pyinstrument is not installed; request not profiled")
+            yield None
+            return
+        profiler = pyinstrument.Profiler(async_mode="enabled")
+        try:
+            profiler.start()
+        except RuntimeError:
+            yield None
+            return
+        path = out_stem.with_suffix(".html")
+        try:
+            yield path
+        finally:
+            profiler.stop()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(profiler.output_html(), encoding="utf-8")
+        return
+    raise ValueError(f"Unknown profiler: {kind!r} (expected 'cprofile' or 'pyinstrument')")
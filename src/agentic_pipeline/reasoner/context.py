@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import functools
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set, Tuple
+
+from ..lazy import optional_import
+from ..retriever.embedder import estimate_tokens
+from ..retriever.loader import _SENTENCE_END
+
+_WORD = re.compile(r"\w+")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding() -> Any:
+    tiktoken = optional_import("tiktoken")
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:  # pragma: no cover - encoding files not available offline
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text``: exact with tiktoken installed, else ~4 characters per token."""
+    enc = _encoding()
+    return len(enc.encode(text)) if enc is not None else estimate_tokens(text)
+
+
+def _shingles(words: List[str], n: int = 3) -> Set[Tuple[str, ...]]:
+    if len(words) < n:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    # One entry per snippet kept: doc_id, score, tokens, truncated
+    snippets: List[Dict[str, Any]] = field(default_factory=list)
+    # doc_id -> "low_score" | "duplicate" | "budget"
+    dropped: Dict[str, str] = field(default_factory=dict)
+
+
+class ContextBuilder:
+    """Packs retrieved passages into a prompt context of at most ``budget_tokens``.
+
+    Passages are taken best score first, and those scoring below
+    ``min_score_ratio`` of the best one are left out. Sentences already in the context
+    (chunk overlap) are skipped, and a passage whose remaining word trigrams
+    are at least ``dedup_threshold`` contained in what is already packed is
+    dropped as a near-duplicate. A passage that does not fit is cut at the
+    last whole sentence that does.
+    """
+
+    def __init__(self, budget_tokens: int = 600, dedup_threshold: float = 0.8, min_score_ratio: float = 0.2) -> None:
+        self.budget_tokens = budget_tokens
+        self.dedup_threshold = dedup_threshold
+        self.min_score_ratio = min_score_ratio
+
+    def pack(self, retrieved: List[Dict[str, Any]]) -> PackedContext:
+        ranked = sorted(retrieved, key=lambda r: -float(r.get("score") or 0.0))
+        out = PackedContext(text="", tokens=0)
+        parts: List[str] = []
+        seen: Set[str] = set()
+        kept: Set[Tuple[str, ...]] = set()
+        remaining = self.budget_tokens
+        floor = self.min_score_ratio * float(ranked[0].get("score") or 0.0) if ranked else 0.0
+        for i, r in enumerate(ranked):
+            doc_id = r["doc_id"]
+            if i > 0 and float(r.get("score") or 0.0) < floor:
+                out.dropped[doc_id] = "low_score"
+                continue
+            sentences = [s.strip() for s in _SENTENCE_END.split(r["text"]) if s and s.strip()]
+            fresh = [s for s in sentences if " ".join(_WORD.findall(s.lower())) not in seen]
+            grams = _shingles(_WORD.findall(" ".join(fresh).lower()))
+            if not grams or len(grams & kept) >= self.dedup_threshold * len(grams):
+                out.dropped[doc_id] = "duplicate"
+                continue
+            header = f"[{doc_id}] "
+            used = count_tokens(header)
+            taken: List[str] = []
+            for s in fresh:
+                n = count_tokens(s) + 1
+                if used + n > remaining:
+                    break
+                taken.append(s)
+                used += n
+            truncated = len(taken) < len(fresh)
+            if not taken and not parts:
+                # Not even one sentence of the best passage fits: cut it at a word
+                words = fresh[0].split()
+                while words and used + count_tokens(" ".join(words)) > remaining:
+                    words = words[: len(words) * 3 // 4]
+                taken = [" ".join(words)] if words else []
+                used = count_tokens(header + " ".join(taken)) if taken else used
+            if not taken:
+                out.dropped[doc_id] = "budget"
+                continue
+            parts.append(header + " ".join(taken))
+            for s in taken:
+                seen.add(" ".join(_WORD.findall(s.lower())))
+            kept |= _shingles(_WORD.findall(" ".join(taken).lower()))
+            remaining -= used
+            out.snippets.append(
+                {"doc_id": doc_id, "score": r.get("score"), "tokens": used, "truncated": truncated}
+            )
+        out.text = "\n\n".join(parts)
+        out.tokens = self.budget_tokens - remaining
+        return out
+
+    def describe(self, packed: PackedContext) -> Dict[str, Any]:
+        """Span attributes for a packed context."""
+        return {
+            "budget_tokens": self.budget_tokens,
+            "context_tokens": packed.tokens,
+            "snippets": len(packed.snippets),
+            "dropped_low_score": sum(1 for v in packed.dropped.values() if v == "low_score"),
+            "dropped_duplicate": sum(1 for v in packed.dropped.values() if v == "duplicate"),
+            "dropped_budget": sum(1 for v in packed.dropped.values() if v == "budget"),
+        }
@@ -1,83 +1,278 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import json
+import threading
 from dataclasses import dataclass
-from typing import Dict, List, Optional
-
-try:
-    from openai import OpenAI
-except Exception:  # pragma: no cover
-    OpenAI = None  # type: ignore
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
+from ..lazy import optional_import
+from ..logging_utils import span, usage_attrs
+from ..transport import ApiTransport
+from .context import ContextBuilder
 from .prompts import Prompts
+from .router import ToolRouter
 
 
 @dataclass
 class ToolDecision:
     decision: str  # "kb_only" | "use_tool"
     rationale: str
+    source: str = "llm"  # "llm" | "heuristic" | "router"
+    confidence: Optional[float] = None
 
 
 class Reasoner:
-    def __init__(self, prompt_version: str, llm_model: str, openai_api_key: Optional[str]) -> None:
+    def __init__(
+        self,
+        prompt_version: str,
+        llm_model: str,
+        openai_api_key: Optional[str],
+        router: Optional[ToolRouter] = None,
+        max_inflight: Optional[int] = None,
+        context: Optional[ContextBuilder] = None,
+        transport: Optional[ApiTransport] = None,
+    ) -> None:
         self.prompts = Prompts(version=prompt_version)
+        self.router = router
+        # None keeps the fixed per-snippet character slices
+        self.context = context
         self.llm_model = llm_model
         self.openai_api_key = openai_api_key
-        self._client = OpenAI(api_key=openai_api_key) if (openai_api_key and OpenAI) else None
+        # Records or replays the API traffic (None: straight to the network)
+        self.transport = transport
+        # Cap on concurrent LLM calls (None: unlimited); streams hold a slot until done
+        self.max_inflight = max_inflight
+        self._slots = threading.BoundedSemaphore(max_inflight) if max_inflight else None
+        self._aslots: Optional[Tuple[Any, asyncio.Semaphore]] = None
+        self.reopen()
+
+    def reopen(self) -> None:
+        """(Re)create the API clients, e.g. in a forked worker that must not share the parent's connections."""
+        key = self.openai_api_key
+        openai = optional_import("openai") if key else None
+        self._client = self._aclient = None
+        if openai:
+            t = self.transport
+            self._client = openai.OpenAI(api_key=key, http_client=t.http_client(openai) if t else None)
+            self._aclient = openai.AsyncOpenAI(api_key=key, http_client=t.async_http_client(openai) if t else None)
+
+    def _slot(self) -> Any:
+        return self._slots if self._slots is not None else contextlib.nullcontext()
+
+    def _aslot(self) -> Any:
+        if not self.max_inflight:
+            return contextlib.nullcontext()
+        loop = asyncio.get_running_loop()
+        if self._aslots is None or self._aslots[0] is not loop:
+            self._aslots = (loop, asyncio.Semaphore(self.max_inflight))
+        return self._aslots[1]
+
+    @staticmethod
+    def _heuristic_decision(user: str) -> str:
+        # Heuristic fallback: if price-related keywords appear, suggest tool
+        if any(k in user.lower() for k in ["price", "cost", "how much", "pricing"]):
+            return json.dumps({"decision": "use_tool", "rationale": "price-related"})
+        return json.dumps({"decision": "kb_only", "rationale": "not price-related"})
+
+    @staticmethod
+    def _user_text(messages: List[Dict[str, str]]) -> str:
+        return "\n\n".join(m["content"] for m in messages if m["role"] == "user")
+
+    def _request(self, messages: List[Dict[str, str]], temperature: float, stream: bool = False) -> Dict[str, Any]:
+        """Chat completion arguments, shared by the sync and async clients."""
+        args: Dict[str, Any] = {"model": self.llm_model, "messages": messages, "temperature": temperature}
+        if stream:
+            args.update(stream=True, stream_options={"include_usage": True})
+        return args
+
+    @staticmethod
+    def _delta(chunk: Any, usage: Optional[Dict[str, int]]) -> Optional[str]:
+        # Token counts arrive in the final chunk, which has no choices
+        if usage is not None and getattr(chunk, "usage", None) is not None:
+            usage.update(usage_attrs(chunk.usage))
+        return chunk.choices[0].delta.content if chunk.choices else None
 
-    def _chat(self, system: str, user: str) -> str:
+    def _chat(self, messages: List[Dict[str, str]]) -> str:
         if not self._client:
-            # Heuristic fallback: if price-related keywords appear, suggest tool
-            if any(k in user.lower() for k in ["price", "cost", "how much", "pricing"]):
-                return json.dumps({"decision": "use_tool", "rationale": "price-related"})
-            return json.dumps({"decision": "kb_only", "rationale": "not price-related"})
-        resp = self._client.chat.completions.create(
-            model=self.llm_model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.1,
-        )
+            return self._heuristic_decision(self._user_text(messages))
+        with self._slot(), span("llm.tool_decision", model=self.llm_model) as s:
+            resp = self._client.chat.completions.create(**self._request(messages, 0.1))
+            s.set(**usage_attrs(resp.usage))
         return resp.choices[0].message.content or "{}"
 
-    def decide_tool(self, query: str, retrieved: List[Dict[str, str]]) -> ToolDecision:
-        system = self.prompts.tool_decision()
-        snippets = "\n\n".join([f"[{r['doc_id']}] {r['text'][:400]}" for r in retrieved])
-        user = f"Query: {query}\n\nKB snippets:\n{snippets}"
-        raw = self._chat(system, user)
+    async def _achat(self, messages: List[Dict[str, str]]) -> str:
+        if not self._aclient:
+            return self._heuristic_decision(self._user_text(messages))
+        async with self._aslot():
+            with span("llm.tool_decision", model=self.llm_model) as s:
+                resp = await self._aclient.chat.completions.create(**self._request(messages, 0.1))
+                s.set(**usage_attrs(resp.usage))
+        return resp.choices[0].message.content or "{}"
+
+    def _snippets(self, retrieved: List[Dict[str, Any]], chars: int, attrs: Optional[Dict[str, Any]] = None) -> str:
+        if self.context is None:
+            return "\n\n".join([f"[{r['doc_id']}] {r['text'][:chars]}" for r in retrieved])
+        with span("context") as s:
+            packed = self.context.pack(retrieved)
+            s.set(**self.context.describe(packed))
+        if attrs is not None:
+            attrs.update(self.context.describe(packed))
+        return packed.text
+
+    def _layout(self, system: str, context: str, query: str, tail: str = "") -> List[Dict[str, str]]:
+        if self.context is None:
+            user = f"Query: {query}\n\n{context}" + (f"\n\n{tail}\n" if tail else "")
+            return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+        # Most stable first: the static prompt, then the context, and the query
+        # last, so repeated prefixes hit the provider's prompt cache
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": context},
+            {"role": "user", "content": f"Query: {query}" + (f"\n\n{tail}" if tail else "")},
+        ]
+
+    def _decision_prompt(self, query: str, retrieved: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        snippets = self._snippets(retrieved, 400)
+        return self._layout(self.prompts.tool_decision(), f"KB snippets:\n{snippets}", query)
+
+    def _parse_decision(self, raw: str, source: str) -> ToolDecision:
         try:
             data = json.loads(raw)
             decision = data.get("decision", "kb_only")
             rationale = data.get("rationale", "")
         except Exception:
             decision, rationale = "kb_only", "parse_error"
-        return ToolDecision(decision=decision, rationale=rationale)
+        return ToolDecision(decision=decision, rationale=rationale, source=source)
 
-    def synthesize(self, query: str, retrieved: List[Dict[str, str]], tool_result: Optional[Dict] = None) -> str:
-        if not self._client:
-            # Simple heuristic synthesis
-            base = retrieved[0]['text'][:300] if retrieved else ""
-            if tool_result:
-                name = tool_result.get("product_name")
-                price = tool_result.get("price_usd")
-                return f"{name} costs ${price}. {base}"
-            return base or "I couldn't find sufficient information."
-
-        system = self.prompts.final_answer()
-        snippets = "\n\n".join([f"[{r['doc_id']}] {r['text'][:500]}" for r in retrieved])
-        tool_str = json.dumps(tool_result) if tool_result else "(no tool call)"
-        user = (
-            f"Query: {query}\n\nRetrieved context:\n{snippets}\n\nTool result: {tool_str}\n"
+    def _route(self, query: str) -> Optional[ToolDecision]:
+        if self.router is None:
+            return None
+        routed = self.router.route(query)
+        if routed is None:
+            return None
+        return ToolDecision(
+            decision=routed.decision,
+            rationale="local router",
+            source="router",
+            confidence=routed.confidence,
         )
-        resp = self._client.chat.completions.create(
-            model=self.llm_model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.2,
+
+    def decide_tool(self, query: str, retrieved: List[Dict[str, str]]) -> ToolDecision:
+        routed = self._route(query)
+        if routed is not None:
+            return routed
+        source = "llm" if self._client else "heuristic"
+        return self._parse_decision(self._chat(self._decision_prompt(query, retrieved)), source)
+
+    async def adecide_tool(self, query: str, retrieved: List[Dict[str, str]]) -> ToolDecision:
+        routed = self._route(query)
+        if routed is not None:
+            return routed
+        source = "llm" if self._aclient else "heuristic"
+        return self._parse_decision(await self._achat(self._decision_prompt(query, retrieved)), source)
+
+    @staticmethod
+    def _heuristic_answer(retrieved: List[Dict[str, str]], tool_result: Optional[Dict]) -> str:
+        # Simple heuristic synthesis
+        base = retrieved[0]['text'][:300] if retrieved else ""
+        if tool_result:
+            products = tool_result.get("products", [tool_result])
+            prices = "; ".join(f"{p.get('product_name')} costs ${p.get('price_usd')}" for p in products)
+            return f"{prices}. {base}"
+        return base or "I couldn't find sufficient information."
+
+    @classmethod
+    def _without_timings(cls, tool_result: Dict) -> Dict:
+        # Lookup timings are for the trace: they mean nothing to the model and
+        # would make otherwise identical prompts differ on every run
+        out = {k: v for k, v in tool_result.items() if k != "latency_ms"}
+        if "products" in out:
+            out["products"] = [cls._without_timings(p) for p in out["products"]]
+        return out
+
+    def _synthesis_prompt(
+        self,
+        query: str,
+        retrieved: List[Dict[str, str]],
+        tool_result: Optional[Dict],
+        context: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, str]]:
+        snippets = self._snippets(retrieved, 500, context)
+        tool_str = json.dumps(self._without_timings(tool_result)) if tool_result else "(no tool call)"
+        return self._layout(
+            self.prompts.final_answer(), f"Retrieved context:\n{snippets}", query, f"Tool result: {tool_str}"
         )
+
+    def synthesize(self, query: str, retrieved: List[Dict[str, str]], tool_result: Optional[Dict] = None) -> str:
+        if not self._client:
+            return self._heuristic_answer(retrieved, tool_result)
+        messages = self._synthesis_prompt(query, retrieved, tool_result)
+        with self._slot(), span("llm.synthesis", model=self.llm_model) as s:
+            resp = self._client.chat.completions.create(**self._request(messages, 0.2))
+            s.set(**usage_attrs(resp.usage))
         return resp.choices[0].message.content or ""
 
+    def synthesize_stream(
+        self,
+        query: str,
+        retrieved: List[Dict[str, str]],
+        tool_result: Optional[Dict] = None,
+        usage: Optional[Dict[str, int]] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """Yield the answer as it is generated (``stream=True``); one chunk without an LLM.
 
+        ``usage``, if given, is filled with the token counts the API reports in
+        its final chunk, and ``context`` with the packed-context span attributes.
+        """
+        if not self._client:
+            yield self._heuristic_answer(retrieved, tool_result)
+            return
+        messages = self._synthesis_prompt(query, retrieved, tool_result, context)
+        with self._slot():
+            stream = self._client.chat.completions.create(**self._request(messages, 0.2, stream=True))
+            try:
+                for chunk in stream:
+                    delta = self._delta(chunk, usage)
+                    if delta:
+                        yield delta
+            finally:
+                # Stop generation (and billing) if the consumer goes away early
+                stream.close()
+
+    async def asynthesize_stream(
+        self,
+        query: str,
+        retrieved: List[Dict[str, str]],
+        tool_result: Optional[Dict] = None,
+        usage: Optional[Dict[str, int]] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """Async ``synthesize_stream`` on the ``AsyncOpenAI`` client."""
+        if not self._aclient:
+            yield self._heuristic_answer(retrieved, tool_result)
+            return
+        messages = self._synthesis_prompt(query, retrieved, tool_result, context)
+        async with self._aslot():
+            stream = await self._aclient.chat.completions.create(**self._request(messages, 0.2, stream=True))
+            try:
+                async for chunk in stream:
+                    delta = self._delta(chunk, usage)
+                    if delta:
+                        yield delta
+            finally:
+                await stream.close()
+
+    async def asynthesize(
+        self, query: str, retrieved: List[Dict[str, str]], tool_result: Optional[Dict] = None
+    ) -> str:
+        if not self._aclient:
+            return self._heuristic_answer(retrieved, tool_result)
+        messages = self._synthesis_prompt(query, retrieved, tool_result)
+        async with self._aslot():
+            with span("llm.synthesis", model=self.llm_model) as s:
+                resp = await self._aclient.chat.completions.create(**self._request(messages, 0.2))
+                s.set(**usage_attrs(resp.usage))
+        return resp.choices[0].message.content or ""
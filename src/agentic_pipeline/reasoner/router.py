@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..trace_sink import iter_traces
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+
+@dataclass
+class RouteDecision:
+    decision: str  # "kb_only" | "use_tool"
+    confidence: float
+
+
+def _saved_traces(results_dir: Path, trace_dir: Optional[Path]) -> Iterable[dict]:
+    for p in sorted(results_dir.glob("trace_*.json")):
+        try:
+            yield json.loads(p.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+    yield from iter_traces(trace_dir or results_dir / "traces")
+
+
+def decisions_from_traces(results_dir: Path, trace_dir: Optional[Path] = None) -> List[Tuple[str, str]]:
+    """(query, decision) pairs from saved traces, skipping decisions the router itself made.
+
+    Reads both per-query ``trace_*.json`` files and JSONL sink segments.
+    """
+    pairs: List[Tuple[str, str]] = []
+    for trace in _saved_traces(results_dir, trace_dir):
+        for step in trace.get("steps", []):
+            if step.get("kind") != "reasoning_tool_decision":
+                continue
+            detail = step.get("detail") or {}
+            if detail.get("source") == "router":
+                continue
+            if detail.get("decision") in ("kb_only", "use_tool"):
+                pairs.append((trace.get("query", ""), detail["decision"]))
+    return pairs
+
+
+class ToolRouter:
+    """Local classifier that answers the tool decision without an LLM call.
+
+    Logistic regression over word/bigram TF-IDF of the query. ``route`` returns
+    None when the top class probability is below ``threshold``; the caller then
+    falls back to the LLM.
+    """
+
+    def __init__(self, threshold: float = 0.9) -> None:
+        self.threshold = threshold
+        self.model: Optional["Pipeline"] = None
+
+    def fit(self, queries: List[str], decisions: List[str]) -> "ToolRouter":
+        if len(set(decisions)) < 2:
+            raise ValueError("Router needs examples of both kb_only and use_tool decisions")
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        self.model = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True),
+            LogisticRegression(C=10.0, max_iter=1000, class_weight="balanced"),
+        )
+        self.model.fit(queries, decisions)
+        return self
+
+    def predict(self, queries: Iterable[str]) -> List[RouteDecision]:
+        assert self.model is not None
+        proba = self.model.predict_proba(list(queries))
+        classes = self.model.classes_
+        best = np.argmax(proba, axis=1)
+        return [RouteDecision(decision=str(classes[j]), confidence=float(proba[i, j])) for i, j in enumerate(best)]
+
+    def route(self, query: str) -> Optional[RouteDecision]:
+        if self.model is None:
+            return None
+        pred = self.predict([query])[0]
+        return pred if pred.confidence >= self.threshold else None
+
+    def save(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            pickle.dump(self.model, f)
+        return path
+
+    @classmethod
+    def load(cls, path: Path, threshold: float = 0.9) -> Optional["ToolRouter"]:
+        if not path.exists():
+            return None
+        router = cls(threshold=threshold)
+        with path.open("rb") as f:
+            router.model = pickle.load(f)
+        return router
+
+    @classmethod
+    def from_traces(
+        cls, results_dir: Path, threshold: float = 0.9, trace_dir: Optional[Path] = None
+    ) -> "ToolRouter":
+        pairs = decisions_from_traces(results_dir, trace_dir)
+        return cls(threshold=threshold).fit([q for q, _ in pairs], [d for _, d in pairs])
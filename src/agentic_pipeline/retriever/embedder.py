@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..lazy import optional_import
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough to stay under request caps
+    return len(text) // 4 + 1
+
+
+def is_retryable(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    openai = optional_import("openai")
+    if openai is not None and isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class EmbeddingExecutor:
+    """Batched, concurrent, retrying front-end for an OpenAI-compatible embeddings API.
+
+    ``embed`` splits inputs into batches capped by ``max_batch_size`` inputs and
+    ``max_batch_tokens`` estimated tokens, and runs them on ``max_workers`` threads.
+    429/5xx/connection errors are retried with jittered exponential backoff
+    (honouring ``Retry-After``). ``embed_one`` coalesces concurrent single-text
+    calls that arrive within ``coalesce_ms`` of each other into one request;
+    ``aembed_one`` does the same on the event loop with an ``AsyncOpenAI`` client.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        max_batch_size: int = 256,
+        max_batch_tokens: int = 250_000,
+        max_workers: int = 4,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        coalesce_ms: float = 2.0,
+        sleep: Callable[[float], None] = time.sleep,
+        async_client: Any = None,
+    ) -> None:
+        self.client = client
+        self.async_client = async_client
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.coalesce_ms = coalesce_ms
+        self._sleep = sleep
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed")
+        self._pending: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._dispatcher_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._aloop: Optional[asyncio.AbstractEventLoop] = None
+        self._apending: List[Tuple[str, asyncio.Future]] = []
+        self._aflush: Optional[asyncio.TimerHandle] = None
+        self.stats: Dict[str, int] = {"requests": 0, "retries": 0, "inputs": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        spans: List[Tuple[int, int]] = []
+        start, tokens = 0, 0
+        for i, t in enumerate(texts):
+            n = estimate_tokens(t)
+            if i > start and (i - start >= self.max_batch_size or tokens + n > self.max_batch_tokens):
+                spans.append((start, i))
+                start, tokens = i, 0
+            tokens += n
+        if start < len(texts):
+            spans.append((start, len(texts)))
+        return spans
+
+    def _backoff(self, exc: BaseException, attempt: int) -> float:
+        if attempt >= self.max_retries or not is_retryable(exc):
+            raise exc
+        delay = retry_after_seconds(exc)
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * (2**attempt)) * (0.5 + random.random() / 2)
+        self._count("retries")
+        return delay
+
+    def _vectors(self, response: Any, n: int) -> np.ndarray:
+        self._count("inputs", n)
+        data = sorted(response.data, key=lambda item: getattr(item, "index", 0))
+        return np.array([item.embedding for item in data], dtype=np.float32)
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        attempt = 0
+        while True:
+            try:
+                self._count("requests")
+                response = self.client.embeddings.create(model=self.model, input=texts)
+                return self._vectors(response, len(texts))
+            except Exception as e:
+                self._sleep(self._backoff(e, attempt))
+                attempt += 1
+
+    async def _arequest(self, texts: List[str]) -> np.ndarray:
+        if self.async_client is None:
+            return await asyncio.to_thread(self._request, texts)
+        attempt = 0
+        while True:
+            try:
+                self._count("requests")
+                response = await self.async_client.embeddings.create(model=self.model, input=texts)
+                return self._vectors(response, len(texts))
+            except Exception as e:
+                await asyncio.sleep(self._backoff(e, attempt))
+                attempt += 1
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        spans = self.batches(texts)
+        if len(spans) == 1:
+            return self._request(texts)
+        futures = [self._pool.submit(self._request, texts[s:e]) for s, e in spans]
+        return np.concatenate([f.result() for f in futures])
+
+    def embed_one(self, text: str) -> np.ndarray:
+        if self.coalesce_ms <= 0:
+            return self._request([text])[0]
+        self._ensure_dispatcher()
+        fut: Future = Future()
+        self._pending.put((text, fut))
+        return fut.result()
+
+    def _ensure_dispatcher(self) -> None:
+        with self._dispatcher_lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="embed-coalescer", daemon=True)
+                self._dispatcher.start()
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            first = self._pending.get()
+            batch = [first]
+            deadline = time.monotonic() + self.coalesce_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run_coalesced, batch)
+
+    def _run_coalesced(self, batch: List[Tuple[str, Future]]) -> None:
+        unique: Dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        try:
+            vectors = self._request(list(unique))
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for text, fut in batch:
+            fut.set_result(vectors[unique[text]])
+
+    async def aembed_one(self, text: str) -> np.ndarray:
+        if self.coalesce_ms <= 0:
+            return (await self._arequest([text]))[0]
+        loop = asyncio.get_running_loop()
+        if self._aloop is not loop:
+            # First call, or a new event loop (e.g. successive asyncio.run calls)
+            self._aloop, self._apending, self._aflush = loop, [], None
+        fut = loop.create_future()
+        self._apending.append((text, fut))
+        if len(self._apending) >= self.max_batch_size:
+            self._aflush_now()
+        elif self._aflush is None:
+            self._aflush = loop.call_later(self.coalesce_ms / 1000, self._aflush_now)
+        return await fut
+
+    def _aflush_now(self) -> None:
+        if self._aflush is not None:
+            self._aflush.cancel()
+            self._aflush = None
+        batch, self._apending = self._apending, []
+        if batch:
+            asyncio.ensure_future(self._arun_coalesced(batch))
+
+    async def _arun_coalesced(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        unique: Dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        try:
+            vectors = await self._arequest(list(unique))
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for text, fut in batch:
+            if not fut.done():
+                fut.set_result(vectors[unique[text]])
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
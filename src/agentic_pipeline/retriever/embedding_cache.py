@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from ..lazy import optional_import
+from ..logging_utils import console
+from .tfidf import TfidfModel
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def corpus_fingerprint(keys: List[str]) -> str:
+    return hashlib.sha256("\n".join(keys).encode("utf-8")).hexdigest()
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name) or "default"
+
+
+def _atomic_write(path: Path, write: Callable[[IO[bytes]], None]) -> None:
+    # The temp name is unique per writer: processes sharing a cache_dir may write the same path at once
+    tmp = path.with_name(f"{path.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with tmp.open("xb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _atomic_save_npy(path: Path, arr: np.ndarray) -> None:
+    _atomic_write(path, lambda f: np.save(f, arr))
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    _atomic_write(path, lambda f: f.write(text.encode("utf-8")))
+
+
+@contextmanager
+def cache_lock(cache_dir: Optional[Path]) -> Iterator[None]:
+    """Hold an exclusive lock on ``cache_dir`` across processes (a no-op without ``fcntl``)."""
+    fcntl = optional_import("fcntl")
+    if cache_dir is None or fcntl is None:
+        yield
+        return
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with (cache_dir / ".lock").open("a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """Persistent document vectors keyed by (embedding model, sha256(text)).
+
+    Vectors are appended as numbered segments (``seg_XXXXX.npy`` + ``.keys.json``)
+    that are memory-mapped on load, so a put only writes the new rows. A segment
+    counts once its keys file exists; segments are merged past ``max_segments``.
+    Segment numbers are claimed with an exclusive create, so processes sharing
+    ``cache_dir`` never write the same segment. Writes are best-effort: a
+    segment that cannot be saved is kept in memory only.
+    """
+
+    def __init__(self, cache_dir: Path, model: str, max_segments: int = 32) -> None:
+        self.root = cache_dir / _slug(model)
+        self.max_segments = max_segments
+        self._segments: List[np.ndarray] = []
+        self._segment_names: List[str] = []
+        self._keys: List[str] = []
+        self._rows: Dict[str, Tuple[int, int]] = {}
+        self._next_id = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.root.exists():
+            return
+        known = set(self._segment_names)
+        for vec_path in sorted(self.root.glob("seg_*.npy")):
+            self._next_id = max(self._next_id, int(vec_path.stem[4:]) + 1)
+            if vec_path.stem in known:
+                continue
+            keys_path = vec_path.with_suffix(".keys.json")
+            if not keys_path.exists():
+                continue
+            try:
+                keys = json.loads(keys_path.read_text(encoding="utf-8"))
+                matrix = np.load(vec_path, mmap_mode="r")
+            except Exception:
+                continue
+            if matrix.ndim != 2 or matrix.shape[0] != len(keys):
+                continue
+            if self._segments and matrix.shape[1] != self._segments[0].shape[1]:
+                continue
+            self._add_segment(vec_path.stem, matrix, keys)
+
+    def refresh(self) -> None:
+        """Pick up segments other processes sharing ``cache_dir`` wrote since the last load."""
+        self._load()
+
+    def _add_segment(self, name: str, matrix: np.ndarray, keys: List[str]) -> None:
+        seg = len(self._segments)
+        self._segments.append(matrix)
+        self._segment_names.append(name)
+        for row, k in enumerate(keys):
+            self._rows.setdefault(k, (seg, row))
+        self._keys.extend(keys)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def get(self, keys: List[str]) -> np.ndarray:
+        assert self._segments
+        if len(self._segments) == 1 and keys == self._keys:
+            # Unchanged corpus in cache order: hand back the mmap without copying
+            return self._segments[0]
+        locs = np.array([self._rows[k] for k in keys], dtype=np.int64).reshape(-1, 2)
+        out = np.empty((len(keys), self._segments[0].shape[1]), dtype=np.float32)
+        for seg in np.unique(locs[:, 0]):
+            mask = locs[:, 0] == seg
+            out[mask] = self._segments[seg][locs[mask, 1]]
+        return out
+
+    def put(self, keys: List[str], vectors: np.ndarray) -> None:
+        new_keys: List[str] = []
+        new_rows: List[int] = []
+        seen = set(self._rows)
+        for i, k in enumerate(keys):
+            if k not in seen:
+                seen.add(k)
+                new_keys.append(k)
+                new_rows.append(i)
+        if not new_keys:
+            return
+        fresh = np.asarray(vectors[new_rows], dtype=np.float32)
+        if self._segments and self._segments[0].shape[1] != fresh.shape[1]:
+            # Model output size changed under the same name; drop the stale cache
+            self.clear()
+        self._write_segment(fresh, new_keys)
+        if len(self._segments) > self.max_segments:
+            self.compact()
+
+    def _claim_segment(self) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        while True:
+            vec_path = self.root / f"seg_{self._next_id:05d}.npy"
+            self._next_id += 1
+            try:
+                os.close(os.open(vec_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return vec_path
+            except FileExistsError:
+                continue
+
+    def _write_segment(self, matrix: np.ndarray, keys: List[str]) -> bool:
+        """Save and add a segment; returns False if it could only be kept in memory."""
+        vec_path: Optional[Path] = None
+        try:
+            vec_path = self._claim_segment()
+            _atomic_save_npy(vec_path, matrix)
+            # Keys file written last marks the segment as complete
+            _atomic_write_text(vec_path.with_suffix(".keys.json"), json.dumps(keys))
+            saved = np.load(vec_path, mmap_mode="r")
+        except OSError as e:
+            console.print(f"[yellow]Embedding cache not saved:[/yellow] {e}")
+            if vec_path is not None:
+                vec_path.unlink(missing_ok=True)
+            self._add_segment("", matrix, keys)
+            return False
+        self._add_segment(vec_path.stem, saved, keys)
+        return True
+
+    def compact(self) -> None:
+        if len(self._segments) <= 1:
+            return
+        keys = list(self._rows)
+        merged = self.get(keys)
+        old = list(self._segment_names)
+        self._segments, self._segment_names, self._keys, self._rows = [], [], [], {}
+        if not self._write_segment(merged, keys):
+            return
+        for name in filter(None, old):
+            (self.root / f"{name}.keys.json").unlink(missing_ok=True)
+            (self.root / f"{name}.npy").unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        for name in filter(None, self._segment_names):
+            (self.root / f"{name}.keys.json").unlink(missing_ok=True)
+            (self.root / f"{name}.npy").unlink(missing_ok=True)
+        self._segments, self._segment_names, self._keys, self._rows = [], [], [], {}
+
+
+class TfidfStateCache:
+    """Fitted TF-IDF vocabulary/idf plus CSR corpus matrix, one directory per corpus fingerprint.
+
+    The CSR arrays are stored as separate ``.npy`` files so they can be memory-mapped.
+    Processes saving the same fingerprint write identical files, and ones saving
+    different fingerprints never share a file, so concurrent saves cannot mix.
+    """
+
+    def __init__(self, cache_dir: Path, keep_versions: int = 2) -> None:
+        self.root = cache_dir / "tfidf"
+        self.keep_versions = keep_versions
+
+    def _dir(self, fingerprint: str) -> Path:
+        return self.root / fingerprint[:16]
+
+    def load(self, fingerprint: str) -> Optional[Tuple[TfidfModel, sparse.csr_matrix]]:
+        version = self._dir(fingerprint)
+        state_path = version / "state.json"
+        if not state_path.exists():
+            return None
+        try:
+            state = json.loads(state_path.read_text(encoding="utf-8"))
+            if state.get("fingerprint") != fingerprint:
+                return None
+            vocabulary = {t: int(i) for t, i in state["vocabulary"].items()}
+            vectorizer = TfidfModel(vocabulary, np.load(version / "idf.npy"))
+            parts = [np.load(version / f"matrix_{n}.npy", mmap_mode="r") for n in ("data", "indices", "indptr")]
+            matrix = sparse.csr_matrix(tuple(parts), shape=tuple(state["shape"]))
+        except Exception:
+            return None
+        return vectorizer, matrix
+
+    def save(self, fingerprint: str, vectorizer: TfidfModel, matrix: sparse.csr_matrix) -> None:
+        version = self._dir(fingerprint)
+        version.mkdir(parents=True, exist_ok=True)
+        _atomic_save_npy(version / "idf.npy", vectorizer.idf)
+        for name in ("data", "indices", "indptr"):
+            _atomic_save_npy(version / f"matrix_{name}.npy", getattr(matrix, name))
+        state = {
+            "fingerprint": fingerprint,
+            "shape": list(matrix.shape),
+            "vocabulary": vectorizer.vocabulary,
+        }
+        # Written last so a partial save is never picked up as valid
+        _atomic_write_text(version / "state.json", json.dumps(state))
+        self._prune(keep=version)
+
+    def _prune(self, keep: Path) -> None:
+        # Other processes may still map older versions; unlinking is safe on POSIX
+        versions = sorted(
+            (p for p in self.root.iterdir() if p.is_dir() and p != keep), key=lambda p: p.stat().st_mtime, reverse=True
+        )
+        for old in versions[max(0, self.keep_versions - 1) :]:
+            shutil.rmtree(old, ignore_errors=True)
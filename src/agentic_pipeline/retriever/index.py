@@ -0,0 +1,486 @@
+from __future__ import annotations
+
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+def normalize_rows(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / (norms + 1e-8)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # argpartition is O(N); only the k survivors get sorted
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(scores.shape[0])
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """``top_k`` for every row of a 2-D score matrix at once."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+Hits = List[Tuple[np.ndarray, np.ndarray]]
+
+
+class RowBuffer:
+    """Append-friendly array whose first axis grows by capacity doubling.
+
+    ``view`` is a slice of the live rows; appends that fit in the spare capacity
+    never move existing rows, so earlier views stay valid.
+    """
+
+    def __init__(self, dtype=np.float32) -> None:
+        self.dtype = dtype
+        self._buf: Optional[np.ndarray] = None
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def view(self) -> Optional[np.ndarray]:
+        return None if self._buf is None else self._buf[: self._n]
+
+    def append(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=self.dtype)
+        need = self._n + rows.shape[0]
+        if self._buf is None or need > self._buf.shape[0]:
+            cap = max(need, 2 * (0 if self._buf is None else self._buf.shape[0]), 16)
+            buf = np.empty((cap,) + rows.shape[1:], dtype=self.dtype)
+            if self._buf is not None:
+                buf[: self._n] = self._buf[: self._n]
+            self._buf = buf
+        self._buf[self._n : need] = rows
+        self._n = need
+
+    @classmethod
+    def of(cls, rows: np.ndarray, dtype=np.float32) -> "RowBuffer":
+        out = cls(dtype)
+        out.append(rows)
+        return out
+
+    @classmethod
+    def wrap(cls, rows: np.ndarray) -> "RowBuffer":
+        """Use ``rows`` (e.g. a read-only memory map) as a full buffer; the first append copies."""
+        out = cls(rows.dtype)
+        out._buf, out._n = rows, rows.shape[0]
+        return out
+
+
+class VectorIndex:
+    """Cosine-similarity index over row vectors; positions are row offsets."""
+
+    def add(self, vectors: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def search(self, q: np.ndarray, k: int, live: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows for ``q``; rows where ``live`` is False (tombstones) are skipped."""
+        raise NotImplementedError
+
+    def search_many(self, Q: Any, k: int, live: Optional[np.ndarray] = None) -> Hits:
+        """``search`` for each row of ``Q``; backends override this to score them together."""
+        return [self.search(Q[i], k, live=live) for i in range(Q.shape[0])]
+
+    def compacted(self, keep: np.ndarray) -> "VectorIndex":
+        """New index holding only rows ``keep`` (in order), renumbered from 0."""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays that ``restore_index`` rebuilds this index from, with no re-training."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release worker processes or shared memory, if any; searching reopens them."""
+
+
+class ExactIndex(VectorIndex):
+    def __init__(self) -> None:
+        self._rows = RowBuffer()
+
+    @property
+    def _X(self) -> Optional[np.ndarray]:
+        return self._rows.view
+
+    def add(self, vectors: np.ndarray) -> None:
+        self._rows.append(normalize_rows(vectors))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def search(self, q: np.ndarray, k: int, live: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if self._X is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        qn = normalize_rows(q.reshape(1, -1))[0]
+        sims = self._X @ qn
+        if live is not None:
+            sims = np.where(live, sims, -np.inf)
+            k = min(k, int(live.sum()))
+        idx = top_k(sims, k)
+        return idx, sims[idx]
+
+    def search_many(self, Q: np.ndarray, k: int, live: Optional[np.ndarray] = None) -> Hits:
+        if self._X is None:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))] * Q.shape[0]
+        # One matrix-matrix product instead of a matrix-vector product per query
+        sims = normalize_rows(Q) @ self._X.T
+        if live is not None:
+            sims[:, ~live] = -np.inf
+            k = min(k, int(live.sum()))
+        idx = top_k_rows(sims, k)
+        return list(zip(idx, np.take_along_axis(sims, idx, axis=1)))
+
+    def compacted(self, keep: np.ndarray) -> "ExactIndex":
+        out = ExactIndex()
+        if self._X is not None:
+            out._rows = RowBuffer.of(self._X[keep])
+        return out
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {} if self._X is None else {"rows": self._X}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray]) -> "ExactIndex":
+        out = cls()
+        if "rows" in state:
+            out._rows = RowBuffer.wrap(state["rows"])
+        return out
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file ANN index: spherical k-means coarse quantizer + exact re-scoring.
+
+    ``nlist`` is the number of clusters (default ~sqrt(N)); ``nprobe`` is how many
+    clusters are scanned per query. Raising ``nprobe`` trades latency for recall.
+    Below ``min_train`` rows the index just scans everything.
+    """
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        n_iter: int = 10,
+        min_train: int = 1024,
+        seed: int = 0,
+    ) -> None:
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.min_train = min_train
+        self.seed = seed
+        self._rows = RowBuffer()
+        self._assign_rows = RowBuffer(np.int32)
+        self._centroids: Optional[np.ndarray] = None
+        self._order: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._lists_dirty = False
+
+    @property
+    def _X(self) -> Optional[np.ndarray]:
+        return self._rows.view
+
+    @property
+    def _assign(self) -> Optional[np.ndarray]:
+        return self._assign_rows.view
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _nearest_centroid(self, X: np.ndarray, batch: int = 65536) -> np.ndarray:
+        assert self._centroids is not None
+        out = np.empty(X.shape[0], dtype=np.int32)
+        for s in range(0, X.shape[0], batch):
+            out[s : s + batch] = np.argmax(X[s : s + batch] @ self._centroids.T, axis=1)
+        return out
+
+    def _train(self) -> None:
+        assert self._X is not None
+        n = self._X.shape[0]
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(self.seed)
+        # Train on a sample; 64 points per centroid is plenty for a coarse quantizer
+        sample_size = min(n, nlist * 64)
+        sample = self._X[rng.choice(n, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self.n_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed dead clusters from random sample points
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        self._centroids = centroids
+        self._assign_rows = RowBuffer.of(self._nearest_centroid(self._X), np.int32)
+
+    def _build_lists(self) -> None:
+        assert self._assign is not None and self._centroids is not None
+        self._order = np.argsort(self._assign, kind="stable")
+        counts = np.bincount(self._assign, minlength=self._centroids.shape[0])
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._lists_dirty = False
+
+    def add(self, vectors: np.ndarray) -> None:
+        X = normalize_rows(vectors)
+        self._rows.append(X)
+        if self._centroids is None:
+            if len(self._rows) >= self.min_train:
+                self._train()
+                self._build_lists()
+            return
+        # Already trained: route new rows to existing clusters without retraining;
+        # the inverted lists are rebuilt lazily on the next search
+        self._assign_rows.append(self._nearest_centroid(X))
+        self._lists_dirty = True
+
+    def search(self, q: np.ndarray, k: int, live: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if self._X is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        qn = normalize_rows(q.reshape(1, -1))[0]
+        if self._centroids is None:
+            cand = np.arange(self._X.shape[0])
+        else:
+            if self._lists_dirty:
+                self._build_lists()
+            assert self._order is not None and self._offsets is not None
+            probe = top_k(self._centroids @ qn, self.nprobe)
+            cand = np.concatenate([self._order[self._offsets[c] : self._offsets[c + 1]] for c in probe])
+        if live is not None:
+            cand = cand[live[cand]]
+        sims = self._X[cand] @ qn
+        sel = top_k(sims, k)
+        return cand[sel], sims[sel]
+
+    def compacted(self, keep: np.ndarray) -> "IVFIndex":
+        out = IVFIndex(self.nlist, self.nprobe, self.n_iter, self.min_train, self.seed)
+        if self._X is None:
+            return out
+        out._rows = RowBuffer.of(self._X[keep])
+        if self._centroids is not None:
+            assert self._assign is not None
+            out._centroids = self._centroids
+            out._assign_rows = RowBuffer.of(self._assign[keep], np.int32)
+            out._build_lists()
+        return out
+
+    def state(self) -> Dict[str, np.ndarray]:
+        if self._X is None:
+            return {}
+        if self._centroids is None:
+            return {"rows": self._X}
+        if self._lists_dirty:
+            self._build_lists()
+        assert self._assign is not None and self._order is not None and self._offsets is not None
+        return {
+            "rows": self._X,
+            "centroids": self._centroids,
+            "assign": self._assign,
+            "order": self._order,
+            "offsets": self._offsets,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], **params) -> "IVFIndex":
+        out = cls(**params)
+        if "rows" in state:
+            out._rows = RowBuffer.wrap(state["rows"])
+        if "centroids" in state:
+            out._centroids = state["centroids"]
+            out._assign_rows = RowBuffer.wrap(state["assign"])
+            out._order, out._offsets = state["order"], state["offsets"]
+        return out
+
+
+class SparseIndex(VectorIndex):
+    """Inverted index over a CSR matrix with L2-normalized rows (TF-IDF).
+
+    Postings are the columns of a CSC copy, so a query only touches the posting
+    lists of its non-zero terms and never allocates a vocabulary-sized vector.
+    Rows added after the first batch go to a pending CSR tail that searches
+    scan directly. The tail is merged into the postings once it reaches
+    ``merge_ratio`` of the indexed rows (at least ``merge_min``), so a small
+    upsert does not rebuild the CSC copy of the whole corpus.
+    """
+
+    def __init__(self, merge_min: int = 1024, merge_ratio: float = 0.02) -> None:
+        self.merge_min = merge_min
+        self.merge_ratio = merge_ratio
+        self._X: Optional[sparse.csr_matrix] = None
+        self._postings: Optional[sparse.csc_matrix] = None
+        self._tail: Optional[sparse.csr_matrix] = None
+
+    def add(self, vectors: sparse.spmatrix) -> None:
+        X = sparse.csr_matrix(vectors, dtype=np.float32)
+        if self._X is None:
+            self._X, self._postings = X, X.tocsc()
+            return
+        self._tail = X if self._tail is None else sparse.vstack([self._tail, X], format="csr")
+        if self._tail.shape[0] >= max(self.merge_min, self.merge_ratio * self._X.shape[0]):
+            self.merge()
+
+    def merge(self) -> None:
+        """Fold the pending tail into the main matrix and its postings."""
+        if self._X is not None and self._tail is not None:
+            X = sparse.vstack([self._X, self._tail], format="csr")
+            # Swapped together: a concurrent search sees either the old or the new layout
+            self._X, self._postings, self._tail = X, X.tocsc(), None
+
+    @property
+    def pending(self) -> int:
+        """Rows in the tail, not yet merged into the postings."""
+        return 0 if self._tail is None else self._tail.shape[0]
+
+    def _rows(self) -> Optional[sparse.csr_matrix]:
+        if self._X is None or self._tail is None:
+            return self._X
+        return sparse.vstack([self._X, self._tail], format="csr")
+
+    def __len__(self) -> int:
+        return (0 if self._X is None else self._X.shape[0]) + self.pending
+
+    def search(self, q: sparse.spmatrix, k: int, live: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        X, postings, tail = self._X, self._postings, self._tail
+        if X is None or postings is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = sparse.csr_matrix(q)
+        indptr, indices, data = postings.indptr, postings.indices, postings.data
+        rows, contrib = [], []
+        for term, weight in zip(q.indices, q.data):
+            start, end = indptr[term], indptr[term + 1]
+            rows.append(indices[start:end])
+            contrib.append(data[start:end] * weight)
+        if tail is not None:
+            t = (q.astype(np.float32) @ tail.T).tocsr()
+            rows.append(t.indices.astype(np.int64) + X.shape[0])
+            contrib.append(t.data)
+        if not rows:
+            return self._top(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), k, live)
+        cand, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        sims = np.bincount(inverse, weights=np.concatenate(contrib)).astype(np.float32)
+        return self._top(cand, sims, k, live)
+
+    def search_many(self, Q: sparse.spmatrix, k: int, live: Optional[np.ndarray] = None) -> Hits:
+        X, tail = self._X, self._tail
+        if X is None:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))] * Q.shape[0]
+        # One sparse product; row i holds query i's non-zero doc scores
+        Q = sparse.csr_matrix(Q, dtype=np.float32)
+        S = Q @ X.T
+        if tail is not None:
+            S = sparse.hstack([S, Q @ tail.T])
+        S = S.tocsr()
+        S.sort_indices()
+        return [
+            self._top(S.indices[S.indptr[i] : S.indptr[i + 1]], S.data[S.indptr[i] : S.indptr[i + 1]], k, live)
+            for i in range(S.shape[0])
+        ]
+
+    def _top(
+        self, cand: np.ndarray, sims: np.ndarray, k: int, live: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if live is not None:
+            alive = live[cand]
+            cand, sims = cand[alive], sims[alive]
+        sel = top_k(sims, k)
+        idx, scores = cand[sel].astype(np.int64), sims[sel]
+        n_live = len(self) if live is None else int(live.sum())
+        if len(idx) < min(k, n_live):
+            # Like the dense path, always return k rows; pad with zero-score docs
+            taken = set(idx.tolist())
+            free = (i for i in range(len(self)) if i not in taken and (live is None or live[i]))
+            pad = list(islice(free, k - len(idx)))
+            idx = np.concatenate([idx, np.array(pad, dtype=np.int64)])
+            scores = np.concatenate([scores, np.zeros(len(pad), dtype=np.float32)])
+        return idx, scores
+
+    def compacted(self, keep: np.ndarray) -> "SparseIndex":
+        out = SparseIndex(self.merge_min, self.merge_ratio)
+        rows = self._rows()
+        if rows is not None:
+            out.add(rows[keep])
+        return out
+
+    def state(self) -> Dict[str, np.ndarray]:
+        self.merge()
+        if self._X is None or self._postings is None:
+            return {}
+        X, P = self._X, self._postings
+        return {
+            "shape": np.asarray(X.shape, dtype=np.int64),
+            "rows_data": X.data,
+            "rows_indices": X.indices,
+            "rows_indptr": X.indptr,
+            "postings_data": P.data,
+            "postings_indices": P.indices,
+            "postings_indptr": P.indptr,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray]) -> "SparseIndex":
+        out = cls()
+        if "shape" in state:
+            shape = tuple(int(n) for n in state["shape"])
+            out._X = sparse.csr_matrix((state["rows_data"], state["rows_indices"], state["rows_indptr"]), shape=shape)
+            out._postings = sparse.csc_matrix(
+                (state["postings_data"], state["postings_indices"], state["postings_indptr"]), shape=shape
+            )
+        return out
+
+
+def build_index(backend: str = "exact", **params) -> VectorIndex:
+    if backend == "exact":
+        return ExactIndex()
+    if backend == "ivf":
+        return IVFIndex(**params)
+    if backend == "sharded":
+        from .sharded import ShardedIndex
+
+        return ShardedIndex(**params)
+    if backend == "quantized":
+        from .quantized import QuantizedIndex
+
+        return QuantizedIndex(**params)
+    raise ValueError(f"Unknown index backend: {backend}")
+
+
+def restore_index(backend: str, state: Dict[str, np.ndarray], **params) -> VectorIndex:
+    """Inverse of ``VectorIndex.state``; ``backend`` is "exact", "ivf", "sharded", "quantized" or "sparse"."""
+    if backend == "exact":
+        return ExactIndex.from_state(state)
+    if backend == "ivf":
+        return IVFIndex.from_state(state, **params)
+    if backend == "sharded":
+        from .sharded import ShardedIndex
+
+        return ShardedIndex.from_state(state, **params)
+    if backend == "quantized":
+        from .quantized import QuantizedIndex
+
+        return QuantizedIndex.from_state(state, **params)
+    if backend == "sparse":
+        return SparseIndex.from_state(state)
+    raise ValueError(f"Unknown index backend: {backend}")
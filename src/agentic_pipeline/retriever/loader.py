@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Iterable, Iterator, List, TextIO, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_WORD = re.compile(r"\S+")
 
 
 @dataclass
@@ -21,3 +27,108 @@ def load_kb_from_dir(kb_dir: Path) -> List[Document]:
     return docs
 
 
+def iter_sentences(f: TextIO, block_size: int = 1 << 16, max_chars: int = 1 << 16) -> Iterator[Tuple[int, str]]:
+    """Yield ``(char_offset, sentence)`` from a text stream, one block at a time."""
+    buf = ""
+    base = 0
+    while True:
+        block = f.read(block_size)
+        buf += block
+        last = 0
+        for m in _SENTENCE_END.finditer(buf):
+            if block and m.end() == len(buf):
+                # Separator may continue into the next block
+                break
+            yield from _emit(base + last, buf[last : m.start()])
+            last = m.end()
+        if not block:
+            yield from _emit(base + last, buf[last:])
+            return
+        if len(buf) - last > max_chars:
+            # No sentence boundary in sight (e.g. one huge line); cut at a space
+            cut = buf.rfind(" ", last, len(buf) - 1)
+            cut = cut if cut > last else len(buf)
+            yield from _emit(base + last, buf[last:cut])
+            last = cut
+        buf = buf[last:]
+        base += last
+
+
+def _emit(offset: int, text: str) -> Iterator[Tuple[int, str]]:
+    stripped = text.strip()
+    if stripped:
+        yield offset + (len(text) - len(text.lstrip())), stripped
+
+
+def _split_long(offset: int, sentence: str, max_tokens: int) -> Iterator[Tuple[int, str, int]]:
+    words = list(_WORD.finditer(sentence))
+    if len(words) <= max_tokens:
+        yield offset, " ".join(w.group() for w in words), len(words)
+        return
+    for i in range(0, len(words), max_tokens):
+        window = words[i : i + max_tokens]
+        yield offset + window[0].start(), " ".join(w.group() for w in window), len(window)
+
+
+def chunk_sentences(
+    sentences: Iterable[Tuple[int, str]], max_tokens: int = 200, overlap_tokens: int = 40
+) -> Iterator[Tuple[int, str]]:
+    """Pack sentences into chunks of at most ``max_tokens`` whitespace tokens.
+
+    Consecutive chunks share up to ``overlap_tokens`` worth of whole sentences.
+    Each chunk is reported with the offset of its first sentence.
+    """
+    window: List[Tuple[int, str, int]] = []
+    total = 0
+    for offset, sentence in sentences:
+        for piece in _split_long(offset, sentence, max_tokens):
+            n = piece[2]
+            if window and total + n > max_tokens:
+                yield window[0][0], " ".join(s for _, s, _ in window)
+                # Keep a strict suffix so the next chunk always starts later
+                keep: List[Tuple[int, str, int]] = []
+                kept = 0
+                for item in reversed(window[1:]):
+                    if kept + item[2] > overlap_tokens:
+                        break
+                    keep.insert(0, item)
+                    kept += item[2]
+                if kept + n > max_tokens:
+                    keep, kept = [], 0
+                window, total = keep, kept
+            window.append(piece)
+            total += n
+    if window:
+        yield window[0][0], " ".join(s for _, s, _ in window)
+
+
+# Reported with the changed sources when a new KB file is indexed: its chunks
+# may outrank anything, so every cached answer may be stale
+ANY_SOURCE = "*"
+
+
+def source_of(doc_id: str) -> str:
+    return doc_id.split("#", 1)[0]
+
+
+def iter_file_chunks(path: Path, max_tokens: int = 200, overlap_tokens: int = 40) -> Iterator[Document]:
+    with path.open("r", encoding="utf-8") as f:
+        for offset, text in chunk_sentences(iter_sentences(f), max_tokens, overlap_tokens):
+            yield Document(doc_id=f"{path.stem}#{offset}", text=text)
+
+
+def iter_kb_chunks(kb_dir: Path, max_tokens: int = 200, overlap_tokens: int = 40) -> Iterator[Document]:
+    """Stream every ``*.txt`` under ``kb_dir`` as chunks with ids ``<stem>#<offset>``."""
+    for p in sorted(kb_dir.glob("*.txt")):
+        yield from iter_file_chunks(p, max_tokens, overlap_tokens)
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
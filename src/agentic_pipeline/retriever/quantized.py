@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .index import Hits, RowBuffer, VectorIndex, normalize_rows, top_k_rows
+
+CODECS = ("float16", "int8", "pq")
+# Rows scored per block, so scoring never materializes an N x dim float32 copy.
+# float16/int8 rows are decoded into a scratch buffer small enough to stay in cache.
+_BLOCK = 16384
+_DECODE_BLOCK = 256
+
+
+def _pq_subspaces(dim: int, m: Optional[int]) -> int:
+    # Largest divisor of dim not above the request; default 16 dimensions per subspace
+    m = min(dim, m or max(1, dim // 16))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def _kmeans(X: np.ndarray, k: int, n_iter: int, rng: np.random.Generator) -> np.ndarray:
+    # Euclidean k-means (PQ sub-vectors are not unit length)
+    centroids = X[rng.choice(X.shape[0], size=k, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _nearest(X, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, X)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = X[rng.choice(X.shape[0], size=int(empty.sum()))]
+            counts[empty] = 1
+        centroids = (sums / counts[:, None]).astype(np.float32)
+    return centroids
+
+
+def _nearest(X: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin |x - c|^2 == argmax x.c - |c|^2 / 2
+    return np.argmax(X @ centroids.T - 0.5 * np.einsum("ij,ij->i", centroids, centroids), axis=1)
+
+
+class QuantizedIndex(VectorIndex):
+    """Exact-scan index over compressed rows: float16, int8 or product-quantized codes.
+
+    ``int8`` scales each dimension by its largest magnitude in the training rows
+    (4x smaller than float32). ``pq`` splits rows into ``pq_m`` sub-vectors, each
+    replaced by the index of its nearest of 256 k-means centroids (one byte per
+    sub-vector), and scores with asymmetric distance computation: per query, a
+    table of query-centroid dot products, summed over each row's codes.
+
+    ``rerank`` > 0 keeps the float32 rows and re-scores that many approximate
+    candidates exactly. Rows from a snapshot are memory-mapped, so re-ranking
+    then only reads the candidates' pages. ``int8`` and ``pq`` train on the
+    first ``min_train`` rows; until then the index scans float32 rows.
+    """
+
+    def __init__(
+        self,
+        codec: str = "int8",
+        rerank: int = 0,
+        pq_m: Optional[int] = None,
+        n_iter: int = 10,
+        min_train: int = 1024,
+        seed: int = 0,
+    ) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec} (expected one of {', '.join(CODECS)})")
+        self.codec = codec
+        self.rerank = rerank
+        self.pq_m = pq_m
+        self.n_iter = n_iter
+        self.min_train = 0 if codec == "float16" else min_train
+        self.seed = seed
+        self._codes = RowBuffer({"float16": np.float16, "int8": np.int8, "pq": np.uint8}[codec])
+        self._rows = RowBuffer()
+        self._trained = False
+        # int8: per-dimension scale; pq: (m, 256, dim / m) centroids
+        self._scale: Optional[np.ndarray] = None
+        self._codebooks: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._codes) if self._trained else len(self._rows)
+
+    @property
+    def bytes_per_vector(self) -> float:
+        """In-memory bytes per row: codes, plus float32 rows kept for re-ranking."""
+        n = len(self)
+        if not n:
+            return 0.0
+        codes = self._codes.view if self._trained else None
+        total = codes.nbytes if codes is not None else 0
+        total += sum(a.nbytes for a in (self._scale, self._codebooks) if a is not None)
+        rows = self._rows.view
+        if rows is not None and not isinstance(rows, np.memmap):
+            total += rows.nbytes
+        return total / n
+
+    def _train(self, X: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        if self.codec == "int8":
+            self._scale = np.maximum(np.abs(X).max(axis=0), 1e-8).astype(np.float32) / 127
+        elif self.codec == "pq":
+            m = _pq_subspaces(X.shape[1], self.pq_m)
+            ks = min(256, X.shape[0])
+            sample = X[rng.choice(X.shape[0], size=min(X.shape[0], 256 * 32), replace=False)]
+            subs = sample.reshape(sample.shape[0], m, -1)
+            self._codebooks = np.stack([_kmeans(subs[:, j], ks, self.n_iter, rng) for j in range(m)])
+        self._trained = True
+
+    def _encode(self, X: np.ndarray) -> np.ndarray:
+        if self.codec == "float16":
+            return X.astype(np.float16)
+        if self.codec == "int8":
+            assert self._scale is not None
+            return np.clip(np.rint(X / self._scale), -127, 127).astype(np.int8)
+        assert self._codebooks is not None
+        m = self._codebooks.shape[0]
+        subs = X.reshape(X.shape[0], m, -1)
+        return np.stack([_nearest(subs[:, j], self._codebooks[j]) for j in range(m)], axis=1).astype(np.uint8)
+
+    def add(self, vectors: np.ndarray) -> None:
+        X = normalize_rows(vectors)
+        if self._trained:
+            self._codes.append(self._encode(X))
+            if self.rerank:
+                self._rows.append(X)
+            return
+        self._rows.append(X)
+        if len(self._rows) >= self.min_train:
+            rows = self._rows.view
+            assert rows is not None
+            self._train(rows)
+            for s in range(0, rows.shape[0], _BLOCK):
+                self._codes.append(self._encode(rows[s : s + _BLOCK]))
+            if not self.rerank:
+                self._rows = RowBuffer()
+
+    def _scores(self, Qn: np.ndarray) -> np.ndarray:
+        """Approximate (nq, N) scores; exact while untrained."""
+        if not self._trained:
+            rows = self._rows.view
+            assert rows is not None
+            return Qn @ rows.T
+        codes = self._codes.view
+        assert codes is not None
+        out = np.empty((Qn.shape[0], codes.shape[0]), dtype=np.float32)
+        if self.codec == "pq":
+            assert self._codebooks is not None
+            m, ks, _ = self._codebooks.shape
+            # Per query: (m, ks) table of sub-query . centroid, flattened for one gather per block
+            luts = np.einsum("qmd,mkd->qmk", Qn.reshape(Qn.shape[0], m, -1), self._codebooks).reshape(Qn.shape[0], -1)
+            shift = np.arange(m, dtype=np.intp) * ks
+            for s in range(0, codes.shape[0], _BLOCK):
+                flat = codes[s : s + _BLOCK].astype(np.intp) + shift
+                for i, lut in enumerate(luts):
+                    out[i, s : s + _BLOCK] = lut[flat].sum(axis=1)
+            return out
+        # Fold the int8 scale into the queries rather than decoding rows
+        Qs = Qn * self._scale if self.codec == "int8" else Qn
+        scratch = np.empty((min(_DECODE_BLOCK, codes.shape[0]), codes.shape[1]), dtype=np.float32)
+        for s in range(0, codes.shape[0], _DECODE_BLOCK):
+            block = scratch[: min(_DECODE_BLOCK, codes.shape[0] - s)]
+            block[...] = codes[s : s + _DECODE_BLOCK]
+            out[:, s : s + _DECODE_BLOCK] = Qs @ block.T
+        return out
+
+    def search(self, q: np.ndarray, k: int, live: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_many(q.reshape(1, -1), k, live=live)[0]
+
+    def search_many(self, Q: np.ndarray, k: int, live: Optional[np.ndarray] = None) -> Hits:
+        if not len(self):
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))] * Q.shape[0]
+        Qn = normalize_rows(Q)
+        sims = self._scores(Qn)
+        if live is not None:
+            sims[:, ~live] = -np.inf
+            k = min(k, int(live.sum()))
+        rows = self._rows.view if self._trained and self.rerank else None
+        if rows is None:
+            idx = top_k_rows(sims, k)
+            return list(zip(idx, np.take_along_axis(sims, idx, axis=1)))
+        cand = top_k_rows(sims, min(max(k, self.rerank), int(np.isfinite(sims[0]).sum())))
+        out: Hits = []
+        for q, c in zip(Qn, cand):
+            # Sorted reads keep memory-mapped rows sequential
+            c = np.sort(c)
+            exact = rows[c] @ q
+            sel = top_k_rows(exact[None, :], k)[0]
+            out.append((c[sel], exact[sel]))
+        return out
+
+    def compacted(self, keep: np.ndarray) -> "QuantizedIndex":
+        out = QuantizedIndex(self.codec, self.rerank, self.pq_m, self.n_iter, self.min_train, self.seed)
+        out._trained, out._scale, out._codebooks = self._trained, self._scale, self._codebooks
+        codes, rows = self._codes.view, self._rows.view
+        if self._trained and codes is not None:
+            out._codes = RowBuffer.of(codes[keep], codes.dtype)
+        if rows is not None:
+            out._rows = RowBuffer.of(rows[keep])
+        return out
+
+    def state(self) -> Dict[str, np.ndarray]:
+        out: Dict[str, np.ndarray] = {}
+        rows = self._rows.view
+        if rows is not None:
+            out["rows"] = rows
+        if self._trained and self._codes.view is not None:
+            out["codes"] = self._codes.view
+        for name, arr in (("scale", self._scale), ("codebooks", self._codebooks)):
+            if arr is not None:
+                out[name] = arr
+        return out
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], **params) -> "QuantizedIndex":
+        out = cls(**params)
+        if "rows" in state:
+            out._rows = RowBuffer.wrap(state["rows"])
+        if "codes" in state:
+            out._trained = True
+            out._codes = RowBuffer.wrap(state["codes"])
+            out._scale, out._codebooks = state.get("scale"), state.get("codebooks")
+            if "rows" not in state:
+                # Built without re-ranking: no float32 rows to re-score against
+                out.rerank = 0
+            if not out.rerank:
+                # Rows only stay aligned with the codes while both are appended to
+                out._rows = RowBuffer()
+        return out
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from .loader import Document
+from ..transport import ApiTransport
+from .index import VectorIndex
+from .loader import ANY_SOURCE, Document, iter_batches, source_of
+from .tfidf import TfidfModel
 from .vector_store import VectorDoc, VectorStore
 
 
@@ -15,15 +19,109 @@ class RetrievedChunk:
 
 
 class Retriever:
-    def __init__(self, embedding_model: str, openai_api_key: str | None) -> None:
-        self.store = VectorStore(embedding_model=embedding_model, openai_api_key=openai_api_key)
+    def __init__(
+        self,
+        embedding_model: str,
+        openai_api_key: str | None,
+        cache_dir: Optional[Path] = None,
+        index_backend: str = "exact",
+        index_params: Optional[Dict[str, Any]] = None,
+        embedder_params: Optional[Dict[str, Any]] = None,
+        transport: Optional[ApiTransport] = None,
+    ) -> None:
+        self.store = VectorStore(
+            embedding_model=embedding_model,
+            openai_api_key=openai_api_key,
+            cache_dir=cache_dir,
+            index_backend=index_backend,
+            index_params=index_params,
+            embedder_params=embedder_params,
+            transport=transport,
+        )
+        # KB source (file stem) -> chunk ids currently indexed from it
+        self._sources: Dict[str, Set[str]] = {}
+        # Called with the KB sources touched by every index/upsert/delete
+        self.listeners: List[Callable[[Set[str]], None]] = []
+
+    def reopen(self) -> None:
+        self.store.reopen()
+
+    def close(self) -> None:
+        self.store.close()
+
+    def _notify(self, sources: Set[str], known: Optional[Set[str]] = None) -> None:
+        if known is not None and not sources <= known:
+            sources = sources | {ANY_SOURCE}
+        if sources:
+            for listener in self.listeners:
+                listener(sources)
+
+    def _track(self, docs: Iterable[Document]) -> Iterator[VectorDoc]:
+        for d in docs:
+            self._sources.setdefault(source_of(d.doc_id), set()).add(d.doc_id)
+            yield VectorDoc(doc_id=d.doc_id, text=d.text)
 
     def index(self, docs: List[Document]) -> None:
-        vec_docs = [VectorDoc(doc_id=d.doc_id, text=d.text) for d in docs]
-        self.store.add(vec_docs)
+        previous, self._sources = set(self._sources), {}
+        self.store.add(list(self._track(docs)))
+        self._notify(previous | set(self._sources), previous)
+
+    def index_stream(self, docs: Iterable[Document], batch_size: int = 256) -> None:
+        previous, self._sources = set(self._sources), {}
+        self.store.add_batches(iter_batches(self._track(docs), batch_size))
+        self._notify(previous | set(self._sources), previous)
+
+    def restore(self, docs: Iterable[Document], index: VectorIndex, vectorizer: Optional[TfidfModel]) -> None:
+        """Take over a prebuilt index instead of embedding ``docs`` again."""
+        previous, self._sources = set(self._sources), {}
+        self.store.load_state(list(self._track(docs)), index, vectorizer)
+        self._notify(previous | set(self._sources), previous)
+
+    def upsert(self, docs: List[Document]) -> None:
+        known = set(self._sources)
+        self.store.upsert(list(self._track(docs)))
+        self._notify({source_of(d.doc_id) for d in docs}, known)
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        doc_ids = list(doc_ids)
+        for doc_id in doc_ids:
+            ids = self._sources.get(source_of(doc_id))
+            if ids is not None:
+                ids.discard(doc_id)
+        removed = self.store.delete(doc_ids)
+        self._notify({source_of(i) for i in doc_ids})
+        return removed
+
+    def replace_source(self, source: str, docs: List[Document]) -> None:
+        """Make ``source`` contribute exactly ``docs`` (empty list removes it)."""
+        new_ids = {d.doc_id for d in docs}
+        stale = [i for i in self._sources.get(source, set()) if i not in new_ids]
+        if docs:
+            self.upsert(docs)
+        if stale:
+            self.delete(stale)
+        if not docs:
+            self._sources.pop(source, None)
+
+    def embed_query(self, query: str) -> Tuple[Any, Any]:
+        return self.store.embed_query(query)
+
+    async def aembed_query(self, query: str) -> Tuple[Any, Any]:
+        return await self.store.aembed_query(query)
+
+    def search(self, query: str, k: int = 4, q_vec: Any = None) -> List[RetrievedChunk]:
+        results = self.store.query(query, k=k, q_vec=q_vec)
+        return [RetrievedChunk(doc_id=d.doc_id, text=d.text, score=score) for d, score in results]
+
+    def search_many(self, queries: List[str], k: int = 4) -> List[List[RetrievedChunk]]:
+        """``search`` for many queries at once, e.g. an offline eval set."""
+        return [
+            [RetrievedChunk(doc_id=d.doc_id, text=d.text, score=score) for d, score in results]
+            for results in self.store.query_many(queries, k=k)
+        ]
 
-    def search(self, query: str, k: int = 4) -> List[RetrievedChunk]:
-        results = self.store.query(query, k=k)
+    async def asearch(self, query: str, k: int = 4, q_vec: Any = None) -> List[RetrievedChunk]:
+        results = await self.store.aquery(query, k=k, q_vec=q_vec)
         return [RetrievedChunk(doc_id=d.doc_id, text=d.text, score=score) for d, score in results]
 
 
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import atexit
+import heapq
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice, repeat
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .index import Hits, RowBuffer, VectorIndex, normalize_rows, top_k_rows
+
+
+@dataclass(frozen=True)
+class Shard:
+    # Rows start:stop of the .npy file at path (shard files, or a whole snapshot)
+    path: str
+    start: int
+    stop: int
+    # Global row number of the shard's first row
+    offset: int
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+
+# Memory maps of shard files, per process; files never change once written
+_maps: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_maps_lock = threading.Lock()
+_MAX_MAPS = 64
+
+
+def _rows(shard: Shard) -> np.ndarray:
+    with _maps_lock:
+        arr = _maps.get(shard.path)
+        if arr is None:
+            arr = _maps[shard.path] = np.load(shard.path, mmap_mode="r")
+            if len(_maps) > _MAX_MAPS:
+                _maps.popitem(last=False)
+        else:
+            _maps.move_to_end(shard.path)
+    return arr[shard.start : shard.stop]
+
+
+def score_shard(shard: Shard, Q: np.ndarray, k: int, dead: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k global rows and scores per row of ``Q`` (normalized) in one shard; runs in a worker."""
+    sims = Q @ _rows(shard).T
+    if dead is not None and len(dead):
+        sims[:, dead] = -np.inf
+    idx = top_k_rows(sims, k)
+    return idx + shard.offset, np.take_along_axis(sims, idx, axis=1)
+
+
+def _remove(files: List[Tuple[str, int]]) -> None:
+    # Forked children inherit the list; each process only removes what it wrote
+    pid = os.getpid()
+    for path, owner in files:
+        if owner == pid:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+_dir: Optional[str] = None
+
+
+def _shard_dir() -> str:
+    """One directory per process tree, on tmpfs where available; removed when its creator exits.
+
+    Forked workers write into their parent's directory, so shard files they
+    leave behind (they exit with ``os._exit``) go with it.
+    """
+    global _dir
+    if _dir is None:
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        _dir = tempfile.mkdtemp(prefix=f"shards-{os.getpid()}-", dir=base)
+        atexit.register(_remove_dir, _dir, os.getpid())
+    return _dir
+
+
+def _remove_dir(path: str, owner: int) -> None:
+    if os.getpid() == owner:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+_forkserver_pid: Optional[int] = None
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    # Not fork: the parent has embedding and trace threads running. A process
+    # os.fork()ed after the forkserver started (serve.py workers) cannot use
+    # the parent's forkserver, so it spawns.
+    global _forkserver_pid
+    if "forkserver" in multiprocessing.get_all_start_methods() and _forkserver_pid in (None, os.getpid()):
+        _forkserver_pid = os.getpid()
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class ShardedIndex(VectorIndex):
+    """Exact cosine index whose rows are split into shards scored in parallel processes.
+
+    Shards are ``.npy`` files that the parent and every worker memory-map, so
+    each row is in memory once however many processes read it. A batch of
+    queries is scored against all shards on a process pool, one matrix-matrix
+    product per shard, and the per-shard top-k lists are merged with a heap.
+    Under ``min_parallel_rows`` rows the shards are scored in-process instead.
+    Appended rows are staged and written out on the next search.
+    """
+
+    def __init__(self, shards: Optional[int] = None, min_parallel_rows: int = 50_000) -> None:
+        self.n_shards = max(1, shards or os.cpu_count() or 1)
+        self.min_parallel_rows = min_parallel_rows
+        self._shards: List[Shard] = []
+        self._pending = RowBuffer()
+        # Rows per shard, fixed by the first layout; later appends fill the last shard up to twice that
+        self._target = 0
+        # (path, writing pid) of the shard files this index wrote
+        self._files: List[Tuple[str, int]] = []
+        self._finalizer = weakref.finalize(self, _remove, self._files)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._sealed + len(self._pending)
+
+    @property
+    def _sealed(self) -> int:
+        return self._shards[-1].offset + len(self._shards[-1]) if self._shards else 0
+
+    def add(self, vectors: np.ndarray) -> None:
+        with self._lock:
+            self._pending.append(normalize_rows(vectors))
+
+    def _write(self, rows: np.ndarray, offset: int) -> Shard:
+        fd, path = tempfile.mkstemp(prefix=f"shard-{os.getpid()}-", suffix=".npy", dir=_shard_dir())
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.ascontiguousarray(rows, dtype=np.float32))
+        self._files.append((path, os.getpid()))
+        return Shard(path, 0, rows.shape[0], offset)
+
+    def _sync(self) -> None:
+        pending = self._pending.view
+        if pending is None or not len(pending):
+            return
+        self._pending = RowBuffer()
+        if not self._shards:
+            self._target = max(1, math.ceil(pending.shape[0] / self.n_shards))
+        else:
+            last = self._shards[-1]
+            if len(last) + pending.shape[0] <= 2 * self._target:
+                # Rewrite a small tail shard rather than add a tiny new one
+                self._shards[-1] = self._write(np.concatenate([_rows(last), pending]), last.offset)
+                self._drop(last.path)
+                return
+        offset = self._sealed
+        for s in range(0, pending.shape[0], self._target):
+            self._shards.append(self._write(pending[s : s + self._target], offset + s))
+
+    def _drop(self, path: str) -> None:
+        with _maps_lock:
+            _maps.pop(path, None)
+        mine = [f for f in self._files if f[0] == path]
+        for f in mine:
+            self._files.remove(f)
+        _remove(mine)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.n_shards, mp_context=_pool_context())
+        return self._pool
+
+    def search(self, q: np.ndarray, k: int, live: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_many(q.reshape(1, -1), k, live=live)[0]
+
+    def search_many(self, Q: np.ndarray, k: int, live: Optional[np.ndarray] = None) -> Hits:
+        Qn = normalize_rows(Q)
+        # Held while scoring: a concurrent _sync may remove a tail shard's file
+        with self._lock:
+            self._sync()
+            shards = self._shards
+            if not shards:
+                return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))] * Q.shape[0]
+            dead = [None if live is None else np.flatnonzero(~live[s.offset : s.offset + len(s)]) for s in shards]
+            if len(shards) > 1 and self._sealed >= self.min_parallel_rows:
+                parts = list(self._executor().map(score_shard, shards, repeat(Qn), repeat(k), dead))
+            else:
+                parts = [score_shard(s, Qn, k, d) for s, d in zip(shards, dead)]
+        out: Hits = []
+        for i in range(Q.shape[0]):
+            # k-way merge of the shards' descending lists; tombstones scored -inf
+            merged = heapq.merge(*(zip(-sims[i], idx[i]) for idx, sims in parts))
+            best = [(row, -neg) for neg, row in islice(merged, k) if np.isfinite(neg)]
+            out.append(
+                (np.array([r for r, _ in best], dtype=np.int64), np.array([s for _, s in best], dtype=np.float32))
+            )
+        return out
+
+    def _all_rows(self) -> np.ndarray:
+        with self._lock:
+            self._sync()
+            if not self._shards:
+                return np.empty((0, 0), dtype=np.float32)
+            return np.concatenate([_rows(s) for s in self._shards])
+
+    def compacted(self, keep: np.ndarray) -> "ShardedIndex":
+        out = ShardedIndex(self.n_shards, self.min_parallel_rows)
+        if len(self):
+            out._pending = RowBuffer.of(self._all_rows()[keep])
+        return out
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"rows": self._all_rows()} if len(self) else {}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], **params) -> "ShardedIndex":
+        out = cls(**params)
+        rows = state.get("rows")
+        if rows is None or not len(rows):
+            return out
+        path = getattr(rows, "filename", None)
+        if path is None or not isinstance(rows, np.memmap):
+            out._pending = RowBuffer.of(rows)
+            return out
+        # A memory-mapped snapshot: shard it by row ranges, without copying
+        out._target = max(1, math.ceil(rows.shape[0] / out.n_shards))
+        for s in range(0, rows.shape[0], out._target):
+            out._shards.append(Shard(str(Path(path)), s, min(s + out._target, rows.shape[0]), s))
+        return out
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
 import math
+import threading
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy import sparse
 
-try:
-    from openai import OpenAI
-except Exception:  # pragma: no cover
-    OpenAI = None  # type: ignore
+from ..lazy import optional_import
+from ..logging_utils import console, span
+from ..transport import ApiTransport
+from .embedder import EmbeddingExecutor
+from .embedding_cache import EmbeddingCache, TfidfStateCache, corpus_fingerprint, text_key
+from .index import SparseIndex, VectorIndex, build_index
+from .tfidf import TfidfModel
 
 
 @dataclass
@@ -20,54 +25,359 @@ class VectorDoc:
 
 
 class VectorStore:
-    def __init__(self, embedding_model: str, openai_api_key: Optional[str]) -> None:
+    def __init__(
+        self,
+        embedding_model: str,
+        openai_api_key: Optional[str],
+        cache_dir: Optional[Path] = None,
+        index_backend: str = "exact",
+        index_params: Optional[Dict[str, Any]] = None,
+        compact_ratio: float = 0.25,
+        refit_ratio: float = 0.05,
+        embedder_params: Optional[Dict[str, Any]] = None,
+        transport: Optional[ApiTransport] = None,
+    ) -> None:
         self.embedding_model = embedding_model
         self.openai_api_key = openai_api_key
         self._use_openai = bool(openai_api_key)
+        self.transport = transport
+        self.cache_dir = cache_dir
+        # Number of texts sent to the embedder (queries included); 0 on a warm start
+        self.embedded_count = 0
+        self.index_backend = index_backend
+        self.index_params = dict(index_params or {})
+        self._index: Optional[VectorIndex] = None
 
-        self._vectorizer: Optional[TfidfVectorizer] = None
-        self._tfidf_matrix: Optional[np.ndarray] = None
-        self._embeddings: Optional[np.ndarray] = None
+        self.compact_ratio = compact_ratio
+        # TF-IDF: docs upserted since the last fit with terms its vocabulary
+        # lacks; the vocabulary is refit once they reach refit_ratio of the store
+        self.refit_ratio = refit_ratio
+        self._unfit_docs = 0
+        self._vectorizer: Optional[TfidfModel] = None
+        # Bumped whenever TF-IDF is refit, since old query vectors no longer line up
+        self._tfidf_version = 0
+        self._cache: Optional[EmbeddingCache] = None
+
+        # Row-aligned with the index; tombstoned rows stay until compaction
         self._docs: List[VectorDoc] = []
+        self._live = np.zeros(0, dtype=bool)
+        self._row_of: Dict[str, int] = {}
+        # _lock guards the swap of docs/index/live; _write_lock serializes writers
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+
+        self.embedder_params = dict(embedder_params or {})
+        self._executor: Optional[EmbeddingExecutor] = None
+        self.reopen()
+
+    def reopen(self) -> None:
+        """(Re)create API clients and the embedding executor, e.g. in a forked worker."""
+        # Retries are handled by EmbeddingExecutor, so the SDK's own are disabled
+        key = self.openai_api_key
+        openai = optional_import("openai") if self._use_openai else None
+        self._client = self._aclient = None
+        if openai:
+            t = self.transport
+            self._client = openai.OpenAI(api_key=key, max_retries=0, http_client=t.http_client(openai) if t else None)
+            self._aclient = openai.AsyncOpenAI(
+                api_key=key, max_retries=0, http_client=t.async_http_client(openai) if t else None
+            )
+        self._executor = None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.close()
+            self._executor = None
+        if self._index is not None:
+            self._index.close()
 
-        self._client = OpenAI(api_key=openai_api_key) if (self._use_openai and OpenAI) else None
+    def embed_stats(self) -> Dict[str, int]:
+        """Embedding API requests/inputs/retries so far (empty before the first call)."""
+        return dict(self._executor.stats) if self._executor is not None else {}
+
+    @property
+    def executor(self) -> EmbeddingExecutor:
+        if self._executor is None or self._executor.client is not self._client:
+            self._executor = EmbeddingExecutor(
+                self._client, self.embedding_model, async_client=self._aclient, **self.embedder_params
+            )
+        return self._executor
 
     def _embed_texts_openai(self, texts: List[str]) -> np.ndarray:
         assert self._client is not None
-        response = self._client.embeddings.create(model=self.embedding_model, input=texts)
-        vectors = [item.embedding for item in response.data]
-        return np.array(vectors, dtype=np.float32)
-
-    def _embed_texts_tfidf(self, texts: List[str]) -> np.ndarray:
-        # Use TF-IDF as a vector baseline; cosine similarity works similarly
-        if self._vectorizer is None:
-            self._vectorizer = TfidfVectorizer(stop_words="english")
-            self._tfidf_matrix = self._vectorizer.fit_transform(texts)
-            return self._tfidf_matrix.toarray().astype(np.float32)
-        else:
-            tfidf = self._vectorizer.transform(texts)
-            return tfidf.toarray().astype(np.float32)
+        self.embedded_count += len(texts)
+        return self.executor.embed(texts)
+
+    def _embed_query_openai(self, text: str) -> np.ndarray:
+        assert self._client is not None
+        self.embedded_count += 1
+        return self.executor.embed_one(text)
+
+    def _embed_docs_openai(self, texts: List[str]) -> np.ndarray:
+        if self.cache_dir is None:
+            return self._embed_texts_openai(texts)
+        if self._cache is None:
+            self._cache = EmbeddingCache(self.cache_dir, self.embedding_model)
+        cache = self._cache
+        keys = [text_key(t) for t in texts]
+        missing = [i for i, k in enumerate(keys) if k not in cache]
+        if missing:
+            # Another worker may have just embedded them (see cache_lock)
+            cache.refresh()
+            missing = [i for i, k in enumerate(keys) if k not in cache]
+        if missing:
+            fresh = self._embed_texts_openai([texts[i] for i in missing])
+            cache.put([keys[i] for i in missing], fresh)
+        return cache.get(keys)
+
+    def _fit_tfidf(self, texts: List[str]) -> Tuple[TfidfModel, sparse.csr_matrix]:
+        fingerprint = ""
+        state_cache: Optional[TfidfStateCache] = None
+        if self.cache_dir is not None:
+            state_cache = TfidfStateCache(self.cache_dir)
+            fingerprint = corpus_fingerprint([text_key(t) for t in texts])
+            cached = state_cache.load(fingerprint)
+            if cached is not None:
+                return cached
+        # Use TF-IDF as a vector baseline; rows are L2-normalized so dot product == cosine.
+        # Kept sparse: densifying costs docs x vocabulary floats.
+        vectorizer, matrix = TfidfModel.fit(texts, stop_words="english")
+        if state_cache is not None:
+            try:
+                state_cache.save(fingerprint, vectorizer, matrix)
+            except OSError as e:  # best-effort: the next start refits instead
+                console.print(f"[yellow]TF-IDF cache not saved:[/yellow] {e}")
+        return vectorizer, matrix
+
+    def _embed_texts_tfidf(self, texts: List[str]) -> sparse.csr_matrix:
+        assert self._vectorizer is not None
+        return self._vectorizer.transform(texts).tocsr()
+
+    def _new_term_docs(self, texts: List[str]) -> int:
+        """How many of ``texts`` contain terms the fitted vocabulary lacks."""
+        assert self._vectorizer is not None
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+        vocab = self._vectorizer.vocabulary
+        return sum(
+            any(term not in vocab and term not in ENGLISH_STOP_WORDS for term in self._vectorizer.terms(t))
+            for t in texts
+        )
 
     def add(self, docs: List[VectorDoc]) -> None:
-        self._docs = list(docs)
-        texts = [d.text for d in docs]
-        if self._use_openai and self._client is not None:
-            self._embeddings = self._embed_texts_openai(texts)
-        else:
-            self._embeddings = self._embed_texts_tfidf(texts)
-
-    def query(self, text: str, k: int = 4) -> List[Tuple[VectorDoc, float]]:
-        if self._embeddings is None:
+        self.add_batches([list(docs)])
+
+    def add_batches(self, batches: Iterable[List[VectorDoc]]) -> None:
+        """Replace the store's contents, consuming ``batches`` one at a time.
+
+        Embeddings are computed and indexed per batch, so peak working memory is
+        bounded by the batch size rather than the corpus size. TF-IDF needs the
+        whole vocabulary first, so it is fit once all batches have arrived.
+        """
+        with self._write_lock:
+            docs: List[VectorDoc] = []
+            if self._dense:
+                index = build_index(self.index_backend, **self.index_params)
+                for batch in batches:
+                    docs.extend(batch)
+                    index.add(self._embed_docs_openai([d.text for d in batch]))
+                vectorizer = None
+            else:
+                for batch in batches:
+                    docs.extend(batch)
+                index = SparseIndex()
+                vectorizer, matrix = self._fit_tfidf([d.text for d in docs])
+                index.add(matrix)
+            self._swap(docs, index, vectorizer)
+
+    def _swap(self, docs: List[VectorDoc], index: VectorIndex, vectorizer: Optional[TfidfModel]) -> None:
+        row_of = {d.doc_id: i for i, d in enumerate(docs)}
+        live = np.ones(len(docs), dtype=bool)
+        if len(row_of) < len(docs):
+            # Duplicate ids: the last occurrence wins
+            live[:] = False
+            live[list(row_of.values())] = True
+        with self._lock:
+            if vectorizer is not self._vectorizer:
+                self._tfidf_version += 1
+                self._unfit_docs = 0
+            old, self._index = self._index, index
+            self._docs, self._vectorizer = docs, vectorizer
+            self._row_of, self._live = row_of, live
+            if old is not None and old is not index:
+                # No search is running on it: they hold the lock
+                old.close()
+
+    def export_state(self) -> Tuple[List[VectorDoc], Optional[VectorIndex], Optional[TfidfModel]]:
+        """Live docs, their index and the TF-IDF model (None for dense embeddings), compacted first."""
+        with self._write_lock:
+            if self.dead_count:
+                self.compact()
+            return list(self._docs), self._index, self._vectorizer
+
+    def load_state(self, docs: List[VectorDoc], index: VectorIndex, vectorizer: Optional[TfidfModel]) -> None:
+        """Install a prebuilt index (see ``index_snapshot``) in place of ``add``."""
+        with self._write_lock:
+            self._swap(docs, index, vectorizer)
+
+    @property
+    def _dense(self) -> bool:
+        return self._use_openai and self._client is not None
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    @property
+    def dead_count(self) -> int:
+        return len(self._docs) - len(self._row_of)
+
+    def doc_ids(self) -> List[str]:
+        return list(self._row_of)
+
+    def upsert(self, docs: List[VectorDoc]) -> None:
+        """Insert new docs and replace changed ones in place of a full re-index.
+
+        Replaced rows are tombstoned and new rows appended; once tombstones pass
+        ``compact_ratio`` of the store it is compacted. Under TF-IDF, new docs
+        are vectorized with the fitted vocabulary, so terms it lacks are not
+        searchable until the next refit. That happens in a compaction, which also
+        runs once such docs pass ``refit_ratio`` of the store (``compact()``
+        forces one), rather than on every upsert.
+        """
+        with self._write_lock:
+            latest = {d.doc_id: d for d in docs}
+            fresh = [
+                d for d in latest.values()
+                if d.doc_id not in self._row_of or self._docs[self._row_of[d.doc_id]].text != d.text
+            ]
+            if not fresh:
+                return
+            texts = [d.text for d in fresh]
+            if self._index is None:
+                self.add(fresh)
+                return
+            if self._dense:
+                vectors = self._embed_docs_openai(texts)
+            else:
+                self._unfit_docs += self._new_term_docs(texts)
+                vectors = self._embed_texts_tfidf(texts)
+            with self._lock:
+                base = len(self._docs)
+                live = np.concatenate([self._live, np.ones(len(fresh), dtype=bool)])
+                for d in fresh:
+                    old = self._row_of.get(d.doc_id)
+                    if old is not None:
+                        live[old] = False
+                docs = self._docs + fresh
+                self._index.add(vectors)
+                self._docs, self._live = docs, live
+                for i, d in enumerate(fresh):
+                    self._row_of[d.doc_id] = base + i
+            refit = self._unfit_docs >= max(1.0, self.refit_ratio * len(self))
+            if refit or self.dead_count > self.compact_ratio * max(1, len(self._docs)):
+                self.compact()
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        with self._write_lock:
+            removed = 0
+            with self._lock:
+                live = self._live.copy()
+                for doc_id in doc_ids:
+                    row = self._row_of.pop(doc_id, None)
+                    if row is not None:
+                        live[row] = False
+                        removed += 1
+                self._live = live
+            if removed and self.dead_count > self.compact_ratio * max(1, len(self._docs)):
+                self.compact()
+            return removed
+
+    def compact(self) -> None:
+        """Drop tombstoned rows; under TF-IDF this also refits the vocabulary."""
+        with self._write_lock:
+            if self._index is None:
+                return
+            keep = np.flatnonzero(self._live)
+            docs = [self._docs[i] for i in keep]
+            if self._dense:
+                self._swap(docs, self._index.compacted(keep), None)
+                return
+            index = SparseIndex()
+            if docs:
+                vectorizer, matrix = self._fit_tfidf([d.text for d in docs])
+                index.add(matrix)
+                self._swap(docs, index, vectorizer)
+            else:
+                self._swap(docs, index, self._vectorizer)
+
+    @property
+    def embedding_space(self) -> Any:
+        """Identifies the space query vectors live in; changes when TF-IDF is refit."""
+        return self.embedding_model if self._dense else f"tfidf:{self._tfidf_version}"
+
+    def embed_query(self, text: str) -> Tuple[Any, Any]:
+        """Query vector (dense array or sparse TF-IDF row) and its ``embedding_space``."""
+        if self._dense:
+            return self._embed_query_openai(text), self.embedding_space
+        with self._lock:
+            if self._vectorizer is None:
+                return None, None
+            return self._embed_texts_tfidf([text]), self.embedding_space
+
+    async def aembed_query(self, text: str) -> Tuple[Any, Any]:
+        if not self._dense:
+            return self.embed_query(text)
+        self.embedded_count += 1
+        return await self.executor.aembed_one(text), self.embedding_space
+
+    def query(self, text: str, k: int = 4, q_vec: Optional[np.ndarray] = None) -> List[Tuple[VectorDoc, float]]:
+        """Top-k docs for ``text``; a dense ``q_vec`` from ``embed_query`` skips re-embedding."""
+        if self._index is None:
+            return []
+        if not self._dense:
+            q_vec = None
+        elif q_vec is None:
+            with span("embed_query", model=self.embedding_model):
+                q_vec = self._embed_query_openai(text)
+        return self._search(text, q_vec, k)
+
+    async def aquery(
+        self, text: str, k: int = 4, q_vec: Optional[np.ndarray] = None
+    ) -> List[Tuple[VectorDoc, float]]:
+        if self._index is None:
             return []
-        if self._use_openai and self._client is not None:
-            q_vec = self._embed_texts_openai([text])[0]
-        else:
-            q_vec = self._embed_texts_tfidf([text])[0]
-        A = self._embeddings
-        q = q_vec
-        denom = (np.linalg.norm(A, axis=1) * (np.linalg.norm(q) + 1e-8)) + 1e-8
-        sims = (A @ q) / denom
-        idx = np.argsort(-sims)[:k]
-        return [(self._docs[i], float(sims[i])) for i in idx]
+        if not self._dense:
+            q_vec = None
+        elif q_vec is None:
+            with span("embed_query", model=self.embedding_model):
+                q_vec, _ = await self.aembed_query(text)
+        return self._search(text, q_vec, k)
 
+    def query_many(self, texts: List[str], k: int = 4) -> List[List[Tuple[VectorDoc, float]]]:
+        """``query`` for a batch: one embedding request and one index scan for all of ``texts``."""
+        if self._index is None or not texts:
+            return [[] for _ in texts]
+        Q = None
+        if self._dense:
+            with span("embed_query", model=self.embedding_model, n=len(texts)):
+                Q = self._embed_texts_openai(texts)
+        with span("index_search", backend=self.index_backend if self._dense else "tfidf", queries=len(texts)), self._lock:
+            if Q is None:
+                if self._vectorizer is None:
+                    return [[] for _ in texts]
+                Q = self._embed_texts_tfidf(texts)
+            hits = self._index.search_many(Q, k, live=self._live)
+            docs = self._docs
+        return [[(docs[i], float(s)) for i, s in zip(idx, sims)] for idx, sims in hits]
 
+    def _search(self, text: str, q_vec: Optional[np.ndarray], k: int) -> List[Tuple[VectorDoc, float]]:
+        with span("index_search", backend=self.index_backend if self._dense else "tfidf"), self._lock:
+            # TF-IDF query vectors depend on the fitted vocabulary, so build them
+            # under the lock together with the index they are scored against
+            if q_vec is None:
+                if self._vectorizer is None:
+                    return []
+                q_vec = self._embed_texts_tfidf([text])
+            idx, sims = self._index.search(q_vec, k, live=self._live)
+            docs = self._docs
+        return [(docs[i], float(s)) for i, s in zip(idx, sims)]
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..logging_utils import console
+
+Snapshot = Dict[Path, Tuple[int, int]]
+
+
+def snapshot_kb(kb_dir: Path) -> Snapshot:
+    snap: Snapshot = {}
+    for p in kb_dir.glob("*.txt"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        snap[p] = (st.st_mtime_ns, st.st_size)
+    return snap
+
+
+class KBWatcher:
+    """Polls ``kb_dir`` and reports ``(changed, removed)`` ``*.txt`` files to ``on_change``.
+
+    Uses mtime/size polling so it needs no extra dependency; ``interval`` bounds
+    how long an edit takes to be noticed.
+    """
+
+    def __init__(
+        self,
+        kb_dir: Path,
+        on_change: Callable[[List[Path], List[Path]], None],
+        interval: float = 0.25,
+        baseline: Optional[Snapshot] = None,
+    ) -> None:
+        self.kb_dir = kb_dir
+        self.on_change = on_change
+        self.interval = interval
+        self._last = baseline if baseline is not None else snapshot_kb(kb_dir)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> Tuple[List[Path], List[Path]]:
+        """Report changes since the last successful poll to ``on_change``.
+
+        The new snapshot is only kept once ``on_change`` returns, so a change it
+        failed to apply is reported again by the next poll.
+        """
+        current = snapshot_kb(self.kb_dir)
+        changed = sorted(p for p, sig in current.items() if self._last.get(p) != sig)
+        removed = sorted(p for p in self._last if p not in current)
+        if changed or removed:
+            self.on_change(changed, removed)
+        self._last = current
+        return changed, removed
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:  # keep watching; the next poll retries
+                console.print(f"[red]KB watcher error:[/red] {e}")
+
+    def start(self) -> "KBWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="kb-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,12 +1,24 @@
 from __future__ import annotations
 
+import re
+import threading
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Set
 
-import pandas as pd
-from rapidfuzz import process, fuzz
+from .price_catalogue import PriceCatalogue, file_signature
+from .product_index import ProductIndex
+
+# Separators between product mentions: "A and B", "A vs. B", "A, B or C", ...
+_MENTION_SPLIT = re.compile(
+    r"\s*(?:[,;&/]|\band\b|\bor\b|\bvs\b\.?|\bversus\b|\bcompared (?:to|with)\b)\s*", re.IGNORECASE
+)
+
+
+def product_mentions(query: str) -> List[str]:
+    """Split a query into the segments that may each name a product."""
+    return [m for m in (part.strip(" ?!.") for part in _MENTION_SPLIT.split(query)) if m]
 
 
 @dataclass
@@ -19,25 +31,106 @@ class PriceResult:
 
 
 class CSVPriceTool:
-    def __init__(self, csv_path: Path) -> None:
+    """Fuzzy price lookup over ``prices.csv``.
+
+    The CSV is served from a memory-mapped columnar copy (see ``PriceCatalogue``)
+    when ``cache_dir`` is set. ``refresh`` picks up edits to the file: the new
+    catalogue and index are built off to the side and swapped in as one tuple,
+    so lookups already running finish against the old snapshot.
+    """
+
+    def __init__(
+        self,
+        csv_path: Path,
+        ngram_min_rows: int = 5000,
+        cache_dir: Optional[Path] = None,
+        index_state: Optional[Dict[str, Any]] = None,
+    ) -> None:
         self.csv_path = csv_path
-        self.df = pd.read_csv(csv_path)
+        self.ngram_min_rows = ngram_min_rows
+        self.cache_dir = cache_dir
+        self._reload_lock = threading.RLock()
+        self._signature = file_signature(csv_path)
+        self._load(PriceCatalogue.open(csv_path, cache_dir), index_state)
+
+    def _load(self, catalogue: PriceCatalogue, index_state: Optional[Dict[str, Any]] = None) -> None:
+        # index_state: a saved ProductIndex.state() for this catalogue (from an index snapshot)
+        if index_state is not None and len(index_state["choices"]) == len(catalogue):
+            index = ProductIndex.from_state(index_state, catalogue.skus.tolist())
+        else:
+            index = ProductIndex(catalogue.names.tolist(), catalogue.skus.tolist(), ngram_min_rows=self.ngram_min_rows)
+        # Swapped as one tuple so concurrent lookups never see a mismatched pair
+        self._snapshot = (catalogue, index)
+
+    @property
+    def catalogue(self) -> PriceCatalogue:
+        return self._snapshot[0]
+
+    @property
+    def index(self) -> ProductIndex:
+        return self._snapshot[1]
+
+    def reload(self) -> Set[str]:
+        """Re-read the CSV; returns the SKUs whose row was added, removed or changed."""
+        with self._reload_lock:
+            signature = file_signature(self.csv_path)
+            old = self.catalogue
+            catalogue = PriceCatalogue.open(self.csv_path, self.cache_dir)
+            # Only once the new catalogue is open: a failed reload stays stale and is retried
+            self._signature = signature
+            if catalogue.sha256 and catalogue.sha256 == old.sha256:
+                return set()
+            before, after = old.rows_by_sku(), catalogue.rows_by_sku()
+            self._load(catalogue)
+            return {sku for sku in before.keys() | after.keys() if before.get(sku) != after.get(sku)}
+
+    def stale(self) -> bool:
+        """Whether the CSV's mtime/size changed since it was last loaded (one ``stat``)."""
+        try:
+            return file_signature(self.csv_path) != self._signature
+        except OSError:
+            return False
+
+    def refresh(self) -> Set[str]:
+        """Reload if the CSV's mtime/size changed; a no-op while another thread reloads."""
+        try:
+            signature = file_signature(self.csv_path)
+        except OSError:
+            return set()
+        if signature == self._signature or not self._reload_lock.acquire(blocking=False):
+            return set()
+        try:
+            if file_signature(self.csv_path) == self._signature:
+                return set()
+            return self.reload()
+        finally:
+            self._reload_lock.release()
+
+    @staticmethod
+    def _result(catalogue: PriceCatalogue, idx: int, score: float, latency_ms: float) -> PriceResult:
+        return PriceResult(
+            product_name=catalogue.names[idx],
+            sku=catalogue.skus[idx],
+            price_usd=float(catalogue.prices[idx]),
+            score=score,
+            latency_ms=latency_ms,
+        )
+
+    def lookup_many(self, queries: List[str], top_k: int = 1) -> List[List[PriceResult]]:
+        """Top-``top_k`` matches per query, all scored in one vectorized call."""
+        t0 = time.perf_counter()
+        catalogue, index = self._snapshot
+        matches = index.best_many(list(queries), k=top_k)
+        dt = (time.perf_counter() - t0) * 1000
+        return [[self._result(catalogue, idx, score, dt) for idx, score in found] for found in matches]
 
     def lookup(self, query: str) -> Optional[PriceResult]:
         t0 = time.perf_counter()
-        choices = self.df["product_name"].astype(str).tolist()
-        match = process.extractOne(query, choices, scorer=fuzz.WRatio)
+        catalogue, index = self._snapshot  # reload() may swap it concurrently
+        match = index.best(query)
         if not match:
             return None
-        name, score, idx = match
-        row = self.df.iloc[idx]
-        dt = (time.perf_counter() - t0) * 1000
-        return PriceResult(
-            product_name=row["product_name"],
-            sku=row["sku"],
-            price_usd=float(row["price_usd"]),
-            score=float(score),
-            latency_ms=dt,
-        )
+        idx, score = match
+        return self._result(catalogue, idx, score, (time.perf_counter() - t0) * 1000)
 
 
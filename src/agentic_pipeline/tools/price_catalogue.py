@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..retriever.embedding_cache import _atomic_save_npy, _atomic_write_text
+
+COLUMNS = ("product_name", "sku", "price_usd")
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_signature(path: Path) -> Tuple[int, int]:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+class StringColumn:
+    """Variable-length UTF-8 strings as one byte array plus int64 offsets."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray) -> None:
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def encode(cls, values: List[str]) -> "StringColumn":
+        encoded = [v.encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i] : self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        raw = self.data.tobytes()
+        o = self.offsets.tolist()
+        return [raw[o[i] : o[i + 1]].decode("utf-8") for i in range(len(self))]
+
+
+class PriceCatalogue:
+    """Columnar copy of ``prices.csv``: names, SKUs and prices, row-aligned.
+
+    ``open`` converts the CSV once into ``.npy`` columns under
+    ``cache_dir/prices/<sha256>/`` and memory-maps them afterwards, so every
+    process serving the same catalogue shares one copy of the pages. A
+    ``current.json`` pointer records the CSV's mtime/size so an unchanged file
+    is recognized without re-hashing it.
+    """
+
+    def __init__(self, names: StringColumn, skus: StringColumn, prices: np.ndarray, sha256: str = "") -> None:
+        self.names = names
+        self.skus = skus
+        self.prices = prices
+        self.sha256 = sha256
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def rows_by_sku(self) -> Dict[str, Tuple[str, float]]:
+        return dict(zip(self.skus.tolist(), zip(self.names.tolist(), self.prices.tolist())))
+
+    @classmethod
+    def from_csv(cls, csv_path: Path, sha256: str = "") -> "PriceCatalogue":
+        import pandas as pd
+
+        df = pd.read_csv(csv_path, usecols=list(COLUMNS), dtype={"product_name": str, "sku": str})
+        return cls(
+            StringColumn.encode(df["product_name"].fillna("").tolist()),
+            StringColumn.encode(df["sku"].fillna("").tolist()),
+            df["price_usd"].to_numpy(dtype=np.float64),
+            sha256=sha256,
+        )
+
+    @classmethod
+    def open(cls, csv_path: Path, cache_dir: Optional[Path] = None, keep_versions: int = 2) -> "PriceCatalogue":
+        if cache_dir is None:
+            return cls.from_csv(csv_path)
+        root = cache_dir / "prices"
+        pointer = root / "current.json"
+        mtime_ns, size = file_signature(csv_path)
+        sha = ""
+        try:
+            current = json.loads(pointer.read_text(encoding="utf-8"))
+            if current.get("source") == str(csv_path) and (current["mtime_ns"], current["size"]) == (mtime_ns, size):
+                sha = current["sha256"]
+        except Exception:
+            pass
+        sha = sha or file_sha256(csv_path)
+        version = root / sha[:16]
+        catalogue = cls._load(version, sha)
+        if catalogue is None:
+            catalogue = cls.from_csv(csv_path, sha256=sha)
+            try:
+                catalogue._save(version)
+                cls._prune(root, keep=version, keep_versions=keep_versions)
+            except OSError:
+                pass  # another process may have published this version; if not, serve the parsed copy
+            catalogue = cls._load(version, sha) or catalogue
+        try:
+            _atomic_write_text(
+                pointer, json.dumps({"source": str(csv_path), "mtime_ns": mtime_ns, "size": size, "sha256": sha})
+            )
+        except OSError:
+            pass  # the next open re-hashes the CSV instead
+        return catalogue
+
+    def _save(self, version: Path) -> None:
+        version.mkdir(parents=True, exist_ok=True)
+        for name, col in (("product_name", self.names), ("sku", self.skus)):
+            _atomic_save_npy(version / f"{name}.offsets.npy", col.offsets)
+            _atomic_save_npy(version / f"{name}.data.npy", col.data)
+        _atomic_save_npy(version / "price_usd.npy", self.prices)
+        # Written last: a version directory without meta.json is incomplete
+        _atomic_write_text(version / "meta.json", json.dumps({"sha256": self.sha256, "rows": len(self)}))
+
+    @classmethod
+    def _load(cls, version: Path, sha: str) -> Optional["PriceCatalogue"]:
+        try:
+            meta = json.loads((version / "meta.json").read_text(encoding="utf-8"))
+            if meta.get("sha256") != sha:
+                return None
+
+            def column(name: str) -> StringColumn:
+                return StringColumn(
+                    np.load(version / f"{name}.offsets.npy", mmap_mode="r"),
+                    np.load(version / f"{name}.data.npy", mmap_mode="r"),
+                )
+
+            catalogue = cls(column("product_name"), column("sku"), np.load(version / "price_usd.npy", mmap_mode="r"), sha)
+        except Exception:
+            return None
+        if len(catalogue.names) != meta.get("rows") or len(catalogue.skus) != len(catalogue):
+            return None
+        return catalogue
+
+    @staticmethod
+    def _prune(root: Path, keep: Path, keep_versions: int) -> None:
+        # Other processes may still map older versions; unlinking is safe on POSIX
+        def mtime(p: Path) -> float:
+            try:
+                return p.stat().st_mtime
+            except OSError:  # pruned by another process meanwhile
+                return 0.0
+
+        versions = sorted((p for p in root.iterdir() if p.is_dir() and p != keep), key=mtime, reverse=True)
+        for old in versions[max(0, keep_versions - 1) :]:
+            shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+from ..retriever.index import SparseIndex, top_k
+from ..retriever.tfidf import TfidfModel
+
+_SKU_TOKEN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]*")
+
+
+class ProductIndex:
+    """Fuzzy product-name search over a fixed catalogue, built once.
+
+    Names are normalized with RapidFuzz's ``default_process`` up front. A query
+    first tries the exact fast paths (a SKU token in the query, or the whole
+    query equal to a product name). Otherwise, above ``ngram_min_rows`` rows, a
+    char-trigram TF-IDF inverted index picks the ``candidates`` closest names
+    and only those are scored with ``WRatio``; smaller catalogues are scanned.
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        skus: List[str],
+        ngram_min_rows: int = 5000,
+        candidates: int = 256,
+    ) -> None:
+        self._setup([default_process(n) for n in names], skus, candidates)
+        if len(self.choices) >= ngram_min_rows:
+            # Trigrams shared by >5% of names do not narrow anything down but have
+            # the longest posting lists, so they are left out
+            max_df = 0.05 if len(self.choices) >= 1000 else 1.0
+            try:
+                vectorizer, matrix = TfidfModel.fit(self.choices, analyzer="char_wb", ngram_range=(3, 3), max_df=max_df)
+            except ValueError:
+                # No usable trigrams (e.g. all names shorter than 3 chars): scan instead
+                return
+            self._vectorizer, self._ngrams = vectorizer, SparseIndex()
+            self._ngrams.add(matrix)
+
+    def _setup(self, choices: List[str], skus: List[str], candidates: int) -> None:
+        self.choices = choices
+        self.candidates = candidates
+        self.by_name: Dict[str, int] = {}
+        for i, c in enumerate(self.choices):
+            self.by_name.setdefault(c, i)
+        self.by_sku: Dict[str, int] = {}
+        for i, s in enumerate(skus):
+            self.by_sku.setdefault(s.upper(), i)
+        self._vectorizer: Optional[TfidfModel] = None
+        self._ngrams: Optional[SparseIndex] = None
+
+    def state(self) -> Dict[str, Any]:
+        """Normalized names plus the n-gram model and index, for ``from_state``."""
+        state: Dict[str, Any] = {"choices": self.choices, "candidates": self.candidates}
+        if self._vectorizer is not None and self._ngrams is not None:
+            state["vocabulary"] = self._vectorizer.vocabulary
+            state["idf"] = self._vectorizer.idf
+            state["ngrams"] = self._ngrams.state()
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], skus: List[str]) -> "ProductIndex":
+        out = cls.__new__(cls)
+        out._setup(list(state["choices"]), skus, int(state["candidates"]))
+        if "vocabulary" in state:
+            out._vectorizer = TfidfModel(state["vocabulary"], state["idf"], analyzer="char_wb", ngram=3)
+            out._ngrams = SparseIndex.from_state(state["ngrams"])
+        return out
+
+    def __len__(self) -> int:
+        return len(self.choices)
+
+    def exact(self, query: str) -> Optional[int]:
+        for token in _SKU_TOKEN.findall(query):
+            row = self.by_sku.get(token.upper())
+            if row is not None:
+                return row
+        return self.by_name.get(default_process(query))
+
+    def candidate_rows(self, processed_query: str) -> Optional[np.ndarray]:
+        """Rows worth scoring for ``processed_query``; None means scan everything."""
+        if self._ngrams is None or self._vectorizer is None:
+            return None
+        idx, _ = self._ngrams.search(self._vectorizer.transform([processed_query]), self.candidates)
+        # Catalogue order, so ties break the same way as a full scan
+        return np.sort(idx)
+
+    def best(self, query: str) -> Optional[Tuple[int, float]]:
+        row = self.exact(query)
+        if row is not None:
+            return row, 100.0
+        q = default_process(query)
+        rows = self.candidate_rows(q)
+        choices = self.choices if rows is None else [self.choices[i] for i in rows]
+        match = process.extractOne(q, choices, scorer=fuzz.WRatio, processor=None)
+        if not match:
+            return None
+        _, score, pos = match
+        return (pos if rows is None else int(rows[pos])), float(score)
+
+    def best_many(self, queries: List[str], k: int = 1) -> List[List[Tuple[int, float]]]:
+        """Top-``k`` ``(row, score)`` per query, scored in one vectorized RapidFuzz call.
+
+        Without the n-gram index that is a ``cdist`` of queries x catalogue. With
+        it, each query only needs its own candidates, so the (query, candidate)
+        pairs are flattened into a single ``cpdist`` call instead.
+        """
+        if not queries or not self.choices:
+            return [[] for _ in queries]
+        processed = [default_process(q) for q in queries]
+        if self._ngrams is None:
+            rows = [np.arange(len(self.choices))] * len(queries)
+            # Spinning up the thread pool costs ~1 ms, which only pays off on big matrices
+            workers = -1 if len(processed) * len(self.choices) >= 100_000 else 1
+            matrix = process.cdist(
+                processed, self.choices, scorer=fuzz.WRatio, processor=None, dtype=np.float32, workers=workers
+            )
+            scores = list(matrix)
+        else:
+            rows = [self.candidate_rows(q) for q in processed]
+            pairs_q = [q for q, r in zip(processed, rows) for _ in range(len(r))]
+            pairs_c = [self.choices[i] for r in rows for i in r]
+            flat = process.cpdist(
+                pairs_q, pairs_c, scorer=fuzz.WRatio, processor=None, dtype=np.float32, workers=-1
+            )
+            scores = np.split(flat, np.cumsum([len(r) for r in rows])[:-1])
+        out: List[List[Tuple[int, float]]] = []
+        for query, cand_rows, cand_scores in zip(queries, rows, scores):
+            exact = self.exact(query)
+            picked = [] if exact is None else [(exact, 100.0)]
+            best = top_k(cand_scores, k + len(picked))
+            # Score desc, then catalogue order, matching extractOne's tie-breaking
+            best = best[np.lexsort((cand_rows[best], -cand_scores[best]))]
+            for j in best:
+                if int(cand_rows[j]) != exact:
+                    picked.append((int(cand_rows[j]), float(cand_scores[j])))
+            out.append(picked[:k])
+        return out
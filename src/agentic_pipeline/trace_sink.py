@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import atexit
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import IO, AbstractSet, Any, Dict, Iterable, Iterator, List, Optional, Set
+
+SEGMENT_GLOB = "traces-*.jsonl*"
+
+
+class TraceSink:
+    """Appends trace dicts to rotating JSONL segments from a background thread.
+
+    ``submit`` only enqueues; the writer thread serializes records compactly,
+    writes them in batches of up to ``batch_size`` and flushes at least every
+    ``flush_interval_s``. A segment is rotated once it reaches ``max_bytes``
+    (on disk, so compressed size with ``compress``) or ``max_age_s``; with
+    ``max_segments`` the oldest are deleted. Every process writes its own
+    segments, so several workers can share one directory.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = 64 << 20,
+        max_age_s: float = 3600.0,
+        flush_interval_s: float = 1.0,
+        batch_size: int = 256,
+        compress: bool = False,
+        max_segments: Optional[int] = None,
+        queue_size: int = 10_000,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = batch_size
+        self.compress = compress
+        self.max_segments = max_segments
+        # Bounded: if the disk falls this far behind, callers block rather than
+        # letting memory grow without limit
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._raw: Optional[IO[bytes]] = None
+        self._out: Optional[IO[bytes]] = None
+        self._opened_at = 0.0
+        self._seq = 0
+        self.segment: Optional[Path] = None
+        self.written = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="trace-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        if self._closed:
+            raise RuntimeError("TraceSink is closed")
+        self._queue.put(record)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted so far is on disk."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        lines: List[bytes] = []
+        waiters: List[threading.Event] = []
+        last_flush = time.monotonic()
+        stop = False
+        while not stop:
+            timeout = max(0.0, self.flush_interval_s - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    lines.append(json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+            except queue.Empty:
+                pass
+            due = time.monotonic() - last_flush >= self.flush_interval_s
+            if stop or waiters or len(lines) >= self.batch_size or (due and lines):
+                try:
+                    self._write(lines)
+                except OSError:
+                    pass  # traces are best-effort; never take the writer down
+                lines = []
+                last_flush = time.monotonic()
+                for w in waiters:
+                    w.set()
+                waiters = []
+            elif due:
+                last_flush = time.monotonic()
+        self._close_segment()
+
+    def _write(self, lines: List[bytes]) -> None:
+        if not lines:
+            return
+        if self._out is None or self._should_rotate():
+            self._open_segment()
+        assert self._out is not None
+        self._out.write(b"".join(lines))
+        # GzipFile.flush emits a sync point, so a crash loses at most the tail
+        self._out.flush()
+        self.written += len(lines)
+
+    def _should_rotate(self) -> bool:
+        assert self._raw is not None
+        return self._raw.tell() >= self.max_bytes or time.monotonic() - self._opened_at >= self.max_age_s
+
+    def _open_segment(self) -> None:
+        self._close_segment()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._seq += 1
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        name = f"traces-{stamp}-{os.getpid()}-{self._seq:04d}.jsonl" + (".gz" if self.compress else "")
+        self.segment = self.directory / name
+        self._raw = self.segment.open("ab")
+        self._out = gzip.GzipFile(fileobj=self._raw, mode="ab") if self.compress else self._raw
+        self._opened_at = time.monotonic()
+        self._prune()
+
+    def _close_segment(self) -> None:
+        if self._out is not None and self._out is not self._raw:
+            self._out.close()
+        if self._raw is not None:
+            self._raw.close()
+        self._out = self._raw = None
+
+    def _prune(self) -> None:
+        if not self.max_segments:
+            return
+        segments = sorted(self.directory.glob(SEGMENT_GLOB), key=lambda p: p.stat().st_mtime)
+        for old in segments[: max(0, len(segments) - self.max_segments)]:
+            if old != self.segment:
+                old.unlink(missing_ok=True)
+
+
+def _segment_lines(path: Path) -> Iterator[bytes]:
+    opener = gzip.open if path.suffix == ".gz" else open
+    try:
+        with opener(path, "rb") as f:
+            yield from f
+    except (EOFError, gzip.BadGzipFile):
+        pass  # truncated tail of a segment that was being written
+
+
+def segment_paths(directory: Path) -> List[Path]:
+    return sorted(directory.glob(SEGMENT_GLOB))
+
+
+_ID_PREFIX = b'{"trace_id":"'
+
+
+def _line_trace_id(line: bytes) -> Optional[str]:
+    # Trace.to_dict puts trace_id first, so the id is readable without decoding the line
+    if line.startswith(_ID_PREFIX):
+        end = line.find(b'"', len(_ID_PREFIX))
+        if end > 0:
+            return line[len(_ID_PREFIX) : end].decode("ascii", "replace")
+    return None
+
+
+def iter_segment(path: Path, trace_ids: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Trace dicts from one segment; with ``trace_ids``, only those are decoded."""
+    wanted: Optional[AbstractSet[str]] = None
+    if trace_ids is not None:
+        wanted = trace_ids if isinstance(trace_ids, (set, frozenset)) else set(trace_ids)
+    for line in _segment_lines(path):
+        if wanted is not None:
+            trace_id = _line_trace_id(line)
+            if trace_id is not None and trace_id not in wanted:
+                continue
+        try:
+            trace = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if wanted is not None and trace.get("trace_id") not in wanted:
+            continue
+        yield trace
+
+
+def iter_traces(directory: Path, trace_ids: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Stream trace dicts from every segment in ``directory``, oldest first.
+
+    With ``trace_ids``, only those traces are decoded and reading stops once
+    all have been found.
+    """
+    wanted: Optional[Set[str]] = set(trace_ids) if trace_ids is not None else None
+    if wanted is not None and not wanted:
+        return
+    for path in segment_paths(directory):
+        for trace in iter_segment(path, wanted):
+            if wanted is not None:
+                wanted.discard(trace["trace_id"])
+            yield trace
+            if wanted is not None and not wanted:
+                return
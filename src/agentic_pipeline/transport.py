@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import importlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .retriever.embedder import estimate_tokens
+
+MODES = ("record", "replay")
+ERRORS = ("429", "500", "503", "timeout")
+# Response headers worth keeping: the body is stored decoded, so no encoding/length headers
+_KEEP_HEADERS = ("content-type",)
+
+
+def _http(openai: ModuleType) -> ModuleType:
+    # httpx, or httpx2 under newer SDKs: whichever the installed openai clients are built on
+    return importlib.import_module(openai.DefaultHttpxClient.__mro__[1].__module__.partition(".")[0])
+
+
+def _digest(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    """Cassette key of a request: method, path and canonical JSON body."""
+    try:
+        payload: Any = json.loads(body) if body else None
+    except ValueError:
+        payload = hashlib.sha256(body).hexdigest()
+    return _digest([method, path, payload])
+
+
+def embedding_key(model: str, text: str, options: Dict[str, Any]) -> str:
+    return _digest(["embedding", model, text, options])
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """How long a replayed response takes, from a spec string.
+
+    ``recorded`` (or ``recorded*0.5``) replays the recorded latency, scaled;
+    ``none`` answers at once; ``fixed:120`` always takes 120 ms;
+    ``lognormal:200:800`` samples a lognormal with that p50 and p99 in ms.
+    """
+
+    kind: str = "recorded"
+    scale: float = 1.0
+    p50: float = 0.0
+    p99: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        name, _, args = spec.strip().lower().partition(":")
+        if name.startswith("recorded"):
+            _, _, scale = name.partition("*")
+            return cls("recorded", float(scale or 1.0))
+        if name in ("none", "0"):
+            return cls("none")
+        if name == "fixed":
+            return cls("fixed", p50=float(args))
+        if name == "lognormal":
+            p50, _, p99 = args.partition(":")
+            return cls("lognormal", p50=float(p50), p99=float(p99 or p50))
+        raise ValueError(f"Unknown latency model: {spec!r}")
+
+    def sample(self, recorded_ms: float, rng: random.Random) -> float:
+        if self.kind == "recorded":
+            return recorded_ms * self.scale
+        if self.kind == "fixed":
+            return self.p50
+        if self.kind == "lognormal":
+            # p99 is 2.326 standard deviations above the median in log space
+            sigma = math.log(max(self.p99, self.p50) / self.p50) / 2.326 if self.p50 > 0 else 0.0
+            return self.p50 * math.exp(rng.gauss(0.0, sigma))
+        return 0.0
+
+
+class Cassette:
+    """Recorded API exchanges in a JSONL file, one exchange per line.
+
+    Chat (and any other) requests are stored whole, keyed by ``request_key``;
+    repeated requests replay their recordings in order, then cycle. Embeddings
+    are stored per input text, so replayed batches need not be split the way
+    they were recorded (the embedder's coalescing depends on timing).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Counter = Counter()
+        self._lock = threading.Lock()
+        if path.exists():
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._entries.values())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            i = self._cursor[key]
+            self._cursor[key] += 1
+            return entries[i % len(entries)]
+
+    def append(self, entries: Sequence[Dict[str, Any]]) -> None:
+        # One write per batch in append mode, so lines from forked workers do not interleave
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(data)
+            for e in entries:
+                self._entries.setdefault(e["key"], []).append(e)
+
+
+@dataclass
+class Reply:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    # Sampled latency: before the headers, then spread over the SSE events
+    ttfb_s: float
+    rest_s: float
+
+    def events(self) -> List[bytes]:
+        if not self.headers.get("content-type", "").startswith("text/event-stream"):
+            return [self.body]
+        parts = self.body.split(b"\n\n")
+        return [p + b"\n\n" for p in parts[:-1]] + ([parts[-1]] if parts[-1] else [])
+
+
+class ApiTransport:
+    """Record or replay the OpenAI traffic of ``Reasoner`` and ``VectorStore``.
+
+    Plugs in below the SDK as the HTTP transport of its clients, so retries,
+    streaming and response parsing run exactly as against the API. In
+    ``record`` mode requests go to the network and each exchange is appended
+    to the cassette with its observed latency. In ``replay`` mode nothing
+    leaves the process. Responses come from the cassette after a latency drawn
+    from ``latency``, and ``error_rate`` of requests fail with one of
+    ``errors`` (HTTP 429/500/503 or a read timeout). A request with no
+    recording gets a 404 naming its key.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        cassette: Path,
+        latency: str = "recorded",
+        error_rate: float = 0.0,
+        errors: Sequence[str] = ("429", "500", "timeout"),
+        seed: int = 0,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown transport mode: {mode} (expected one of {', '.join(MODES)})")
+        unknown = set(errors) - set(ERRORS)
+        if unknown:
+            raise ValueError(f"Unknown injected errors: {', '.join(sorted(unknown))}")
+        self.mode = mode
+        self.cassette = Cassette(cassette)
+        self.latency = LatencyModel.parse(latency)
+        self.error_rate = error_rate
+        self.errors = tuple(errors)
+        self.stats: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def http_client(self, openai: ModuleType) -> Any:
+        """An ``http_client`` for ``openai.OpenAI`` routed through this transport."""
+        http = _http(openai)
+        inner = http.HTTPTransport() if self.mode == "record" else None
+        return openai.DefaultHttpxClient(transport=_sync_transport(http)(self, inner))
+
+    def async_http_client(self, openai: ModuleType) -> Any:
+        http = _http(openai)
+        inner = http.AsyncHTTPTransport() if self.mode == "record" else None
+        return openai.DefaultAsyncHttpxClient(transport=_async_transport(http)(self, inner))
+
+    def _count(self, what: str) -> None:
+        with self._lock:
+            self.stats[what] += 1
+
+    def _draw_error(self) -> Optional[str]:
+        with self._lock:
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+            return self._rng.choice(self.errors) if failed else None
+
+    def replay(self, method: str, path: str, body: bytes) -> Reply:
+        """The recorded reply for a request, or an injected error; raises ``TimeoutError`` for "timeout"."""
+        error = self._draw_error()
+        if error == "timeout":
+            self._count("injected_timeout")
+            raise TimeoutError("injected read timeout")
+        if error is not None:
+            self._count(f"injected_{error}")
+            message = {"error": {"message": f"injected {error}", "type": "injected_error"}}
+            return Reply(int(error), {"content-type": "application/json"}, json.dumps(message).encode(), 0.0, 0.0)
+        reply = self._embeddings(path, body) if path.endswith("/embeddings") else self._recorded(method, path, body)
+        self._count("replayed" if reply.status != 404 else "missed")
+        return reply
+
+    def _sleeps(self, ttfb_ms: float, total_ms: float) -> Tuple[float, float]:
+        with self._lock:
+            total = self.latency.sample(total_ms, self._rng)
+        share = ttfb_ms / total_ms if total_ms > 0 else 1.0
+        return total * share / 1000, total * (1 - share) / 1000
+
+    @staticmethod
+    def _miss(key: str) -> Reply:
+        message = {"error": {"message": f"no recording for request {key[:16]} in the cassette", "type": "cassette_miss"}}
+        return Reply(404, {"content-type": "application/json"}, json.dumps(message).encode(), 0.0, 0.0)
+
+    def _recorded(self, method: str, path: str, body: bytes) -> Reply:
+        key = request_key(method, path, body)
+        entry = self.cassette.get(key)
+        if entry is None:
+            return self._miss(key)
+        ttfb, rest = self._sleeps(entry["ttfb_ms"], entry["total_ms"])
+        return Reply(entry["status"], entry["headers"], entry["body"].encode("utf-8"), ttfb, rest)
+
+    def _embeddings(self, path: str, body: bytes) -> Reply:
+        request = json.loads(body)
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        options = {k: v for k, v in request.items() if k not in ("input", "model")}
+        data, tokens, slowest = [], 0, (0.0, 0.0)
+        for i, text in enumerate(texts):
+            key = embedding_key(request["model"], text, options)
+            entry = self.cassette.get(key)
+            if entry is None:
+                return self._miss(key)
+            data.append({"object": "embedding", "index": i, "embedding": entry["embedding"]})
+            tokens += entry["tokens"]
+            slowest = max(slowest, (entry["total_ms"], entry["ttfb_ms"]))
+        payload = {
+            "object": "list",
+            "data": data,
+            "model": request["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+        ttfb, rest = self._sleeps(slowest[1], slowest[0])
+        return Reply(200, {"content-type": "application/json"}, json.dumps(payload).encode(), ttfb, rest)
+
+    def record(
+        self, method: str, path: str, body: bytes, status: int, headers: Dict[str, str], content: bytes,
+        ttfb_ms: float, total_ms: float,
+    ) -> None:
+        timing = {"ttfb_ms": round(ttfb_ms, 3), "total_ms": round(total_ms, 3)}
+        if path.endswith("/embeddings") and status == 200:
+            request, response = json.loads(body), json.loads(content)
+            texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            options = {k: v for k, v in request.items() if k not in ("input", "model")}
+            entries = [
+                {
+                    "key": embedding_key(request["model"], texts[d["index"]], options),
+                    "embedding": d["embedding"],
+                    "tokens": estimate_tokens(texts[d["index"]]),
+                    **timing,
+                }
+                for d in response["data"]
+            ]
+        else:
+            entries = [
+                {
+                    "key": request_key(method, path, body),
+                    "path": path,
+                    "status": status,
+                    "headers": {k: v for k, v in headers.items() if k.lower() in _KEEP_HEADERS},
+                    "body": content.decode("utf-8"),
+                    **timing,
+                }
+            ]
+        self.cassette.append(entries)
+        self._count("recorded")
+
+
+def _headers(response: Any) -> Dict[str, str]:
+    return {k.lower(): v for k, v in response.headers.items() if k.lower() in _KEEP_HEADERS}
+
+
+@functools.lru_cache(maxsize=None)
+def _sync_transport(http: ModuleType) -> type:
+    class PacedStream(http.SyncByteStream):
+        def __init__(self, events: List[bytes], gap_s: float) -> None:
+            self.events, self.gap_s = events, gap_s
+
+        def __iter__(self) -> Iterator[bytes]:
+            for i, event in enumerate(self.events):
+                if i and self.gap_s:
+                    time.sleep(self.gap_s)
+                yield event
+
+    class Transport(http.BaseTransport):
+        def __init__(self, api: ApiTransport, inner: Any) -> None:
+            self.api, self.inner = api, inner
+
+        def handle_request(self, request: Any) -> Any:
+            body = request.read()
+            if self.inner is not None:
+                t0 = time.perf_counter()
+                response = self.inner.handle_request(request)
+                ttfb = time.perf_counter() - t0
+                content = response.read()
+                total = time.perf_counter() - t0
+                response.close()
+                headers = _headers(response)
+                self.api.record(
+                    request.method, request.url.path, body, response.status_code, headers, content,
+                    ttfb * 1000, total * 1000,
+                )
+                return http.Response(response.status_code, headers=headers, content=content, request=request)
+            try:
+                reply = self.api.replay(request.method, request.url.path, body)
+            except TimeoutError as e:
+                raise http.ReadTimeout(str(e), request=request) from None
+            time.sleep(reply.ttfb_s)
+            events = reply.events()
+            gap = reply.rest_s / max(1, len(events) - 1)
+            return http.Response(reply.status, headers=reply.headers, stream=PacedStream(events, gap), request=request)
+
+        def close(self) -> None:
+            if self.inner is not None:
+                self.inner.close()
+
+    return Transport
+
+
+@functools.lru_cache(maxsize=None)
+def _async_transport(http: ModuleType) -> type:
+    class PacedStream(http.AsyncByteStream):
+        def __init__(self, events: List[bytes], gap_s: float) -> None:
+            self.events, self.gap_s = events, gap_s
+
+        async def __aiter__(self) -> Any:
+            for i, event in enumerate(self.events):
+                if i and self.gap_s:
+                    await asyncio.sleep(self.gap_s)
+                yield event
+
+    class Transport(http.AsyncBaseTransport):
+        def __init__(self, api: ApiTransport, inner: Any) -> None:
+            self.api, self.inner = api, inner
+
+        async def handle_async_request(self, request: Any) -> Any:
+            body = await request.aread()
+            if self.inner is not None:
+                t0 = time.perf_counter()
+                response = await self.inner.handle_async_request(request)
+                ttfb = time.perf_counter() - t0
+                content = await response.aread()
+                total = time.perf_counter() - t0
+                await response.aclose()
+                headers = _headers(response)
+                self.api.record(
+                    request.method, request.url.path, body, response.status_code, headers, content,
+                    ttfb * 1000, total * 1000,
+                )
+                return http.Response(response.status_code, headers=headers, content=content, request=request)
+            try:
+                reply = self.api.replay(request.method, request.url.path, body)
+            except TimeoutError as e:
+                raise http.ReadTimeout(str(e), request=request) from None
+            await asyncio.sleep(reply.ttfb_s)
+            events = reply.events()
+            gap = reply.rest_s / max(1, len(events) - 1)
+            return http.Response(reply.status, headers=reply.headers, stream=PacedStream(events, gap), request=request)
+
+        async def aclose(self) -> None:
+            if self.inner is not None:
+                await self.inner.aclose()
+
+    return Transport
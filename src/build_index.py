@@ -0,0 +1,36 @@
+import argparse
+import time
+from pathlib import Path
+
+from .agentic_pipeline.config import Config
+from .agentic_pipeline.controller.agent import AgentController
+from .agentic_pipeline.index_snapshot import save_snapshot, snapshot_fingerprint
+from .agentic_pipeline.logging_utils import console
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the index snapshot AgentController starts from")
+    parser.add_argument("--out", type=Path, default=None, help="Snapshot directory (default INDEX_SNAPSHOT)")
+    args = parser.parse_args()
+
+    config = Config.from_env()
+    out = args.out or config.index_snapshot
+    if out is None:
+        parser.error("no snapshot directory: pass --out, or enable INDEX_SNAPSHOT / EMBEDDING_CACHE")
+    # Fingerprint first: a KB edit during the build then just makes the snapshot stale
+    fingerprint = snapshot_fingerprint(config)
+    config.index_snapshot = None
+    t0 = time.perf_counter()
+    controller = AgentController(config=config)
+    try:
+        path = save_snapshot(controller, out, fingerprint=fingerprint)
+    finally:
+        controller.close()
+    console.print(
+        f"Snapshot of {len(controller.retriever.store)} chunks and {len(controller.csv_tool.index)} products "
+        f"written to {path} in {time.perf_counter() - t0:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
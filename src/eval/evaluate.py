@@ -1,55 +1,289 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from rich.table import Table
 
 from ..agentic_pipeline.config import Config
 from ..agentic_pipeline.controller.agent import AgentController
 from ..agentic_pipeline.logging_utils import console
 
+STAGES = {
+    "retrieval": "retrieval",
+    "reasoning_tool_decision": "decision",
+    "speculation": "tool",
+    "tool_call_csv_price": "tool",
+    "final_answer": "synthesis",
+    "response_cache": "cache",
+}
 
-def run_eval(queries: List[str]) -> Tuple[List[dict], Path]:
-    config = Config.from_env()
-    controller = AgentController(config=config)
-    results_dir = config.results_dir
-    out_records = []
-    for q in queries:
+
+def _parse_ts(ts: str) -> datetime:
+    return datetime.fromisoformat(ts.rstrip("Z"))
+
+
+def stage_latencies(trace: Dict) -> Dict[str, float]:
+    """Per-stage milliseconds from the trace's spans, or else from step timestamp gaps."""
+    out: Dict[str, float] = {}
+    spans = trace.get("spans")
+    if spans:
+        for child in spans.get("children", []):
+            attrs = child.get("attrs") or {}
+            if child.get("duration_ms") is None or attrs.get("used") is False:
+                continue
+            out[child["name"]] = out.get(child["name"], 0.0) + child["duration_ms"]
+        return out
+    try:
+        prev = _parse_ts(trace["started_at"])
+        for step in trace.get("steps", []):
+            at = _parse_ts(step["at"])
+            stage = STAGES.get(step.get("kind", ""))
+            if stage is not None:
+                out[stage] = out.get(stage, 0.0) + (at - prev).total_seconds() * 1000
+            prev = at
+    except (KeyError, ValueError):
+        pass
+    return out
+
+
+def token_counts(trace: Dict) -> Dict[str, int]:
+    """Prompt, cached and completion tokens the API reported, and context tokens packed, summed over spans."""
+    out = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "context_tokens": 0}
+    stack = [trace["spans"]] if trace.get("spans") else []
+    while stack:
+        node = stack.pop()
+        attrs = node.get("attrs") or {}
+        for key in out:
+            out[key] += int(attrs.get(key) or 0)
+        stack.extend(node.get("children", []))
+    return out
+
+
+def _record(index: int, query: str, answer: str, trace: Dict, trace_path: Optional[Path], total_ms: float) -> Dict:
+    tool_lat_ms = None
+    for step in trace.get("steps", []):
+        if step.get("kind") == "tool_call_csv_price":
+            detail = step.get("detail") or {}
+            tool_lat_ms = detail.get("latency_ms")
+    return {
+        "query": query,
+        "answer": answer,
+        "total_latency_ms": total_ms,
+        "tool_latency_ms": tool_lat_ms,
+        "trace_path": str(trace_path) if trace_path else None,
+        "trace_id": trace.get("trace_id"),
+        "index": index,
+        "stage_latency_ms": stage_latencies(trace),
+        "tokens": token_counts(trace),
+    }
+
+
+class Checkpoint:
+    """Append-only JSONL of finished records, so an interrupted run can resume."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self, queries: List[str]) -> Dict[int, Dict]:
+        done: Dict[int, Dict] = {}
+        if not self.path.exists():
+            return done
+        for line in self.path.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a crash
+            i = rec.get("index")
+            if isinstance(i, int) and i < len(queries) and queries[i] == rec.get("query"):
+                done[i] = rec
+        return done
+
+    def append(self, rec: Dict) -> None:
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def _run_threads(
+    controller: AgentController, pending: List[Tuple[int, str]], concurrency: int, on_done
+) -> None:
+    def one(item: Tuple[int, str]) -> None:
+        i, q = item
         t0 = time.perf_counter()
         answer, trace, trace_path = controller.run(q, save_trace=True)
-        t1 = time.perf_counter()
-        tool_lat_ms = None
-        for step in trace.get("steps", []):
-            if step.get("kind") == "tool_call_csv_price":
-                detail = step.get("detail") or {}
-                tool_lat_ms = detail.get("latency_ms")
-        rec = {
-            "query": q,
-            "answer": answer,
-            "total_latency_ms": (t1 - t0) * 1000,
-            "tool_latency_ms": tool_lat_ms,
-            "trace_path": str(trace_path) if trace_path else None,
+        on_done(_record(i, q, answer, trace, trace_path, (time.perf_counter() - t0) * 1000))
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="eval") as pool:
+        for fut in [pool.submit(one, item) for item in pending]:
+            fut.result()
+
+
+async def _run_async(
+    controller: AgentController, pending: List[Tuple[int, str]], concurrency: int, on_done
+) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int, q: str) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            answer, trace, trace_path = await controller.arun(q, save_trace=True)
+            on_done(_record(i, q, answer, trace, trace_path, (time.perf_counter() - t0) * 1000))
+
+    await asyncio.gather(*(one(i, q) for i, q in pending))
+
+
+def latency_stats(records: List[Dict], wall_s: float, n_run: int, concurrency: int, mode: str) -> Dict:
+    def pct(values: List[float]) -> Dict[str, float]:
+        arr = np.asarray(values, dtype=np.float64)
+        return {
+            "count": int(arr.size),
+            "mean": float(arr.mean()),
+            "p50": float(np.percentile(arr, 50)),
+            "p90": float(np.percentile(arr, 90)),
+            "p99": float(np.percentile(arr, 99)),
         }
-        out_records.append(rec)
+
+    stages: Dict[str, List[float]] = {}
+    tokens: Dict[str, List[float]] = {}
+    for rec in records:
+        for stage, ms in (rec.get("stage_latency_ms") or {}).items():
+            stages.setdefault(stage, []).append(ms)
+        for kind, n in (rec.get("tokens") or {}).items():
+            tokens.setdefault(kind, []).append(n)
+    return {
+        "queries": len(records),
+        "run_this_time": n_run,
+        "concurrency": concurrency,
+        "mode": mode,
+        "wall_s": wall_s,
+        "qps": n_run / wall_s if wall_s > 0 else None,
+        "total_latency_ms": pct([r["total_latency_ms"] for r in records]) if records else None,
+        "stages_ms": {stage: pct(v) for stage, v in stages.items()},
+        "tokens_per_request": {kind: pct(v) for kind, v in tokens.items()},
+    }
+
+
+def run_eval(
+    queries: List[str],
+    concurrency: int = 1,
+    use_async: bool = False,
+    resume: bool = True,
+    checkpoint_path: Optional[Path] = None,
+) -> Tuple[List[dict], Path]:
+    """Run ``queries`` through the pipeline on ``concurrency`` workers.
+
+    Finished records are appended to a JSONL checkpoint; with ``resume`` a rerun
+    of an interrupted eval skips queries already in it. The checkpoint is
+    removed once every query has finished, so the next run starts fresh.
+
+    ``eval_summary.json`` keeps its list-of-records format (records gain
+    ``index`` and ``stage_latency_ms``); percentiles and throughput go to
+    ``eval_latency.json``.
+    """
+    config = Config.from_env()
+    controller = AgentController(config=config)
+    results_dir = config.results_dir
+    checkpoint = Checkpoint(checkpoint_path or results_dir / "eval_checkpoint.jsonl")
+    if not resume:
+        checkpoint.clear()
+    done = checkpoint.load(queries)
+    pending = [(i, q) for i, q in enumerate(queries) if i not in done]
+    if done:
+        console.print(f"Resuming: {len(done)} of {len(queries)} queries already done")
+
+    lock = threading.Lock()
+
+    def on_done(rec: Dict) -> None:
+        checkpoint.append(rec)
+        with lock:
+            done[rec["index"]] = rec
+
+    t0 = time.perf_counter()
+    try:
+        if pending:
+            if use_async:
+                asyncio.run(_run_async(controller, pending, concurrency, on_done))
+            else:
+                _run_threads(controller, pending, concurrency, on_done)
+    finally:
+        # Queued traces must be on disk before quality.py reads them
+        controller.close()
+    wall_s = time.perf_counter() - t0
+
+    out_records = [done[i] for i in sorted(done)]
+    results_dir.mkdir(parents=True, exist_ok=True)
     summary_path = results_dir / "eval_summary.json"
     with summary_path.open("w", encoding="utf-8") as f:
         json.dump(out_records, f, ensure_ascii=False, indent=2)
+    stats = latency_stats(out_records, wall_s, len(pending), concurrency, "async" if use_async else "threads")
+    (results_dir / "eval_latency.json").write_text(json.dumps(stats, indent=2), encoding="utf-8")
+    if len(done) == len(queries):
+        checkpoint.clear()
     return out_records, summary_path
 
 
+def print_latency(stats_path: Path) -> None:
+    stats = json.loads(stats_path.read_text(encoding="utf-8"))
+    qps = f"{stats['qps']:.2f} QPS" if stats.get("qps") else "nothing run"
+    table = Table(title=f"{stats['queries']} queries, {stats['mode']} x{stats['concurrency']}, {qps}")
+    for col in ["Stage", "p50 ms", "p90 ms", "p99 ms", "n"]:
+        table.add_column(col)
+    rows = list(stats["stages_ms"].items())
+    if stats.get("total_latency_ms"):
+        rows.append(("total", stats["total_latency_ms"]))
+    for stage, s in rows:
+        table.add_row(stage, f"{s['p50']:.1f}", f"{s['p90']:.1f}", f"{s['p99']:.1f}", str(s["count"]))
+    console.print(table)
+    tokens = stats.get("tokens_per_request") or {}
+    if tokens:
+        table = Table(title="Tokens per request")
+        for col in ["Kind", "mean", "p50", "p90", "p99"]:
+            table.add_column(col)
+        for kind, s in tokens.items():
+            table.add_row(kind, f"{s['mean']:.0f}", f"{s['p50']:.0f}", f"{s['p90']:.0f}", f"{s['p99']:.0f}")
+        console.print(table)
+
+
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the eval queries through the pipeline")
+    parser.add_argument("--queries", type=Path, default=None, help="JSON list of queries (default data/test_queries.json)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use arun on one event loop")
+    parser.add_argument("--fresh", action="store_true", help="Ignore and clear the checkpoint")
+    parser.add_argument("--checkpoint", type=Path, default=None)
+    args = parser.parse_args()
+
     project_root = Path(__file__).resolve().parents[2]
-    queries_path = project_root / "data" / "test_queries.json"
+    queries_path = args.queries or project_root / "data" / "test_queries.json"
     queries = json.loads(queries_path.read_text(encoding="utf-8"))
-    records, out = run_eval(queries)
+    records, out = run_eval(
+        queries,
+        concurrency=args.concurrency,
+        use_async=args.use_async,
+        resume=not args.fresh,
+        checkpoint_path=args.checkpoint,
+    )
     console.rule("Eval Summary")
     for r in records:
         console.print(f"- {r['query']} -> total {r['total_latency_ms']:.1f}ms, tool {r['tool_latency_ms']}")
+    print_latency(out.parent / "eval_latency.json")
     console.print(f"Saved summary: {out}")
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import argparse
 import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy import sparse
 
 from ..agentic_pipeline.config import Config
 from ..agentic_pipeline.logging_utils import console
+from ..agentic_pipeline.trace_sink import iter_segment, segment_paths
 
 
 STOPWORDS = {
@@ -50,13 +57,21 @@ def get_retrieved_text(trace: Dict) -> str:
     return ""
 
 
-def score_record(query: str, answer: str, trace_path: Path) -> Dict:
-    trace = json.loads(trace_path.read_text(encoding="utf-8")) if trace_path.exists() else {}
+def score_record(query: str, answer: str, trace_path: Path, trace: Optional[Dict] = None) -> Dict:
+    if trace is None:
+        trace = json.loads(trace_path.read_text(encoding="utf-8")) if trace_path.is_file() else {}
 
     relevance = jaccard(tokenize(query), tokenize(answer))
-
     should_use_tool = detect_price_intent(query)
     did_use_tool = used_csv_tool(trace)
+    retrieved_text = get_retrieved_text(trace)
+    kb_overlap = jaccard(tokenize(answer), tokenize(retrieved_text)) if retrieved_text else 0.0
+    return _scored(query, trace_path, relevance, should_use_tool, did_use_tool, kb_overlap)
+
+
+def _scored(
+    query: str, trace_path: Path, relevance: float, should_use_tool: bool, did_use_tool: bool, kb_overlap: float
+) -> Dict:
     # Tool score: 1 if aligned, 0.5 if extra tool used, 0 if missed when needed
     if should_use_tool and did_use_tool:
         tool_score = 1.0
@@ -71,8 +86,6 @@ def score_record(query: str, answer: str, trace_path: Path) -> Dict:
         tool_score = 1.0
         tool_note = "Correctly avoided tool."
 
-    retrieved_text = get_retrieved_text(trace)
-    kb_overlap = jaccard(tokenize(answer), tokenize(retrieved_text)) if retrieved_text else 0.0
     # If no tool recommended, we expect KB grounding more
     if not should_use_tool:
         kb_score = kb_overlap
@@ -99,21 +112,199 @@ def score_record(query: str, answer: str, trace_path: Path) -> Dict:
     }
 
 
-def run_quality() -> Path:
+# (retrieved chunk texts, used the CSV tool) for one trace, or the error loading it
+TraceFeatures = Union[Tuple[Tuple[str, ...], bool], Exception]
+
+
+def trace_features(trace: Dict, interned: Optional[Dict[str, str]] = None) -> Tuple[Tuple[str, ...], bool]:
+    """What scoring needs from a trace: the chunks ``get_retrieved_text`` joins, and tool use."""
+    chunks: Tuple[str, ...] = ()
+    for step in trace.get("steps", []):
+        if step.get("kind") == "retrieval":
+            texts = [str(r.get("text", "")) for r in step.get("detail", {}).get("results", [])]
+            # The same KB chunks recur across traces; sharing one object per text
+            # lets pickle send each once per worker task
+            chunks = tuple(interned.setdefault(t, t) for t in texts) if interned is not None else tuple(texts)
+            break
+    return chunks, used_csv_tool(trace)
+
+
+def _file_features(paths: Sequence[str]) -> List[TraceFeatures]:
+    interned: Dict[str, str] = {}
+    out: List[TraceFeatures] = []
+    for p in paths:
+        path = Path(p)
+        try:
+            trace = json.loads(path.read_text(encoding="utf-8")) if path.is_file() else {}
+            out.append(trace_features(trace, interned))
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+def _segment_features(path: str, trace_ids: Sequence[str]) -> Dict[str, Tuple[Tuple[str, ...], bool]]:
+    interned: Dict[str, str] = {}
+    return {t["trace_id"]: trace_features(t, interned) for t in iter_segment(Path(path), trace_ids)}
+
+
+def load_trace_features(
+    records: List[Dict], workers: Optional[int] = None, chunk_size: int = 2000
+) -> List[TraceFeatures]:
+    """Features of each record's trace, loaded on a process pool.
+
+    Records pointing at a JSONL sink directory are resolved with one task per
+    segment; per-query trace files are read in chunks of ``chunk_size``. Only
+    the fields scoring needs travel back from the workers. A trace that cannot
+    be found scores like an empty one, as in ``score_record``.
+    """
+    workers = workers or os.cpu_count() or 1
+    out: List[TraceFeatures] = [((), False)] * len(records)
+    is_dir: Dict[str, bool] = {}
+    by_dir: Dict[str, Dict[str, List[int]]] = {}
+    files: List[Tuple[int, str]] = []
+    for i, rec in enumerate(records):
+        tpath = rec.get("trace_path") or ""
+        if tpath not in is_dir:
+            is_dir[tpath] = Path(tpath).is_dir()
+        if rec.get("trace_id") and is_dir[tpath]:
+            by_dir.setdefault(tpath, {}).setdefault(rec["trace_id"], []).append(i)
+        else:
+            files.append((i, tpath))
+    seg_tasks = [(str(seg), rows) for d, rows in by_dir.items() for seg in segment_paths(Path(d))]
+    file_tasks = [files[k : k + chunk_size] for k in range(0, len(files), chunk_size)]
+
+    def take_segment(rows: Dict[str, List[int]], found: Dict[str, Tuple[Tuple[str, ...], bool]]) -> None:
+        for trace_id, features in found.items():
+            for i in rows[trace_id]:
+                out[i] = features
+
+    def take_files(chunk: List[Tuple[int, str]], features: List[TraceFeatures]) -> None:
+        for (i, _), f in zip(chunk, features):
+            out[i] = f
+
+    if workers <= 1 or len(seg_tasks) + len(file_tasks) <= 1:
+        for seg, rows in seg_tasks:
+            take_segment(rows, _segment_features(seg, list(rows)))
+        for chunk in file_tasks:
+            take_files(chunk, _file_features([p for _, p in chunk]))
+        return out
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        seg_futs = [(rows, pool.submit(_segment_features, seg, list(rows))) for seg, rows in seg_tasks]
+        file_futs = [(chunk, pool.submit(_file_features, [p for _, p in chunk])) for chunk in file_tasks]
+        for rows, fut in seg_futs:
+            take_segment(rows, fut.result())
+        for chunk, fut in file_futs:
+            take_files(chunk, fut.result())
+    return out
+
+
+_TOKEN = re.compile(r"[a-zA-Z0-9]+")
+
+
+class TermSets:
+    """Binary term vectors over one shared vocabulary; each distinct text is tokenized once."""
+
+    def __init__(self) -> None:
+        self.vocab: Dict[str, int] = {}
+        self._rows: Dict[str, int] = {}
+        self._indices: List[int] = []
+        self._indptr: List[int] = [0]
+
+    def rows(self, texts: Sequence[str]) -> np.ndarray:
+        """Row number of each text's term set (same tokens and stopwords as ``tokenize``)."""
+        out = np.empty(len(texts), dtype=np.int64)
+        vocab, seen = self.vocab, self._rows
+        for i, text in enumerate(texts):
+            row = seen.get(text)
+            if row is None:
+                terms = {vocab.setdefault(w, len(vocab)) for w in _TOKEN.findall(text.lower()) if w not in STOPWORDS}
+                self._indices.extend(terms)
+                self._indptr.append(len(self._indices))
+                row = seen[text] = len(seen)
+            out[i] = row
+        return out
+
+    def matrix(self) -> sparse.csr_matrix:
+        indices = np.asarray(self._indices, dtype=np.int64)
+        return sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), indices, np.asarray(self._indptr, dtype=np.int64)),
+            shape=(len(self._rows), max(1, len(self.vocab))),
+        )
+
+
+def _jaccard_rows(x: sparse.csr_matrix, y: sparse.csr_matrix) -> np.ndarray:
+    """Row-wise ``jaccard`` of two binary matrices: intersections from an element-wise
+    product, unions from the set sizes. Empty sets score 0, as in ``jaccard``."""
+    nx, ny = x.getnnz(axis=1), y.getnnz(axis=1)
+    inter = np.asarray(x.multiply(y).sum(axis=1)).ravel()
+    out = np.zeros(x.shape[0])
+    ok = (nx > 0) & (ny > 0)
+    out[ok] = inter[ok] / (nx[ok] + ny[ok] - inter[ok])
+    return out
+
+
+def batch_overlaps(
+    queries: Sequence[str], answers: Sequence[str], retrieved: Sequence[Sequence[str]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Query-answer relevance and answer-KB overlap for every record at once.
+
+    ``retrieved`` holds each record's chunk texts. The chunks are joined by
+    non-word characters, so the token set of the joined text is the union of
+    the chunk sets: an (records x chunks) incidence matrix times the chunk term
+    matrix gives every record's retrieved set without re-tokenizing chunks.
+    """
+    n = len(queries)
+    terms = TermSets()
+    q_rows, a_rows = terms.rows(queries), terms.rows(answers)
+    flat = [c for chunks in retrieved for c in chunks]
+    c_rows = terms.rows(flat)
+    m = terms.matrix()
+    counts = np.fromiter((len(chunks) for chunks in retrieved), dtype=np.int64, count=n)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(flat), dtype=np.int32), c_rows, np.concatenate(([0], np.cumsum(counts)))),
+        shape=(n, m.shape[0]),
+    )
+    r = (incidence @ m).tocsr()
+    r.data[:] = 1
+    q, a = m[q_rows], m[a_rows]
+    return _jaccard_rows(q, a), _jaccard_rows(a, r)
+
+
+def score_records(records: List[Dict], workers: Optional[int] = None) -> List[Dict]:
+    """Batch ``score_record`` with identical output: traces load on a process
+    pool and the token overlaps are sparse-matrix operations over all records."""
+    if not records:
+        return []
+    features = load_trace_features(records, workers=workers)
+    queries = [r.get("query", "") for r in records]
+    answers = [r.get("answer", "") for r in records]
+    retrieved = [f[0] if isinstance(f, tuple) else () for f in features]
+    relevance, kb_overlap = batch_overlaps(queries, answers, retrieved)
+    price_intent: Dict[str, bool] = {}
+    trace_paths: Dict[str, Path] = {}
+    out: List[Dict] = []
+    for i, rec in enumerate(records):
+        f = features[i]
+        if isinstance(f, Exception):
+            out.append({"query": queries[i], "error": str(f)})
+            continue
+        q = queries[i]
+        if q not in price_intent:
+            price_intent[q] = detect_price_intent(q)
+        tpath = rec.get("trace_path") or ""
+        if tpath not in trace_paths:
+            trace_paths[tpath] = Path(tpath)
+        out.append(_scored(q, trace_paths[tpath], float(relevance[i]), price_intent[q], f[1], float(kb_overlap[i])))
+    return out
+
+
+def run_quality(workers: Optional[int] = None) -> Path:
     config = Config.from_env()
     summary_path = config.results_dir / "eval_summary.json"
     if not summary_path.exists():
         raise FileNotFoundError(f"Missing eval summary: {summary_path}")
     records = json.loads(summary_path.read_text(encoding="utf-8"))
-    out: List[Dict] = []
-    for rec in records:
-        q = rec.get("query", "")
-        a = rec.get("answer", "")
-        tpath = Path(rec.get("trace_path") or "")
-        try:
-            out.append(score_record(q, a, tpath))
-        except Exception as e:
-            out.append({"query": q, "error": str(e)})
+    out = score_records(records, workers=workers)
 
     out_path = config.results_dir / "eval_quality.json"
     out_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -121,11 +312,12 @@ def run_quality() -> Path:
 
 
 def main() -> None:
-    out = run_quality()
+    parser = argparse.ArgumentParser(description="Score eval answers against their traces")
+    parser.add_argument("--workers", type=int, default=None, help="Trace-loading processes (default: CPU count)")
+    args = parser.parse_args()
+    out = run_quality(workers=args.workers)
     console.print(f"Saved quality report: {out}")
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from collections import Counter
+
+from ..agentic_pipeline.config import Config
+from ..agentic_pipeline.logging_utils import console
+from ..agentic_pipeline.reasoner.router import ToolRouter, decisions_from_traces
+
+
+def main() -> None:
+    config = Config.from_env()
+    pairs = decisions_from_traces(config.results_dir, config.trace_dir)
+    counts = Counter(d for _, d in pairs)
+    console.print(f"Training router on {len(pairs)} traced decisions: {dict(counts)}")
+    try:
+        router = ToolRouter(threshold=config.router_threshold).fit([q for q, _ in pairs], [d for _, d in pairs])
+    except ValueError as e:
+        console.print(f"[red]Cannot train router:[/red] {e}. Run more queries (python -m src.eval.evaluate) first.")
+        return
+    out = router.save(config.router_path or config.results_dir / "router.pkl")
+    console.print(f"Saved router: {out} (enable with ROUTER=1, threshold {config.router_threshold})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import argparse
 from pathlib import Path
+from typing import Optional, Tuple
 
 from .agentic_pipeline.config import Config
 from .agentic_pipeline.controller.agent import AgentController
@@ -10,20 +11,64 @@ def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Mini Agentic Pipeline")
     parser.add_argument("--query", type=str, required=True, help="User query to answer")
     parser.add_argument("--save-trace", action="store_true", help="Save trace JSON under results/")
+    parser.add_argument("--stream", action="store_true", help="Print progress and answer tokens as they arrive")
+    parser.add_argument(
+        "--profile", choices=["cprofile", "pyinstrument"], default=None, help="Profile this request into results/"
+    )
     return parser.parse_args()
 
 
+def stream_answer(
+    controller: AgentController, query: str, save_trace: bool, profile: Optional[str] = None
+) -> Tuple[Optional[Path], str]:
+    outfile: Optional[Path] = None
+    trace_id = ""
+    for event in controller.run_stream(query=query, save_trace=save_trace, profile=profile):
+        if event.kind == "cache":
+            console.print(f"[dim]Cache hit ({event.data['tier']}, similarity {event.data['similarity']:.2f})[/dim]")
+        elif event.kind == "retrieval":
+            docs = ", ".join(r["doc_id"] for r in event.data["results"])
+            console.print(f"[dim]Retrieved: {docs}[/dim]")
+        elif event.kind == "decision":
+            console.print(f"[dim]Decision: {event.data['decision']} ({event.data['rationale']})[/dim]")
+        elif event.kind == "tool" and event.data.get("product_name"):
+            console.print(f"[dim]Tool: {event.data['product_name']} ${event.data['price_usd']}[/dim]")
+        elif event.kind == "token":
+            console.print(event.data["text"], end="", markup=False, highlight=False, soft_wrap=True)
+        elif event.kind == "done":
+            console.print()
+            outfile = event.data["trace_path"]
+            trace_id = event.data["trace"]["trace_id"]
+            if event.data["trace"].get("profile"):
+                console.print(f"Profile saved: {event.data['trace']['profile']}")
+            final = next((s["detail"] for s in event.data["trace"]["steps"] if s["kind"] == "final_answer"), {})
+            if final.get("ttft_ms") is not None:
+                console.print(f"[dim]First token {final['ttft_ms']:.0f} ms, generation {final['generation_ms']:.0f} ms[/dim]")
+    return outfile, trace_id
+
+
 def main() -> None:
     args = parse_args()
     config = Config.from_env()
     controller = AgentController(config=config)
 
-    final_answer, trace, outfile = controller.run(query=args.query, save_trace=args.save_trace)
+    if args.stream:
+        outfile, trace_id = stream_answer(controller, args.query, args.save_trace, args.profile)
+    else:
+        final_answer, trace, outfile = controller.run(
+            query=args.query, save_trace=args.save_trace, profile=args.profile
+        )
+        trace_id = trace["trace_id"]
 
-    console.rule("Final Answer")
-    console.print(final_answer)
-    console.rule()
-    if outfile:
+        console.rule("Final Answer")
+        console.print(final_answer)
+        console.rule()
+        if trace.get("profile"):
+            console.print(f"Profile saved: {trace['profile']}")
+    controller.close()
+    if outfile and controller.trace_sink is not None:
+        console.print(f"Trace saved to {outfile} (trace_id {trace_id})")
+    elif outfile:
         console.print(f"Trace saved: {outfile}")
 
 
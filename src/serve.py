@@ -0,0 +1,408 @@
+"""HTTP server: one warm controller per worker process, stdlib asyncio only.
+
+Endpoints:
+- ``POST /query`` (JSON ``{"query": ...}``) or ``GET /query?q=...``: the answer as JSON
+- ``POST|GET /query/stream``: the ``run_stream`` events as server-sent events
+- ``GET /healthz``: liveness plus index size
+- ``GET /metrics``: Prometheus text (spans, tokens, HTTP, embedding batching)
+
+With ``--workers N`` the parent loads the KB index once and forks N workers
+that accept on one shared socket; the index arrays are shared copy-on-write.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .agentic_pipeline.config import Config
+from .agentic_pipeline.controller.agent import AgentController, StreamEvent
+from .agentic_pipeline.logging_utils import PrometheusExporter, console
+
+MAX_BODY_BYTES = 1 << 20
+MAX_HEADER_BYTES = 64 << 10
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    params: Dict[str, List[str]]
+    headers: Dict[str, str]
+    body: bytes = b""
+    version: str = "HTTP/1.1"
+
+    @property
+    def keep_alive(self) -> bool:
+        conn = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return conn == "keep-alive"
+        return conn != "close"
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Parse one HTTP/1.x request; None if the client closed the connection between requests."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HTTPError(400, "incomplete request")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "request head too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    if not version.startswith("HTTP/1."):
+        raise HTTPError(400, "unsupported protocol")
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise HTTPError(400, "malformed header")
+        headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    request = Request(method.upper(), url.path, parse_qs(url.query), headers, version=version)
+    if "transfer-encoding" in headers:
+        raise HTTPError(411, "chunked bodies are not supported; send Content-Length")
+    length = headers.get("content-length")
+    if length is None:
+        if request.method == "POST":
+            raise HTTPError(411, "Content-Length required")
+        return request
+    try:
+        n = int(length)
+    except ValueError:
+        raise HTTPError(400, "bad Content-Length")
+    if n < 0:
+        raise HTTPError(400, "bad Content-Length")
+    if n > MAX_BODY_BYTES:
+        raise HTTPError(413, f"body over {MAX_BODY_BYTES} bytes")
+    try:
+        request.body = await reader.readexactly(n)
+    except asyncio.IncompleteReadError:
+        raise HTTPError(400, "incomplete body")
+    return request
+
+
+def response_head(status: int, content_type: str, length: Optional[int], keep_alive: bool) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}"]
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    else:
+        lines.append("Cache-Control: no-cache")
+    lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def sse(kind: str, data: Dict[str, Any]) -> bytes:
+    return f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+@dataclass
+class ServerStats:
+    started_at: float = field(default_factory=time.monotonic)
+    in_flight: int = 0
+    requests: Dict[Tuple[str, int], int] = field(default_factory=dict)
+    seconds: Dict[str, float] = field(default_factory=dict)
+
+    def count(self, route: str, status: int, seconds: float) -> None:
+        self.requests[(route, status)] = self.requests.get((route, status), 0) + 1
+        self.seconds[route] = self.seconds.get(route, 0.0) + seconds
+
+
+class AgentServer:
+    """Routes HTTP requests to a warm ``AgentController`` on one event loop."""
+
+    ROUTES = {"/query": ("GET", "POST"), "/query/stream": ("GET", "POST"), "/healthz": ("GET",), "/metrics": ("GET",)}
+
+    def __init__(self, controller: AgentController) -> None:
+        self.controller = controller
+        controller.verbose = False
+        self.stats = ServerStats()
+        exporter = next((e for e in controller.exporters if isinstance(e, PrometheusExporter)), None)
+        if exporter is None:
+            exporter = PrometheusExporter(None)
+            controller.exporters.append(exporter)
+        self.exporter = exporter
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    self.stats.count("invalid", e.status, 0.0)
+                    return
+                if request is None:
+                    return
+                if not await self.dispatch(request, writer):
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """Answer one request; returns whether the connection stays open."""
+        t0 = time.perf_counter()
+        route = request.path if request.path in self.ROUTES else "unknown"
+        keep_alive = request.keep_alive
+        self.stats.in_flight += 1
+        try:
+            if route == "unknown":
+                raise HTTPError(404, f"no route {request.path}")
+            if request.method not in self.ROUTES[route]:
+                raise HTTPError(405, f"{request.method} not allowed on {route}")
+            if route == "/query/stream":
+                status = await self._stream(request, writer)
+                keep_alive = False
+            elif route == "/query":
+                status = await self._send_json(writer, 200, await self._query(request), keep_alive)
+            elif route == "/healthz":
+                status = await self._send_json(writer, 200, self.health(), keep_alive)
+            else:
+                body = self.metrics().encode("utf-8")
+                writer.write(response_head(200, "text/plain; version=0.0.4", len(body), keep_alive) + body)
+                await writer.drain()
+                status = 200
+        except HTTPError as e:
+            status = await self._send_json(writer, e.status, {"error": str(e)}, keep_alive)
+        except ConnectionError:
+            status, keep_alive = 499, False  # client went away mid-response
+        except Exception as e:
+            console.print(f"[red]{request.method} {request.path} failed[/red]\n{traceback.format_exc()}")
+            status = await self._send_json(writer, 500, {"error": type(e).__name__}, keep_alive=False)
+            keep_alive = False
+        finally:
+            self.stats.in_flight -= 1
+        self.stats.count(route, status, time.perf_counter() - t0)
+        return keep_alive
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, data: Dict[str, Any], keep_alive: bool) -> int:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        writer.write(response_head(status, "application/json", len(body), keep_alive) + body)
+        await writer.drain()
+        return status
+
+    @staticmethod
+    def _query_params(request: Request) -> Tuple[str, bool]:
+        if request.method == "POST":
+            try:
+                payload = json.loads(request.body or b"{}")
+            except json.JSONDecodeError:
+                raise HTTPError(400, "body is not JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "body must be a JSON object")
+            query, save_trace = payload.get("query"), payload.get("save_trace", True)
+        else:
+            query = (request.params.get("q") or [None])[0]
+            save_trace = (request.params.get("save_trace") or ["1"])[0] not in ("0", "false", "no")
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "missing query")
+        return query, bool(save_trace)
+
+    async def _query(self, request: Request) -> Dict[str, Any]:
+        query, save_trace = self._query_params(request)
+        t0 = time.perf_counter()
+        answer, trace, _ = await self.controller.arun(query, save_trace=save_trace)
+        return {"answer": answer, "trace_id": trace["trace_id"], "latency_ms": (time.perf_counter() - t0) * 1000}
+
+    async def _stream(self, request: Request, writer: asyncio.StreamWriter) -> int:
+        query, save_trace = self._query_params(request)
+        t0 = time.perf_counter()
+        events: AsyncIterator[StreamEvent] = self.controller.arun_stream(query, save_trace=save_trace)
+        writer.write(response_head(200, "text/event-stream; charset=utf-8", None, keep_alive=False))
+        try:
+            async for event in events:
+                if event.kind == "done":
+                    data = {
+                        "answer": event.data["answer"],
+                        "trace_id": event.data["trace"]["trace_id"],
+                        "latency_ms": (time.perf_counter() - t0) * 1000,
+                    }
+                else:
+                    data = event.data
+                writer.write(sse(event.kind, data))
+                # Waits out slow readers and raises once the client disconnects
+                await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            console.print(f"[red]stream failed[/red]\n{traceback.format_exc()}")
+            writer.write(sse("error", {"error": type(e).__name__}))
+            await writer.drain()
+        finally:
+            # Cancels the LLM stream (and releases its slot) if the client left early
+            await events.aclose()
+        return 200
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "docs": len(self.controller.retriever.store),
+            "uptime_s": time.monotonic() - self.stats.started_at,
+            "in_flight": self.stats.in_flight,
+        }
+
+    def metrics(self) -> str:
+        p = self.exporter.prefix
+        lines = [
+            f"# HELP {p}_http_requests_total HTTP requests by route and status.",
+            f"# TYPE {p}_http_requests_total counter",
+        ]
+        for (route, status), n in sorted(self.stats.requests.items()):
+            lines.append(f'{p}_http_requests_total{{route="{route}",status="{status}"}} {n}')
+        lines += [f"# TYPE {p}_http_request_seconds_total counter"]
+        for route, seconds in sorted(self.stats.seconds.items()):
+            lines.append(f'{p}_http_request_seconds_total{{route="{route}"}} {seconds:.6f}')
+        lines += [f"# TYPE {p}_http_in_flight gauge", f"{p}_http_in_flight {self.stats.in_flight}"]
+        # inputs / requests is the mean embedding batch size after coalescing
+        for key, n in sorted(self.controller.retriever.store.embed_stats().items()):
+            lines += [f"# TYPE {p}_embed_{key}_total counter", f"{p}_embed_{key}_total {n}"]
+        cache = self.controller.response_cache
+        if cache is not None:
+            lines.append(f"# TYPE {p}_response_cache_total counter")
+            for key, n in sorted(cache.stats.items()):
+                lines.append(f'{p}_response_cache_total{{event="{key}"}} {n}')
+        return "\n".join(lines) + "\n" + self.exporter.render()
+
+
+async def serve(controller: AgentController, sock: socket.socket) -> None:
+    """Serve on an already-bound socket until SIGTERM/SIGINT."""
+    server = AgentServer(controller)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    listener = await asyncio.start_server(server.handle, sock=sock, limit=MAX_HEADER_BYTES)
+    async with listener:
+        await stop.wait()
+
+
+def bind(host: str, port: int) -> socket.socket:
+    sock = socket.create_server((host, port), backlog=1024)
+    sock.setblocking(False)
+    return sock
+
+
+def _spawn(controller: AgentController, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # Child: fresh threads and connections; the loaded index stays shared with the parent
+    code = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        controller.reopen()
+        asyncio.run(serve(controller, sock))
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        controller.close()
+        sys.stdout.flush()
+        # Skip the parent's atexit handlers and objects inherited by the fork
+        os._exit(code)
+
+
+def prefork(controller: AgentController, sock: socket.socket, workers: int) -> None:
+    """Fork ``workers`` children sharing ``sock``; restart any that die until SIGTERM/SIGINT."""
+    # Threads do not survive fork: stop them here, each child restarts its own
+    controller.close()
+    # Keep the refcount writes of a later collection from unsharing the index pages
+    gc.freeze()
+    children = {_spawn(controller, sock) for _ in range(workers)}
+    stopping = False
+
+    def stop(signum: int, _frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            console.print(f"Worker {pid} exited ({os.waitstatus_to_exitcode(status)}); restarting")
+            time.sleep(0.5)
+            children.add(_spawn(controller, sock))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the pipeline over HTTP")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Pre-forked worker processes (POSIX only)")
+    parser.add_argument(
+        "--max-inflight-llm", type=int, default=None, help="Concurrent LLM calls per worker (default LLM_MAX_INFLIGHT)"
+    )
+    args = parser.parse_args()
+
+    config = Config.from_env()
+    if args.max_inflight_llm is not None:
+        config.llm_max_inflight = args.max_inflight_llm
+    controller = AgentController(config=config)
+    sock = bind(args.host, args.port)
+    console.print(
+        f"Serving {len(controller.retriever.store)} docs on http://{args.host}:{args.port} "
+        f"({args.workers} worker{'s' if args.workers != 1 else ''})"
+    )
+    if args.workers > 1:
+        prefork(controller, sock, args.workers)
+    else:
+        try:
+            asyncio.run(serve(controller, sock))
+        finally:
+            controller.close()
+
+
+if __name__ == "__main__":
+    main()